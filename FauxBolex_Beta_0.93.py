@@ -1,38 +1,103 @@
 # FauxBolex_Beta_0.93.py (Pillow Fonts, 1.85:1 recording, Lossless JPEG compressed RAW DNG, White/Red Box)
-import sys, os, cv2, time, numpy as np, queue, threading, traceback
-import pidng
-from pidng.core import RAW2DNG, DNGTags, Tag
-from pidng.defs import CFAPattern, CalibrationIlluminant, DNGVersion, Orientation, PhotometricInterpretation
+import sys, os, time, queue, threading, traceback, shutil
 from datetime import datetime
-import pygame 
-from PIL import Image, ImageDraw, ImageFont
-
-# --- Path and Module Imports ---
+from bolex_startup import StartupTimer
+startup = StartupTimer() # Cold start phases; cv2, PIL and pygame are imported once the preview is up (see "Deferred imports")
+import numpy as np
+
+# --- Run Mode (environment; all unset = normal camera run) ---
+# BOLEX_CAMERA=replay: bolex_replay stands in for core_module (samples/*.dng or synthetic frames, no Basler needed)
+# BOLEX_BENCH_SECONDS=N: headless, records one N-second take, writes metrics JSON to BOLEX_BENCH_OUTPUT and exits (see bolex_bench.py)
+USE_REPLAY_CAMERA = os.environ.get("BOLEX_CAMERA", "").lower() == "replay"
+BENCH_SECONDS = float(os.environ.get("BOLEX_BENCH_SECONDS", "0") or 0); HEADLESS = BENCH_SECONDS > 0 or os.environ.get("BOLEX_HEADLESS") == "1"
+STORAGE_PATH = os.environ.get("BOLEX_STORAGE", "/home/ooze3d/digitalbolex/storage/")
+ENCODER_WORKERS = int(os.environ["BOLEX_ENCODER_WORKERS"]) if os.environ.get("BOLEX_ENCODER_WORKERS") else None
+BUFFER_BUDGET_MB = int(os.environ.get("BOLEX_BUFFER_MB", "2048")) # RAM frame pool; lower it on dev boxes with less memory than the Pi
+TAKE_FILE = os.environ.get("BOLEX_TAKE_FILE") == "1" # One streaming take.fbt per take instead of a DNG per frame (export: python bolex_take.py export)
+RECORD_MODE = os.environ.get("BOLEX_RECORD_MODE", "lj92") # lj92 (compressed) or raw12 (uncompressed 12-bit, for bursts the CPU can't compress); 'm' toggles
+SCOPES_HZ = float(os.environ.get("BOLEX_SCOPES_HZ", "6")) # Raw scopes / clip mask update rate (bolex_scopes.py, worker thread)
+SCOPE_VIEW = os.environ.get("BOLEX_SCOPE_VIEW", "off") # Initial scope: off, histogram, waveform, false_colour, or clip (raw clip overlay); 's'/'c' toggle
+WRITE_DIRECT = os.environ.get("BOLEX_O_DIRECT") == "1" # Write stage bypasses the page cache (O_DIRECT, aligned buffers)
+PREVIEW_LUT = os.environ.get("BOLEX_PREVIEW_LUT", "linear") # Preview look: linear, gamma (Rec. 709) or log (bolex_preview.display_lut); 'l' cycles
+PREVIEW_EVERY = int(os.environ.get("BOLEX_PREVIEW_EVERY", "1")) # Preview every Nth captured frame (0 = none: raw only, every frame still recorded)
+PREVIEW_DECIMATION = int(os.environ.get("BOLEX_PREVIEW_DECIMATION", "1")) # 1 = every 2x2 Bayer cell (half resolution), 2 = every other cell, ...
+# Validated camera configuration restored in one call: a Pylon feature file (saved on the first full configuration; delete it to re-validate),
+# "userset:UserSet1" for a camera user set, or "off" to configure node by node on every start
+CAMERA_CONFIG = os.environ.get("BOLEX_CAMERA_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_config.pfs"))
+if CAMERA_CONFIG == "off": CAMERA_CONFIG = ""
+CAMERA_POWER_ON_DEFAULT = os.environ.get("BOLEX_CAMERA_POWER_ON_DEFAULT") == "1" # A saved "userset:" also becomes the camera's power-on default (persists in the camera)
+
+# --- Path: the built core_module goes on sys.path before the encoder workers fork, so they find its LJ92 tile encoder (bolex_dng);
+# it is only imported below, after the fork (no Pylon runtime in the children) ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 cpp_build_dir = os.path.join(current_dir, 'bolex_core_cpp', 'build')
-if not os.path.isdir(cpp_build_dir): exit(f"ERROR: Build directory not found: {cpp_build_dir}")
-print(f"Adding to sys.path: {cpp_build_dir}")
-sys.path.insert(0, cpp_build_dir)
-try: import core_module; print("Successfully imported core_module!")
-except Exception as e: exit(f"ERROR importing core_module: {e}\n{traceback.format_exc()}")
+if not USE_REPLAY_CAMERA:
+    if not os.path.isdir(cpp_build_dir): exit(f"ERROR: Build directory not found: {cpp_build_dir}")
+    print(f"Adding to sys.path: {cpp_build_dir}")
+    sys.path.insert(0, cpp_build_dir)
+
+# --- Encoder workers: forked first, while this process is single-threaded (no Pylon, capture or control threads, no GUI) and
+# before the RAM frame pool exists, so children inherit no held locks and no copy-on-write references to pool pages (bolex_encoder) ---
+from bolex_encoder import DNGEncoderPool, default_workers
+encoder_pool = None; encoder_workers = default_workers() if ENCODER_WORKERS is None else ENCODER_WORKERS
+if encoder_workers > 0:
+    try: encoder_pool = DNGEncoderPool(encoder_workers, target_fps=24.0); encoder_pool.start()
+    except Exception as e: print(f"Warn: Encoder pool failed to start ({e}). Encoding inline."); encoder_pool = None; encoder_workers = 0
+startup.mark("encoder pool")
+
+# --- Module Imports ---
+if USE_REPLAY_CAMERA: import bolex_replay as core_module; print("Using replay camera (bolex_replay) instead of core_module.")
+else:
+    try: import core_module; print("Successfully imported core_module!")
+    except Exception as e: exit(f"ERROR importing core_module: {e}\n{traceback.format_exc()}")
+from bolex_preview import display_lut, LUT_KINDS
+startup.mark("core_module")
 
 # --- Recorder Class (From your "Color Science Fixed Version") ---
 class Recorder:
     _STOP_SENTINEL = None
-    def __init__(self, storage_path: str, cfa_pattern: tuple = (1, 2, 0, 1), wb_gains: list = [1.0, 1.0, 1.0], max_buffer_frames: int = 3000):
-            self.storage_path=storage_path; self.file_format="dng"; self.max_buffer_frames=max_buffer_frames; self.cfa_pattern_tuple=cfa_pattern
+    RECORD_MODES = ("lj92", "raw12") # Per take: tiled LJ92 DNGs, or uncompressed 12-bit DNGs written straight from the packed pool slot
+    LJ92_SIZE_ESTIMATE = 0.70 # LJ92 file size / raw12 size until this session has measured its own (samples: 0.62-0.74)
+    def __init__(self, storage_path: str, cfa_pattern: tuple = (1, 2, 0, 1), wb_gains: list = [1.0, 1.0, 1.0], max_buffer_frames: int = 3000, encoder_workers: int = None,
+                 buffer_budget_mb: int = 2048, spill_budget_mb: int = 4096, frame_shape: tuple = (1108, 2048), target_fps: float = 24.0,
+                 dng_tile_size: int = 256, pack_12bit: bool = True, record_mode: str = "lj92", take_file: bool = False, fsync_frames: int = 24, take_prealloc_mb: int = 2048,
+                 write_direct: bool = False, write_pending_mb: int = 256, write_coalesce_mb: int = 32, encoder_pool: DNGEncoderPool = None):
+            self.storage_path=storage_path; self.file_format="dng"; self.max_buffer_frames=max_buffer_frames; self.cfa_pattern_tuple=cfa_pattern; self.target_fps=target_fps
+            self.dng_tile_size = dng_tile_size # Tiled DNG writer (header template + per-tile LJ92); 0 = pidng single strip
+            self.record_mode = record_mode if record_mode in self.RECORD_MODES else "lj92"; self._take_mode = None
+            # take_file: frames go into one preallocated take.fbt (bolex_take.py) per take instead of a DNG per frame
+            self.take_file = take_file; self.take_prealloc_mb = take_prealloc_mb; self._take_file = None; self._template_id = 0
+            # Write stage (bolex_writer.py) behind the encoders: write_pending_mb of encoded frames in the hand-off, take-file frames coalesced
+            # into writes of up to write_coalesce_mb, O_DIRECT if write_direct, fdatasync of the take file every fsync_frames frames (0 = at stop; per-file DNGs are not synced)
+            self.fsync_frames = fsync_frames; self.write_direct = write_direct; self.write_pending_mb = write_pending_mb; self.write_coalesce_mb = write_coalesce_mb
+            self._write_stage = None; self._last_write_stats = {}; self._last_stall_s = 0.0; self.write_errors = 0
+            self._bytes_per_frame = {} # Measured average DNG size per mode (this session), for the storage estimate
+            self._free_bytes = 0; self._free_checked = 0.0; self._storage_estimate = None
             self.actual_camera_wb_gains = list(wb_gains) 
             self.wb_gains = list(wb_gains) 
             if not (isinstance(cfa_pattern, tuple) and len(cfa_pattern) == 4): raise ValueError("cfa_pattern must be a tuple of length 4")
             cfa_map = { (1,2,0,1): CFAPattern.GBRG, (1,0,2,1): CFAPattern.GRBG, (0,1,1,2): CFAPattern.RGGB, (2,1,1,0): CFAPattern.BGGR }
             self.cfa_pattern_enum = cfa_map.get(cfa_pattern, CFAPattern.GBRG)
-            print(f"Recorder initialized for pidng. Max frames: {self.max_buffer_frames}. CFA: {self.cfa_pattern_enum}. Init Cam WB Gains: {self.actual_camera_wb_gains}")
             try:
                 if not os.path.exists(self.storage_path): os.makedirs(self.storage_path); print(f"Created storage dir: {self.storage_path}")
             except OSError as e: print(f"FATAL: No storage dir '{self.storage_path}': {e}"); raise
+            # Encoder pool: N processes (default: all cores but one, which stays with grab/UI). 0 = encode inline on the saver thread.
+            # encoder_pool: an already started pool (forked early, see bolex_encoder); the Recorder owns and shuts it down.
+            # Started before the frame pool is allocated: forked children would otherwise keep its pages mapped (copy-on-write doubling).
+            if encoder_workers is None: encoder_workers = default_workers()
+            self._encoder_pool = encoder_pool
+            if self._encoder_pool is None and encoder_workers > 0:
+                try: self._encoder_pool = DNGEncoderPool(encoder_workers, target_fps=target_fps); self._encoder_pool.start()
+                except Exception as e: print(f"Warn: Encoder pool failed to start ({e}). Encoding inline."); self._encoder_pool = None
+            print(f"Recorder initialized ({self._writer_summary(self.record_mode)}). Max frames: {self.max_buffer_frames}. CFA: {self.cfa_pattern_enum}. Init Cam WB Gains: {self.actual_camera_wb_gains}")
+            # Raw frames live in a fixed MB budget of preallocated slots (+ SSD spill file); the queue only carries slot refs.
+            # pack_12bit: slots hold BayerGB12 packed to 12 bits (3 bytes per 2 pixels) from add_frame() to the DNG writer
+            self._frame_pool = RawFramePool(buffer_budget_mb, frame_shape, spill_dir=self.storage_path, spill_budget_mb=spill_budget_mb, packed=pack_12bit)
+            self._last_drop_warn = 0.0
+            # Per-take sidecar index (index.fbi) and camera-side drop detection from block ID gaps / skipped images
+            self._take_index = None; self._reset_drop_tracking()
             self._is_recording=False; self.current_recording_folder=None; self.frame_save_count=0; self.total_frames_added_this_segment=0; self._frame_queue=queue.Queue(); self._save_thread=None
-            self.tags = None; self.converter = RAW2DNG(); self.converter_options_set = False
-
+            self.tags = None; self._dng_writer = None; self._pool_in_use = False; self.converter_options_set = False
     def update_wb_gains(self, new_gains: list):
         if len(new_gains) == 3 and all(isinstance(g, (float, int)) and g > 1e-9 for g in new_gains):
             self.actual_camera_wb_gains = list(new_gains) 
@@ -44,25 +109,34 @@ class Recorder:
                     as_shot_neutral_rationals = [[1 * asn_denominator, asn_denominator]] * 3
                     self.tags.set(Tag.AsShotNeutral, as_shot_neutral_rationals)
                     print(f" -> DNG AsShotNeutral forced to neutral (runtime): {as_shot_neutral_rationals}")
-                    self.converter.options(self.tags, path="", compress=True)
+                    if self._dng_writer is not None: self._dng_writer.update_tags(self.tags)
+                    if self._take_file is not None: self._template_id = self._take_file.add_template(self._dng_writer) # Later frames reference the new header
+                    if self._pool_in_use: self._encoder_pool.update_tags(self.tags, compress=True, template_id=self._template_id)
                     print(" -> Converter DNG options updated with new WB and compression.")
                 except Exception as e: print(f"Error updating DNG AsShotNeutral to neutral (runtime): {e}")
         else: print(f"Error: Invalid WB gains format received: {new_gains}")
 
-    def start_recording(self): # Identical
+    def set_record_mode(self, mode: str) -> bool:
+        # Takes effect with the next start_recording(); a running take keeps its mode
+        if mode not in self.RECORD_MODES: print(f"Error: Unknown record mode '{mode}' (use {', '.join(self.RECORD_MODES)})"); return False
+        self.record_mode = mode; self._storage_estimate = None
+        print(f"Record mode: {mode}{' (applies to the next take)' if self._is_recording else ''}"); return True
+
+    def start_recording(self):
         if self._is_recording: return False
         now=datetime.now(); folder_name=now.strftime("%Y%m%d_%H%M%S"); self.current_recording_folder=os.path.join(self.storage_path, folder_name)
         try: 
             os.makedirs(self.current_recording_folder);
             while not self._frame_queue.empty():
-                 try: self._frame_queue.get_nowait()
+                 try: item = self._frame_queue.get_nowait(); self._frame_pool.release(item[0]) if item is not None else None
                  except queue.Empty: break
-            self.frame_save_count=0; self.total_frames_added_this_segment=0; self._is_recording=True; self.converter_options_set = False; self.tags = None
+            self._frame_pool.reset_stats(); self._reset_drop_tracking()
+            self.frame_save_count=0; self.total_frames_added_this_segment=0; self._take_mode = self.record_mode; self._is_recording=True; self.converter_options_set = False; self.tags = None
             self._save_thread=threading.Thread(target=self._save_worker, name="SaveWorker", daemon=True); self._save_thread.start()
             print(f"Recording started. Saving to: {self.current_recording_folder}"); return True
         except OSError as e: print(f"Error creating recording folder: {e}"); self.current_recording_folder=None; self._is_recording=False; self._save_thread=None; return False
 
-    def stop_recording(self): # Identical
+    def stop_recording(self):
         if not self._is_recording: return
         self._is_recording=False; print(f"Stopping recording. Frames added: {self.total_frames_added_this_segment}. Waiting saver..."); self._frame_queue.put(self._STOP_SENTINEL)
         if self._save_thread is not None and self._save_thread.is_alive():
@@ -71,16 +145,35 @@ class Recorder:
              else: print("Saver thread finished.")
         self.current_recording_folder=None; self._save_thread=None
 
-    def add_frame(self, raw_frame: np.ndarray): # Identical
+    def _reset_drop_tracking(self):
+        self._last_block_id = 0; self._drops_pending = 0; self.camera_dropped = 0; self.gap_events = 0
+
+    def add_frame(self, raw_frame: np.ndarray, meta: dict = None, gain: int = -1, exposure_us: int = -1):
+        # meta: per-frame dict from core_module.get_frame (block_id, camera_timestamp, skipped_images, host_time_s); None for synchronous grabs
         if not self._is_recording or raw_frame is None or raw_frame.size == 0: return
         if self.total_frames_added_this_segment>=self.max_buffer_frames:
              if self._is_recording: print(f"Max frames ({self.max_buffer_frames}) reached."); self.stop_recording()
              return
-        try: self._frame_queue.put(raw_frame); self.total_frames_added_this_segment += 1
+        try:
+            block_id = camera_ts = 0; host_time = time.monotonic()
+            if meta is not None:
+                block_id = meta.get('block_id', 0); camera_ts = meta.get('camera_timestamp', 0); host_time = meta.get('host_time_s', host_time)
+                # Block ID gaps and Pylon's skipped-image count see the same lost frames from two sides; count the larger, not the sum
+                missed = max(block_id_gap(self._last_block_id, block_id), meta.get('skipped_images', 0))
+                if block_id: self._last_block_id = block_id
+                if missed: self.camera_dropped += missed; self.gap_events += 1; self._drops_pending += missed; print(f"WARN: Camera dropped {missed} frame(s) before block {block_id} ({self.camera_dropped} this take).")
+            ref = self._frame_pool.store(raw_frame)
+            if ref is None: # Pool and spill file both exhausted: drop this frame, keep the take going
+                self._drops_pending += 1; now = time.monotonic()
+                if now - self._last_drop_warn > 1.0: self._last_drop_warn = now; print(f"WARN: Frame buffer and spill file full, dropping frames ({self._frame_pool.get_stats()['dropped']} so far).")
+                return
+            index_meta = (self._drops_pending, block_id, camera_ts, host_time, int(gain), int(exposure_us)); self._drops_pending = 0
+            self._frame_queue.put((ref, index_meta)); self.total_frames_added_this_segment += 1
         except Exception as e: print(f"Error queueing frame: {e}")
 
     def _save_worker(self): # From your "Color Science Fixed Version" script
-        print(f"Saver thread started (pidng Mode - Camera Applies WB).")
+        take_mode = self._take_mode; compress = take_mode == "lj92"
+        print(f"Saver thread started ({self._writer_summary(take_mode)}; camera applies WB).")
         frames_processed=0; save_errors=0; worker_active=True
         first_frame_shape = None; debug_first_frame = True; denominator = 1000000
         bolex_stdA_matrix_floats = [1.4296849, -0.7867698, 0.2219452, -0.2511404, 0.9766861, 0.2091821, -0.0839671, 0.1939601, 0.6574579]
@@ -102,20 +195,23 @@ class Recorder:
         self.tags.set(Tag.CalibrationIlluminant1, illuminant_stdA); self.tags.set(Tag.CalibrationIlluminant2, illuminant_d65)
         self.tags.set(Tag.BaselineExposure, baseline_exposure_srational); self.tags.set(Tag.BayerGreenSplit, bayer_green_split)
         initial_exposure_us = -1; 
-        try: initial_exposure_us = core_module.get_exposure(); 
+        try: initial_exposure_us = core_module.get_camera_state()['exposure_us']; 
         except Exception: pass
         if initial_exposure_us > 0: exposure_s = initial_exposure_us / 1_000_000.0; exp_num = int(round(exposure_s * 1000000)); exp_den = 1000000; self.tags.set(Tag.ExposureTime, [[exp_num, exp_den]])
         self.tags.set(Tag.DNGVersion, DNGVersion.V1_4); self.tags.set(Tag.DNGBackwardVersion, DNGVersion.V1_2)
         self.tags.set(Tag.UniqueCameraModel, make)
-        self.converter = RAW2DNG(); self.converter_options_set = False
+        self._dng_writer = None; self._pool_in_use = False; self.converter_options_set = False
         while worker_active:
             try:
-                frame_data = self._frame_queue.get()
-                if frame_data is self._STOP_SENTINEL: worker_active=False; self._frame_queue.task_done(); print(f"Saver stop signal..."); break
+                item = self._frame_queue.get()
+                if item is self._STOP_SENTINEL: worker_active=False; self._frame_queue.task_done(); print(f"Saver stop signal..."); break
+                frame_ref, index_meta = item
+                try: frame_data = self._frame_pool.load(frame_ref)
+                except Exception as e: print(f"ERROR reading buffered frame: {e}"); self._frame_pool.release(frame_ref); save_errors += 1; self._frame_queue.task_done(); continue
                 if not self.converter_options_set:
                     if frame_data is not None and frame_data.size > 0:
-                        first_frame_shape = frame_data.shape; print(f" -> Detected frame shape: {first_frame_shape}")
-                        height, width = first_frame_shape
+                        first_frame_shape = frame_data.shape; height, width = self._frame_pool.frame_shape # Slot may be packed: pixel size from the pool
+                        print(f" -> Detected frame shape: {(height, width)}{' (12-bit packed in RAM)' if self._frame_pool.packed else ''}")
                         self.tags.set(Tag.ImageWidth, int(width)); self.tags.set(Tag.ImageLength, int(height))
                         self.tags.set(Tag.DefaultCropOrigin, (0, 0)); self.tags.set(Tag.DefaultCropSize, (int(height), int(width)))
                         try: # AsShotNeutral forced to neutral
@@ -123,38 +219,227 @@ class Recorder:
                             self.tags.set(Tag.AsShotNeutral, as_shot_neutral_rationals)
                             print(f" -> DNG AsShotNeutral forced to neutral (initial set): {as_shot_neutral_rationals}")
                         except Exception as wb_e: print(f"Warn: Error setting forced neutral AsShotNeutral: {wb_e}"); self.tags.set(Tag.AsShotNeutral, [[10000,10000]]*3)
-                        self.converter.options(self.tags, path="", compress=True); self.converter_options_set = True
+                        # raw12 is written inline: one writev of header + pool slot, cheaper than the copy into a worker's slot
+                        self._pool_in_use = self._encoder_pool is not None and self._encoder_pool.failed is None and compress
+                        if not self._pool_in_use: self._write_stage = WriteStage(**self._write_opts(1), name="WriteStage")
+                        if not self._pool_in_use or self.take_file: self._dng_writer = make_dng_writer(self.tags, int(width), int(height), compress=compress, tile_size=self.dng_tile_size, threads=0) # Inline: tiles on all cores
+                        if self.take_file: self._open_take_file(int(width), int(height), bits_per_sample, compress)
+                        self.converter_options_set = True
+                        try: self._take_index = TakeIndexWriter(self.current_recording_folder, int(width), int(height), self.target_fps)
+                        except OSError as e: print(f"Warn: Could not create take index: {e}"); self._take_index = None
+                        if self._pool_in_use:
+                            self._encoder_pool.reset_stats(); self._encoder_pool.on_done = self._frame_written
+                            self._encoder_pool.configure((int(height), int(width)), self.tags, compress=True, tile_size=self.dng_tile_size, packed=self._frame_pool.packed,
+                                                         take_path=self._take_file.path if self._take_file is not None else None, template_id=self._template_id,
+                                                         write_opts=self._write_opts(self._encoder_pool.num_workers))
                         print(f"Saver starting frame {self.frame_save_count}...")
-                    else: self._frame_queue.task_done(); continue
-                if not self.converter_options_set: self._frame_queue.task_done(); continue
+                    else: self._frame_pool.release(frame_ref); self._frame_queue.task_done(); continue
+                if not self.converter_options_set: self._frame_pool.release(frame_ref); self._frame_queue.task_done(); continue
                 if self.current_recording_folder and frame_data is not None and frame_data.size > 0 and first_frame_shape is not None:
                     if debug_first_frame:
                         debug_first_frame = False
                     filename=f"frame_{self.frame_save_count:06d}"; filepath_no_ext = os.path.join(self.current_recording_folder, filename)
                     try:
-                        if frame_data.dtype != np.uint16: frame_data = frame_data.astype(np.uint16)
                         if frame_data.shape != first_frame_shape: raise ValueError("Frame shape mismatch!")
-                        self.converter.convert(frame_data, filename=filepath_no_ext)
+                        if self._take_index is not None: self._take_index.add(self.frame_save_count, index_meta) # Size is filled in once the DNG is on disk
+                        pooled = self._pool_in_use and self._write_stage is None # A write stage next to the pool: it lost a worker, inline from then on
+                        if pooled and not self._encoder_pool.submit(frame_data, filepath_no_ext, self.frame_save_count): pooled = False; self._encode_inline_from_here(compress) # Blocks while all slots are busy
+                        if not pooled and not hasattr(self._dng_writer, "encode"): # pidng: encodes and writes in one call
+                            out_path, nbytes = self._dng_writer.write(frame_data, filepath_no_ext)
+                            self._frame_written(self.frame_save_count, nbytes)
+                        elif not pooled: # Encode here, hand over to the write stage
+                            parts = self._dng_writer.encode(frame_data); written_ref = None
+                            if not self._dng_writer.compress: # Uncompressed parts are the pool slot itself: released once written. Reused buffers (spill scratch) are copied.
+                                if frame_ref[0] == POOL_MEM and frame_data.dtype == np.uint8: written_ref = frame_ref; frame_ref = None
+                                else: parts = [bytes(memoryview(p).cast("B")) for p in parts]
+                            done = self._write_done(self.frame_save_count, written_ref)
+                            if self._take_file is not None: self._write_stage.submit_chunk(self._take_file, self.frame_save_count, self._template_id, parts, done=done)
+                            else: self._write_stage.submit_file(filepath_no_ext + ".dng", [self._dng_writer.build_header(parts)] + parts, done=done)
                         self.frame_save_count += 1; frames_processed += 1
                     except Exception as e: print(f"ERROR saving DNG {filepath_no_ext}.dng: {e}\n{traceback.format_exc()}"); save_errors += 1
                 else: print("Saver skip item.")
+                if frame_ref is not None: self._frame_pool.release(frame_ref) # Pool submit/encode have copied or consumed the frame by now
                 self._frame_queue.task_done()
             except queue.Empty: time.sleep(0.005)
             except Exception as e: print(f"FATAL error in saver thread: {e}\n{traceback.format_exc()}"); save_errors += 1; worker_active = False
+        if self._pool_in_use and self.converter_options_set:
+            self._encoder_pool.drain(); st = self._encoder_pool.get_stats()
+            print(f"Encoder pool drained. Encoded: {st['encoded']}, Worker errors: {st['worker_errors']}, {st['fps']:.1f} fps / {st['mb_per_s']:.1f} MB/s (target {st['target_fps']:.0f} fps), avg {st['avg_encode_ms']:.0f} ms/frame")
+            self._encoder_pool.on_done = None; self._last_write_stats = self._encoder_pool.get_write_stats()
+        if self._write_stage is not None:
+            self._write_stage.close(); self._last_write_stats = self._write_stage.get_stats(); self._write_stage = None
+        w = self._last_write_stats
+        if w.get("writes"):
+            print(f"Write stage: {w['frames']} frames in {w['writes']} writes ({w['frames_per_write']:.1f}/write), {w['mb_per_s']:.1f} MB/s sustained, "
+                  f"latency p50/p95/p99/max {w['p50_ms']:.1f}/{w['p95_ms']:.1f}/{w['p99_ms']:.1f}/{w['max_ms']:.1f} ms, encoders stalled {w['stall_s']:.2f} s, errors {w['errors']}")
+        if self._take_file is not None:
+            take_path = self._take_file.path; frames = self._take_file.close(); self._take_file = None
+            print(f"Take file closed: {frames} frames, {os.path.getsize(take_path) / 1e6:.1f} MB -> {take_path}")
+        if self._take_index is not None:
+            index_path = self._take_index.path; self._take_index.close(); self._take_index = None
+            try:
+                cad = TakeIndex(index_path).cadence()
+                print(f"Take index: {cad['frames']} frames ({cad['written']} written), {cad['dropped']} dropped, camera {cad.get('camera_fps', 0):.2f} fps / host {cad.get('host_fps', 0):.2f} fps -> {index_path}")
+            except Exception as e: print(f"Warn: Could not summarise take index: {e}")
         print(f"Saver thread exiting. Processed: {frames_processed}, Errors: {save_errors}")
 
+    def _encode_inline_from_here(self, compress: bool):
+        # The encoder pool lost a worker mid-take (submit() returned False): this and later frames are encoded on the saver thread
+        print(f"ERROR: {self._encoder_pool.failed or 'encoder pool stopped taking frames'}; encoding inline for the rest of this take.")
+        self._write_stage = WriteStage(**self._write_opts(1), name="WriteStage")
+        if self._dng_writer is None:
+            height, width = self._frame_pool.frame_shape
+            self._dng_writer = make_dng_writer(self.tags, int(width), int(height), compress=compress, tile_size=self.dng_tile_size, threads=0)
+
+    def _writer_summary(self, mode: str) -> str:
+        # The DNG path a take in `mode` goes through (make_dng_writer; LJ92 on the encoder pool if there is one, raw12 always inline)
+        if mode == "raw12": writer = "packed 12-bit DNG, inline"
+        else:
+            writer = f"tiled LJ92 DNG, {self.dng_tile_size} px tiles, {'native' if native_tile_encoder() else 'pidng'} tile encoder" if self.dng_tile_size > 0 else "pidng single-strip LJ92 DNG"
+            writer += f", {self._encoder_pool.num_workers} encoder process(es)" if self._encoder_pool is not None and self._encoder_pool.failed is None else ", inline"
+        return f"{mode}: {writer} -> {'take file' if self.take_file else 'DNG per frame'}"
+
+    def _open_take_file(self, width: int, height: int, bits: int, compress: bool):
+        if not hasattr(self._dng_writer, "template"): print("Warn: Take file needs the tiled/packed DNG writer; writing DNG files for this take."); return
+        try:
+            self._take_file = TakeFileWriter(os.path.join(self.current_recording_folder, TAKE_FILENAME), width, height, bits, self.target_fps,
+                                             CODEC_LJ92 if compress else CODEC_RAW12, self.take_prealloc_mb)
+            self._template_id = self._take_file.add_template(self._dng_writer)
+            stages = self._encoder_pool.num_workers if self._pool_in_use else 1; fsync = self._write_opts(stages)["fsync_frames"]
+            print(f"Take file durability: {'fdatasync every %d frame(s) per write stage (%d stage(s))' % (fsync, stages) if fsync else 'fdatasync at stop only'}")
+        except OSError as e: print(f"Warn: Could not create take file ({e}); writing DNG files for this take."); self._take_file = None
+
+    def _write_opts(self, stages: int) -> dict:
+        # WriteStage arguments, split over `stages` (one per encoder worker): same total hand-off and roughly the same fsync cadence
+        fsync = max(1, self.fsync_frames // stages) if self.fsync_frames else 0
+        return {"max_pending_mb": max(16, self.write_pending_mb // stages), "coalesce_mb": self.write_coalesce_mb, "direct": self.write_direct, "fsync_frames": fsync, "storage_path": self.storage_path}
+
+    def _write_done(self, frame_number: int, frame_ref):
+        # Write stage callback (its thread): slot back to the pool if the frame was written straight from it, then the usual bookkeeping
+        def done(nbytes: int, offset: int, err: str):
+            if frame_ref is not None: self._frame_pool.release(frame_ref)
+            if err is None: self._frame_written(frame_number, nbytes, offset)
+            else: self.write_errors += 1; print(f"ERROR writing frame {frame_number}: {err}")
+        return done
+
+    def _frame_written(self, frame_number: int, nbytes: int, offset: int = 0):
+        # A frame is on disk (saver thread, or the encoder pool's collector): take index/take file index + running size per frame for the estimate
+        if self._take_index is not None: self._take_index.mark_written(frame_number, nbytes, offset)
+        if self._take_file is not None: self._take_file.note(frame_number, offset, nbytes)
+        mode = self._take_mode; avg = self._bytes_per_frame.get(mode)
+        self._bytes_per_frame[mode] = nbytes if avg is None else avg + (nbytes - avg) * 0.02
+
+    def get_storage_estimate(self) -> dict:
+        # Data rate and SSD runway of the selected mode at target_fps; free space is re-read every 2 s, not per UI frame
+        now = time.monotonic()
+        if self._storage_estimate is not None and now - self._free_checked < 2.0: return self._storage_estimate
+        try: self._free_bytes = shutil.disk_usage(self.storage_path).free
+        except OSError: self._free_bytes = 0
+        self._free_checked = now; mode = self.record_mode
+        raw12_bytes = frame_bytes(self._frame_pool.frame_shape, packed=True) + 4096 # + DNG header
+        per_frame = self._bytes_per_frame.get(mode) or (raw12_bytes if mode == "raw12" else raw12_bytes * self.LJ92_SIZE_ESTIMATE)
+        rate = per_frame * self.target_fps
+        self._storage_estimate = {"mode": mode, "measured": mode in self._bytes_per_frame, "mb_per_s": rate / 1e6, "free_gb": self._free_bytes / 1e9,
+                                  "minutes_left": self._free_bytes / rate / 60.0 if rate > 0 else 0.0}
+        return self._storage_estimate
+
     def is_recording(self) -> bool: return self._is_recording
-    def get_queue_size(self) -> int: return self._frame_queue.qsize()
+    def get_queue_size(self, detailed: bool = False):
+        # Plain int (frames waiting) by default; detailed=True adds frame pool occupancy, high-water mark, spill, pool drops and camera-side drops.
+        pending = self._frame_queue.qsize() + (self._encoder_pool.in_flight() if self._encoder_pool is not None else 0)
+        if not detailed: return pending
+        stats = self._frame_pool.get_stats(); stats["pending"] = pending; stats["camera_dropped"] = self.camera_dropped; stats["gap_events"] = self.gap_events
+        w = self.get_write_stats(); stats["bottleneck"] = self._bottleneck(pending - w.get("awaiting_write", 0), w); return stats
+    def get_encoder_stats(self) -> dict: return self._encoder_pool.get_stats() if self._encoder_pool is not None else {}
+    def get_write_stats(self) -> dict:
+        # Write stage of the running take (the saver's, or the encoder workers' combined); the last take's once stopped
+        if self._pool_in_use and self._encoder_pool is not None and self._is_recording: return self._encoder_pool.get_write_stats()
+        stage = self._write_stage
+        return stage.get_stats() if stage is not None else self._last_write_stats
+    def _bottleneck(self, raw_waiting: int, write_stats: dict) -> str:
+        # With frames piling up: DISK if encoders were blocked on a full write hand-off since the last check, or encoded frames are
+        # stuck behind the disk; otherwise CPU (raw frames waiting on encoders)
+        if raw_waiting < 4: return None
+        stall = write_stats.get("stall_s", 0.0); stalled = stall > self._last_stall_s + 0.01; self._last_stall_s = stall
+        workers = self._encoder_pool.num_workers if self._pool_in_use and self._encoder_pool is not None else 1
+        backlog = write_stats.get("pending_mb", 0.0) > write_stats.get("max_pending_mb", 1.0) / 2 or write_stats.get("awaiting_write", 0) >= 4 * workers
+        return "DISK" if stalled or backlog else "CPU"
+    def shutdown(self):
+        if self._is_recording: self.stop_recording()
+        if self._encoder_pool is not None: self._encoder_pool.shutdown(); self._encoder_pool = None
+        self._frame_pool.close()
 # ---------------------------------------
 
 # --- Initialize Camera, Recorder (Identical to your baseline) ---
 print("Initializing camera via C++ module...")
-if not core_module.initialize_camera(): exit("Failed to initialize camera.")
-print("Camera initialization successful (C++).")
+if not core_module.initialize_camera(CAMERA_CONFIG, power_on_default=CAMERA_POWER_ON_DEFAULT): exit("Failed to initialize camera.")
+if hasattr(core_module, "get_init_timing"):
+    init_timing = core_module.get_init_timing()
+    print(f"Camera initialization successful ({init_timing['config_source']} configuration: open {init_timing['open_ms']:.0f} ms, config {init_timing['config_ms']:.0f} ms, start {init_timing['start_ms']:.0f} ms).")
+else: print("Camera initialization successful (C++).")
+
+PREVIEW_BLACK_LEVEL = 30 # 12-bit raw code, as the DNG BlackLevel and the scopes
+def apply_preview_options(lut_kind: str, wb_gains: list):
+    # Preview WB (the raw is never balanced) and display LUT, folded into the capture thread's per-channel tables
+    if not hasattr(core_module, "set_preview_options"): return # Older core_module build: fixed linear preview
+    core_module.set_preview_options(PREVIEW_EVERY, PREVIEW_DECIMATION, list(wb_gains), PREVIEW_BLACK_LEVEL, display_lut(lut_kind, PREVIEW_BLACK_LEVEL))
+preview_lut = PREVIEW_LUT if PREVIEW_LUT in LUT_KINDS else "linear"
+apply_preview_options(preview_lut, [1.0, 1.0, 1.0]) # Camera WB results update it (handle_camera_command_results)
+print(f"Preview: {preview_lut} LUT, every {PREVIEW_EVERY} frame(s), cell decimation {PREVIEW_DECIMATION}.")
+use_capture_thread = core_module.start_capture() # Native capture thread; falls back to synchronous grabs if it can't start
+print(f"Capture mode: {'background thread' if use_capture_thread else 'synchronous grab'}")
+# Raw arrays become read-only views of the Pylon buffers; Recorder.add_frame copies them into its pool straight away, releasing the buffer
+if use_capture_thread: core_module.set_zero_copy_raw(True)
+startup.mark("camera")
+
+# --- Early preview: window and first frame before the recorder, fonts, overlay and gamepad are set up ---
+import cv2
+WINDOW_NAME = "Faux Bolex Camera UI"
+if not HEADLESS:
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+    try: cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    except cv2.error as e: print(f"Warn: Fullscreen property failed: {e}")
+
+def show_startup_preview(timeout_s: float = 0.0) -> bool:
+    # Newest frame so far (timeout_s > 0: wait for one), preview shown bare; its raw is dropped, nothing records before the main loop.
+    # Called between setup phases (startup.on_mark) so the picture keeps moving while the rest loads. True once a frame was shown.
+    if use_capture_thread:
+        entry = core_module.get_frame(timeout_s) if timeout_s > 0 else core_module.try_get_frame()
+        preview, raw = (entry[0], entry[1]) if entry is not None else (None, None)
+        while (entry := core_module.try_get_frame()) is not None:
+            raw = entry[1]; preview = entry[0] if entry[0] is not None else preview
+    else: preview, raw = core_module.grab_preview_and_raw(PREVIEW_EVERY > 0)
+    if preview is not None and preview.size > 0:
+        if not HEADLESS: cv2.imshow(WINDOW_NAME, preview); cv2.waitKey(1)
+        return True
+    return PREVIEW_EVERY == 0 and raw is not None # Raw only: the first frame is the milestone
+first_frame_deadline = time.monotonic() + 5.0
+while not show_startup_preview(0.5) and time.monotonic() < first_frame_deadline: pass
+startup.milestone("first_preview"); startup.mark("first preview"); startup.on_mark = show_startup_preview
+
+# --- Deferred imports: DNG tags, frame pool, overlay, scopes, fonts, gamepad ---
+from pidng.defs import CFAPattern, CalibrationIlluminant, DNGVersion, Orientation, PhotometricInterpretation
+from pidng.core import DNGTags, Tag
+from PIL import ImageFont
+pygame = None
+if not HEADLESS:
+    try: import pygame
+    except ImportError: pass # Gamepad support is optional (dev boxes, CI)
+from bolex_framepool import RawFramePool, POOL_MEM
+from bolex_overlay import OverlayCompositor
+from bolex_scopes import ScopesEngine, SCOPE_VIEWS, next_scope_view
+from bolex_index import TakeIndexWriter, TakeIndex, block_id_gap
+from bolex_dng import make_dng_writer, native_tile_encoder
+from bolex_pack12 import frame_bytes
+from bolex_take import TakeFileWriter, TAKE_FILENAME, CODEC_LJ92, CODEC_RAW12
+from bolex_writer import WriteStage
+startup.mark("imports")
+
 try:
     assumed_cfa_tuple = (1, 2, 0, 1); print(f"Using CFA Pattern Tuple for DNG: {assumed_cfa_tuple}")
-    recorder = Recorder( storage_path="/home/ooze3d/digitalbolex/storage/", cfa_pattern=assumed_cfa_tuple, wb_gains=[1.0, 1.0, 1.0] )
+    recorder = Recorder( storage_path=STORAGE_PATH, cfa_pattern=assumed_cfa_tuple, wb_gains=[1.0, 1.0, 1.0], encoder_workers=encoder_workers, buffer_budget_mb=BUFFER_BUDGET_MB, record_mode=RECORD_MODE, take_file=TAKE_FILE, write_direct=WRITE_DIRECT, encoder_pool=encoder_pool )
 except Exception as e: exit(f"FATAL: Could not initialize Recorder: {e}")
+startup.mark("recorder")
 
 # --- Pillow Font UI Setup ---
 ui_font_main = None; ui_font_status = None
@@ -169,6 +454,7 @@ try:
         print(f"Custom font '{font_path_roboto_condensed}' loaded successfully.")
     else: print(f"Error: Font file not found at '{font_path_roboto_condensed}'. OpenCV fonts will be used.")
 except IOError as e: print(f"Error loading font '{font_path_roboto_condensed}': {e}. OpenCV fonts will be used.")
+startup.mark("fonts")
 
 TEXT_COLOR_PIL_MAIN = (200, 200, 200); TEXT_COLOR_PIL_STATUS = (200, 200, 200); RECORD_DOT_COLOR_PIL = (0, 0, 200)
 TEXT_COLOR_CV_MAIN = (200, 200, 200); TEXT_COLOR_CV_STATUS = (200, 200, 200); RECORD_DOT_COLOR_CV = (200, 0, 0)
@@ -205,187 +491,177 @@ FG_RIGHT_X = PREVIEW_CONTENT_WIDTH # Or PREVIEW_CONTENT_WIDTH - (FRAME_GUIDE_BOR
 
 print(f"Frame Guide Calculated: X={FG_LEFT_X}-{FG_RIGHT_X}, Y={FG_TOP_Y}-{FG_BOTTOM_Y}, Height={FG_HEIGHT}")
 
+def format_storage_status(est: dict) -> str:
+    # "LJ92 ~56 MB/s  SSD 41 min" (~ while the rate is still the built-in estimate, not measured this session)
+    return f"{est['mode'].upper()} {'' if est['measured'] else '~'}{est['mb_per_s']:.0f} MB/s  SSD {est['minutes_left']:.0f} min"
+
+def format_write_stats(w: dict) -> str:
+    # "W 58 MB/s p95 14 ms  SSD 41 min": write stage measured this take (recent rate, latency per write call, runway at that rate)
+    text = f"W {w.get('recent_mb_per_s', 0.0):.0f} MB/s p95 {w.get('p95_ms', 0.0):.0f} ms"
+    if w.get("runway_min") is not None: text += f"  SSD {w['runway_min']:.0f} min"
+    return text
+
+def format_queue_status(q: dict) -> str:
+    # "Q: pending  BUF: occupancy% (HW high-water)  SP: spilled", plus DROP (pool and spill both full) and GAP (camera/link drops) counts
+    text = f"Q: {q['pending']}  BUF: {q['occupancy']*100:.0f}% (HW {q['high_water']}/{q['capacity']})"
+    if q['spilled']: text += f"  SP: {q['spilled']}"
+    if q['dropped']: text += f"  DROP: {q['dropped']}!"
+    if q.get('camera_dropped'): text += f"  GAP: {q['camera_dropped']}!" # Frames the camera sent that never reached the host
+    if q.get('bottleneck'): text += f"  [{q['bottleneck']}]" # Which stage the queue is waiting on
+    return text
+
 # --- Config, Window, Gamepad Init (Identical to your baseline) ---
-WINDOW_NAME = "Faux Bolex Camera UI"; DISPLAY_WIDTH = 1024; DISPLAY_HEIGHT = 600;
-CLIPPING_THRESHOLD = 245; TARGET_FPS_FOR_ANGLE = 24.0; show_clipping = False
-cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
-try: cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-except cv2.error as e: print(f"Warn: Fullscreen property failed: {e}")
-pygame.init(); pygame.joystick.init(); gamepad = None
-joystick_count = pygame.joystick.get_count()
-if joystick_count > 0: gamepad = pygame.joystick.Joystick(0); gamepad.init(); print(f"Gamepad '{gamepad.get_name()}' init.")
-else: print("No gamepad detected.")
+DISPLAY_WIDTH = 1024; DISPLAY_HEIGHT = 600;
+TARGET_FPS_FOR_ANGLE = 24.0; show_clipping = False; scope_view = "off" # Clip overlay and scopes come from the raw (bolex_scopes), not the 8-bit preview
+if SCOPE_VIEW == "clip": show_clipping = True
+elif SCOPE_VIEW in SCOPE_VIEWS: scope_view = SCOPE_VIEW
+gamepad = None
+if pygame is not None and not HEADLESS:
+    pygame.init(); pygame.joystick.init()
+    joystick_count = pygame.joystick.get_count()
+    if joystick_count > 0: gamepad = pygame.joystick.Joystick(0); gamepad.init(); print(f"Gamepad '{gamepad.get_name()}' init.")
+    else: print("No gamepad detected.")
+else: print("No gamepad support (pygame not installed or headless).")
+startup.mark("gamepad")
+
+# --- Overlay Compositor (guide, letterbox and text sprites cached; bench with `python bolex_overlay.py`) ---
+# TEXT_COLOR_CV_* are BGR; the preview frame is RGB, so swap them once here
+CV_MAIN_COLOR_RGB = TEXT_COLOR_CV_MAIN[::-1]; CV_STATUS_COLOR_RGB = TEXT_COLOR_CV_STATUS[::-1]; CV_DOT_COLOR_RGB = RECORD_DOT_COLOR_CV[::-1]
+overlay = OverlayCompositor(PREVIEW_CONTENT_WIDTH, PREVIEW_CONTENT_HEIGHT, FG_TOP_Y, FG_BOTTOM_Y, FRAME_GUIDE_BORDER_THICKNESS, LETTERBOX_DARKEN_FACTOR, ui_font_main, ui_font_status)
+print(f"Overlay compositor ready ({'Pillow' if overlay.use_pil else 'Hershey'} text sprites).")
+scopes = ScopesEngine(cfa=assumed_cfa_tuple, rate_hz=SCOPES_HZ, preview_size=(PREVIEW_CONTENT_WIDTH, PREVIEW_CONTENT_HEIGHT))
+CLIPPING_COLOR_RGB = CLIPPING_COLOR_CV_BGR[::-1]
+startup.mark("overlay")
+bench = None
+if BENCH_SECONDS > 0:
+    from bolex_bench import BenchMetrics; bench = BenchMetrics(BENCH_SECONDS); print(f"Benchmark mode: recording one {BENCH_SECONDS:.0f} s take, headless.")
+startup.on_mark = None; startup.milestone("record_ready"); print(startup.summary())
 print("Starting preview loop...")
-is_running = True; is_recording = False
+is_running = True; is_recording = False; sync_grab_count = 0
 last_fps_time = time.monotonic(); frame_count = 0; display_fps = 0.0
-current_gain = -1; current_exposure = -1; shutter_angle_str = "ANGLE: N/A"
+current_gain = -1; current_exposure = -1; shutter_angle_str = "ANGLE: N/A"; camera_state_version = -1
+
+def next_record_mode(mode: str) -> str: return Recorder.RECORD_MODES[(Recorder.RECORD_MODES.index(mode) + 1) % len(Recorder.RECORD_MODES)]
+
+def handle_camera_command_results():
+    # Results of queued gain/exposure/WB commands (the control thread in core_module runs them; the UI never waits)
+    for res in core_module.poll_command_results():
+        if res['command'] == 'white_balance':
+            if res['ok'] and res['red_gain'] > 0: recorder.update_wb_gains([res['red_gain'], 1.0, res['blue_gain']]); apply_preview_options(preview_lut, recorder.wb_gains)
+            else: print(f" -> Warn: No valid WB ({res.get('error', 'invalid gains')})")
+        elif not res['ok']: print(f" -> Warn: Camera command '{res['command']}' failed: {res.get('error', 'unknown')}")
 
 # --- Main Loop ---
 while is_running:
     try:
         loop_start_time = time.monotonic()
-        preview_frame_rgb_from_cpp, raw_frame = core_module.grab_preview_and_raw() # This IS RGB
+        if use_capture_thread:
+            frame_entry = core_module.get_frame(0.5) # Blocks with the GIL released; None on timeout
+            preview_frame_rgb_from_cpp, raw_frame, frame_meta = frame_entry if frame_entry is not None else (None, None, None)
+            # Frames that queued up while the last overlay was drawn: every raw goes to the recorder, only the newest preview is displayed
+            while (frame_entry := core_module.try_get_frame()) is not None:
+                if is_recording and raw_frame is not None and raw_frame.size > 0: recorder.add_frame(raw_frame, frame_meta, current_gain, current_exposure)
+                queued_preview, raw_frame, frame_meta = frame_entry
+                if queued_preview is not None: preview_frame_rgb_from_cpp = queued_preview # None: the capture thread skipped this frame's preview
+        else:
+            preview_frame_rgb_from_cpp, raw_frame = core_module.grab_preview_and_raw(PREVIEW_EVERY > 0 and sync_grab_count % PREVIEW_EVERY == 0); frame_meta = None # This IS RGB
+            sync_grab_count += 1
         
         frame_to_display = None # This will be the final frame for cv2.imshow
+        have_raw = raw_frame is not None and raw_frame.size > 0
+        if is_recording and have_raw: recorder.add_frame(raw_frame, frame_meta, current_gain, current_exposure) # Recorded whether or not it has a preview
 
         if preview_frame_rgb_from_cpp is not None and preview_frame_rgb_from_cpp.size > 0:
             # --- Calculate dynamic text values ---
-            if is_recording and raw_frame is not None and raw_frame.size > 0: recorder.add_frame(raw_frame)
             frame_count += 1; now = time.monotonic(); elapsed_fps = now - last_fps_time
             if elapsed_fps >= 1.0: display_fps = frame_count / elapsed_fps; frame_count = 0; last_fps_time = now
-            current_gain = core_module.get_gain(); current_exposure = core_module.get_exposure()
-            if current_exposure > 0: angle = (current_exposure / 1_000_000.0) * TARGET_FPS_FOR_ANGLE * 360.0; shutter_angle_str = f"ANGLE: {angle:.0f}"
-            else: shutter_angle_str = "ANGLE: N/A"
+            camera_state = core_module.get_camera_state() # Cached snapshot, no nodemap read; only re-derive strings when it changed
+            if camera_state['version'] != camera_state_version:
+                camera_state_version = camera_state['version']; current_gain = camera_state['gain']; current_exposure = camera_state['exposure_us']
+                if current_exposure > 0: angle = (current_exposure / 1_000_000.0) * TARGET_FPS_FOR_ANGLE * 360.0; shutter_angle_str = f"ANGLE: {angle:.0f}"
+                else: shutter_angle_str = "ANGLE: N/A"
             
-            # --- Frame preparation for drawing overlays ---
-            # Start with the RGB frame from C++. Make a copy for modifications.
-            overlay_target_rgb = preview_frame_rgb_from_cpp.copy()
-
-            # Apply OpenCV-based clipping overlay IF active, directly on the RGB NumPy array
-            if show_clipping:
-                clipped_mask = np.any(overlay_target_rgb > CLIPPING_THRESHOLD, axis=2)
-                clipping_color_rgb_overlay = (CLIPPING_COLOR_CV_BGR[2], CLIPPING_COLOR_CV_BGR[1], CLIPPING_COLOR_CV_BGR[0]) # Convert BGR to RGB
-                overlay_target_rgb[clipped_mask] = clipping_color_rgb_overlay
-
-            if LETTERBOX_DARKEN_FACTOR < 1.0: 
-                if FG_TOP_Y > 0:
-                    overlay_target_rgb[0:FG_TOP_Y, :] = \
-                        (overlay_target_rgb[0:FG_TOP_Y, :] * LETTERBOX_DARKEN_FACTOR).astype(np.uint8)
-                if FG_BOTTOM_Y < PREVIEW_CONTENT_HEIGHT:
-                    overlay_target_rgb[FG_BOTTOM_Y:PREVIEW_CONTENT_HEIGHT, :] = \
-                        (overlay_target_rgb[FG_BOTTOM_Y:PREVIEW_CONTENT_HEIGHT, :] * LETTERBOX_DARKEN_FACTOR).astype(np.uint8)
-
-            if ui_font_main and ui_font_status: # ---- USE PILLOW IF FONTS LOADED ----
-                pil_image = Image.fromarray(overlay_target_rgb) # Pass RGB to Pillow
-                draw = ImageDraw.Draw(pil_image)
-
-                # --- Draw 2.39:1 Frame Guide Border (uses pre-calculated FG_ constants) ---
-                current_frame_guide_color_pil = FRAME_GUIDE_COLOR_RECORDING_PIL if is_recording else FRAME_GUIDE_COLOR_STANDBY_PIL
-
-                draw.rectangle((FG_LEFT_X, FG_TOP_Y, FG_RIGHT_X -1 , FG_BOTTOM_Y -1), outline=current_frame_guide_color_pil, width=FRAME_GUIDE_BORDER_THICKNESS)
-                
-                text_y_start = 15; text_x_margin = 15
-                try: # Robust way to get line height
-                    text_bbox_test = draw.textbbox((0,0), "Tg", font=ui_font_main)
-                    line_height = text_bbox_test[3] - text_bbox_test[1] + 8 
-                except AttributeError: # Fallback for older Pillow
-                    line_height = font_size_main_info + 5
-
-                fps_text = f'FPS: {display_fps:.1f}'
-                draw.text((text_x_margin, text_y_start), fps_text, font=ui_font_main, fill=TEXT_COLOR_PIL_MAIN)
-                
+            # --- Overlays: cached compositor, drawn in place (the preview array is ours, no copy needed) ---
+            overlay_target_rgb = preview_frame_rgb_from_cpp if preview_frame_rgb_from_cpp.flags.writeable else preview_frame_rgb_from_cpp.copy()
+
+            # Raw scopes: the worker gets a decimated copy of this raw when an update is due; draw the latest result (false colour, panel, raw clip cells)
+            if show_clipping or scope_view != "off":
+                scopes.submit(raw_frame, scope_view, show_clipping); scopes.draw(overlay_target_rgb, scope_view, CLIPPING_COLOR_RGB)
+
+            overlay_start_time = time.monotonic(); queue_text_str = None; queue_alert = False
+            if is_recording: # Only show queue size if recording
+                queue_stats = recorder.get_queue_size(detailed=True); queue_text_str = format_queue_status(queue_stats); queue_alert = queue_stats['dropped'] > 0 or queue_stats['camera_dropped'] > 0
+            clip_status_text_str = f"CLIP: {'ON' if show_clipping else 'OFF'}" + (f"  SCOPE: {scope_view.replace('_', ' ').upper()}" if scope_view != "off" else ""); write_stats = recorder.get_write_stats() if is_recording else None
+            storage_text_str = format_write_stats(write_stats) if write_stats and write_stats.get("writes") else format_storage_status(recorder.get_storage_estimate())
+            current_frame_guide_color_pil = FRAME_GUIDE_COLOR_RECORDING_PIL if is_recording else FRAME_GUIDE_COLOR_STANDBY_PIL
+            if overlay.use_pil: # ---- PILLOW FONT SPRITES ----
                 gain_text_str = f"GAIN: {current_gain}" if current_gain != -1 else "GAIN: N/A"
-                try: gain_bbox = draw.textbbox((0,0), gain_text_str, font=ui_font_main); draw.text((DISPLAY_WIDTH-(gain_bbox[2]-gain_bbox[0])-text_x_margin, text_y_start), gain_text_str,font=ui_font_main,fill=TEXT_COLOR_PIL_MAIN)
-                except AttributeError: draw.text((DISPLAY_WIDTH - 200 - text_x_margin, text_y_start), gain_text_str, font=ui_font_main, fill=TEXT_COLOR_PIL_MAIN)
-
-                angle_y_pos = text_y_start + line_height
-                try: angle_bbox = draw.textbbox((0,0), shutter_angle_str, font=ui_font_main); draw.text((DISPLAY_WIDTH-(angle_bbox[2]-angle_bbox[0])-text_x_margin, angle_y_pos), shutter_angle_str,font=ui_font_main,fill=TEXT_COLOR_PIL_MAIN)
-                except AttributeError: draw.text((DISPLAY_WIDTH - 200 - text_x_margin, angle_y_pos), shutter_angle_str, font=ui_font_main, fill=TEXT_COLOR_PIL_MAIN)
-                
-                try: 
-                    status_font_bbox_test = draw.textbbox((0,0), "Q", font=ui_font_status) # For height
-                    status_font_height = status_font_bbox_test[3] - status_font_bbox_test[1]
-                except AttributeError: 
-                    status_font_height = font_size_status_info # Fallback height
-                
-                status_y_pos = PREVIEW_CONTENT_HEIGHT - status_font_height - 10 # Common Y for bottom line
-                
-                clip_status_text_str = f"CLIP: {'ON' if show_clipping else 'OFF'}"
-                try:
-                    clip_bbox = draw.textbbox((0,0), clip_status_text_str, font=ui_font_status)
-                    clip_text_width = clip_bbox[2] - clip_bbox[0]
-                    draw.text((PREVIEW_CONTENT_WIDTH - clip_text_width - text_x_margin, status_y_pos), clip_status_text_str, font=ui_font_status, fill=TEXT_COLOR_PIL_STATUS)
-                except AttributeError: # Fallback for older Pillow if textbbox not available
-                    # Estimate width or use a fixed offset if textbbox fails
-                    draw.text((PREVIEW_CONTENT_WIDTH - 100 - text_x_margin, status_y_pos), clip_status_text_str, font=ui_font_status, fill=TEXT_COLOR_PIL_STATUS)
-                
-                if is_recording: # Only show queue size if recording
-                    queue_text_str = f"Q: {recorder.get_queue_size()}"
-                    draw.text((text_x_margin, status_y_pos), queue_text_str, font=ui_font_status, fill=TEXT_COLOR_PIL_STATUS)
-                    #dot_radius = 8 
-                    #draw.ellipse((DISPLAY_WIDTH-dot_radius*2-text_x_margin, status_y_start+status_font_height//2-dot_radius, DISPLAY_WIDTH-text_x_margin, status_y_start+status_font_height//2+dot_radius), fill=RECORD_DOT_COLOR_PIL)
-                else:
-                    current_frame_guide_color_pil = FRAME_GUIDE_COLOR_STANDBY_PIL   # White
-                # Pillow image is RGB. If imshow on your system displays RGB correctly, pass it directly.
-                frame_to_display = np.array(pil_image) # This is RGB
-
-            else: # ---- FALLBACK TO OPENCV HERSHEY FONTS ----
-                # overlay_target_rgb is RGB. If imshow displays RGB correctly, pass it.
-                # cv2.putText expects BGR and BGR colors. So convert for drawing, then convert back IF NEEDED for imshow.
-                # However, your baseline script passed an RGB frame to cv2.putText and cv2.imshow and colors were fine.
-                # This means cv2.putText was likely drawing with swapped colors on the RGB frame,
-                # or cv2.imshow on your system was re-interpreting.
-
-                # Let's try to replicate your baseline's direct drawing on what we assume is RGB.
-                # The FONT_COLOR_RGB in your baseline was (0, 255, 255) - which is Cyan in RGB, Yellow in BGR.
-                # If preview was perfect, then C++ was RGB, and cv2.putText was drawing "BGR-ordered colors" onto an RGB frame,
-                # and cv2.imshow displayed that RGB frame correctly.
-
-                frame_to_display = overlay_target_rgb # This is RGB
-                font_cv = cv2.FONT_HERSHEY_SIMPLEX; font_scale_cv = 0.8; font_thickness_cv = 2; # From your baseline
-                # Using your original FONT_COLOR_RGB which was (0,255,255)
-                # This is Cyan in RGB. If it looked Yellow, then frame was BGR or imshow swapped.
-                # Assuming your C++ preview frame IS RGB.
-                # TEXT_COLOR_CV_MAIN, _STATUS, _DOT_CV are defined as BGR. Let's use RGB equivalents if drawing on RGB frame.
-                cv_main_color_rgb = (TEXT_COLOR_CV_MAIN[2], TEXT_COLOR_CV_MAIN[1], TEXT_COLOR_CV_MAIN[0])
-                cv_status_color_rgb = (TEXT_COLOR_CV_STATUS[2], TEXT_COLOR_CV_STATUS[1], TEXT_COLOR_CV_STATUS[0])
-                cv_dot_color_rgb = (RECORD_DOT_COLOR_CV[2], RECORD_DOT_COLOR_CV[1], RECORD_DOT_COLOR_CV[0])
-
-                cv2.putText(frame_to_display, f'FPS: {display_fps:.1f}', (15, 30), font_cv, font_scale_cv, cv_main_color_rgb, font_thickness_cv, cv2.LINE_AA)
-                gain_text_cv = f"GAIN(CV2): {current_gain}" if current_gain != -1 else "GAIN: N/A"; text_size_gain_cv, _ = cv2.getTextSize(gain_text_cv, font_cv, font_scale_cv, font_thickness_cv); cv2.putText(frame_to_display, gain_text_cv, (DISPLAY_WIDTH - text_size_gain_cv[0] - 15, 30), font_cv, font_scale_cv, cv_main_color_rgb, font_thickness_cv, cv2.LINE_AA)
-                angle_y_pos_cv = 30 + text_size_gain_cv[1] + 15; text_size_angle_cv, _ = cv2.getTextSize(shutter_angle_str, font_cv, font_scale_cv, font_thickness_cv); cv2.putText(frame_to_display, shutter_angle_str, (DISPLAY_WIDTH - text_size_angle_cv[0] - 15, angle_y_pos_cv), font_cv, font_scale_cv, cv_main_color_rgb, font_thickness_cv, cv2.LINE_AA)
-                clip_status_text_cv = f"CLIP: {'ON' if show_clipping else 'OFF'}"; clip_y_pos_cv = DISPLAY_HEIGHT - 20
-                if is_recording:
-                    cv2.circle(frame_to_display, (DISPLAY_WIDTH - 12 - 15, DISPLAY_HEIGHT - 12 - 15), 12, cv_dot_color_rgb, -1)
-                    queue_text_cv = f"Q: {recorder.get_queue_size()}"; cv2.putText(frame_to_display, queue_text_cv, (15, DISPLAY_HEIGHT - 20), font_cv, font_scale_cv * 0.9, cv_status_color_rgb, font_thickness_cv, cv2.LINE_AA); clip_y_pos_cv -= 25
-                cv2.putText(frame_to_display, clip_status_text_cv, (15, clip_y_pos_cv), font_cv, font_scale_cv*0.9, cv_status_color_rgb, font_thickness_cv, cv2.LINE_AA)
-        else: 
-            frame_to_display = np.zeros((DISPLAY_HEIGHT, DISPLAY_WIDTH, 3), dtype=np.uint8) # Black BGR
-            no_signal_text_cv = "NO SIGNAL"
-            if ui_font_main: # Try Pillow for "NO SIGNAL" on RGB
-                pil_black = Image.new("RGB", (DISPLAY_WIDTH, DISPLAY_HEIGHT), (0,0,0))
-                draw_black = ImageDraw.Draw(pil_black)
-                try:
-                    bbox = draw_black.textbbox((0,0), no_signal_text_cv, font=ui_font_main); draw_black.text(((DISPLAY_WIDTH-(bbox[2]-bbox[0]))//2, (DISPLAY_HEIGHT-(bbox[3]-bbox[1]))//2), no_signal_text_cv, font=ui_font_main, fill=(255,0,0))
-                except AttributeError: draw_black.text((DISPLAY_WIDTH//2-70, DISPLAY_HEIGHT//2-10), no_signal_text_cv, font=ui_font_main, fill=(255,0,0))
-                frame_to_display = np.array(pil_black) # RGB for imshow
-            else: # OpenCV fallback needs BGR for putText, then convert to RGB for imshow if needed
-                  # Or draw with RGB colors if imshow takes RGB and putText handles it.
-                  # For simplicity, let's assume imshow takes RGB, and putText will draw on RGB.
-                  # TEXT_COLOR_CV_MAIN is BGR. (0,0,255) is BGR Red.
-                  cv2.putText(frame_to_display, no_signal_text_cv, (DISPLAY_WIDTH//2-100, DISPLAY_HEIGHT//2), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255,0,0), 2, cv2.LINE_AA) # Draw Blue text on RGB frame
+                frame_to_display = overlay.compose(overlay_target_rgb, current_frame_guide_color_pil, f'FPS: {display_fps:.1f}', gain_text_str, shutter_angle_str, clip_status_text_str,
+                                                   queue_text=queue_text_str, storage_text=storage_text_str, text_color=TEXT_COLOR_PIL_MAIN, status_color=TEXT_COLOR_PIL_STATUS,
+                                                   queue_color=FRAME_GUIDE_COLOR_RECORDING_PIL if queue_alert else None) # Red Q once frames are being dropped
+            else: # ---- FALLBACK TO OPENCV HERSHEY FONT SPRITES ----
+                gain_text_cv = f"GAIN(CV2): {current_gain}" if current_gain != -1 else "GAIN: N/A"
+                frame_to_display = overlay.compose(overlay_target_rgb, current_frame_guide_color_pil, f'FPS: {display_fps:.1f}', gain_text_cv, shutter_angle_str, clip_status_text_str,
+                                                   queue_text=queue_text_str, storage_text=storage_text_str, text_color=CV_MAIN_COLOR_RGB, status_color=CV_STATUS_COLOR_RGB,
+                                                   queue_color=CV_DOT_COLOR_RGB if queue_alert else None, record_dot_color=CV_DOT_COLOR_RGB)
+        elif not have_raw:
+            frame_to_display = overlay.no_signal_frame # Rendered once at startup (RGB)
             time.sleep(0.05)
         
         if frame_to_display is not None:
             # Based on your finding, imshow on your system needs RGB for correct colors.
             # The frame_to_display should be RGB at this point from both Pillow and OpenCV fallback paths.
-            cv2.imshow(WINDOW_NAME, frame_to_display) 
+            if not HEADLESS: cv2.imshow(WINDOW_NAME, frame_to_display) 
+            if bench is not None and preview_frame_rgb_from_cpp is not None: bench.frame_displayed(frame_meta, time.monotonic() - overlay_start_time, time.monotonic() - loop_start_time)
+        if bench is not None: # Fixed-length take: start on the first frame, stop after BENCH_SECONDS, report and leave the loop
+            if not is_recording and bench.t_record is None: is_recording = recorder.start_recording(); bench.start_take()
+            elif is_recording:
+                bench.sample_queue(recorder)
+                if bench.take_done():
+                    bench.t_stop = time.monotonic(); bench_take_folder = recorder.current_recording_folder; is_recording = False; recorder.stop_recording()
+                    bench_result = bench.report(recorder, recorder.get_encoder_stats(), bench_take_folder, core_module.get_capture_stats() if use_capture_thread else None)
+                    bench_result["startup"] = startup.report()
+                    if hasattr(core_module, "get_init_timing"): bench_result["startup"]["camera"] = core_module.get_init_timing()
+                    is_running = False
         
         # Gamepad & Keyboard Event Handling (Identical)
-        BUTTON_RECORD_TOGGLE = 11 ; BUTTON_CLIPPING_TOGGLE = 7; BUTTON_GAIN_UP = 8; BUTTON_GAIN_DOWN = 9; BUTTON_WHITE_BALANCE = 10 
+        BUTTON_RECORD_TOGGLE = 11 ; BUTTON_CLIPPING_TOGGLE = 7; BUTTON_GAIN_UP = 8; BUTTON_GAIN_DOWN = 9; BUTTON_WHITE_BALANCE = 10; BUTTON_RECORD_MODE = 6; BUTTON_SCOPES = 5
         if gamepad:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT: is_running = False
                 if event.type == pygame.JOYBUTTONDOWN:
                     if event.button == BUTTON_RECORD_TOGGLE: is_recording = not is_recording; print(f"Gamepad: R/S. State: {is_recording}"); (recorder.start_recording() if is_recording else recorder.stop_recording())
                     elif event.button == BUTTON_CLIPPING_TOGGLE: show_clipping = not show_clipping; print(f"Gamepad: Clip. State: {'ON' if show_clipping else 'OFF'}")
-                    elif event.button == BUTTON_GAIN_UP: print("Gamepad: Gain Up"); core_module.set_gain(10)
-                    elif event.button == BUTTON_GAIN_DOWN: print("Gamepad: Gain Down"); core_module.set_gain(-10)
-                    elif event.button == BUTTON_WHITE_BALANCE: print("Gamepad: WB"); wb_result=core_module.trigger_wb_and_get_gains(); r_gain,b_gain=wb_result if wb_result and wb_result[0]>0 else (None,None); recorder.update_wb_gains([r_gain,1.0,b_gain]) if r_gain else print(" -> Warn: No valid WB")
-        key = cv2.waitKey(1) & 0xFF
+                    elif event.button == BUTTON_GAIN_UP: print("Gamepad: Gain Up"); core_module.queue_gain_delta(10)
+                    elif event.button == BUTTON_GAIN_DOWN: print("Gamepad: Gain Down"); core_module.queue_gain_delta(-10)
+                    elif event.button == BUTTON_WHITE_BALANCE: print("Gamepad: WB (async)"); core_module.queue_white_balance()
+                    elif event.button == BUTTON_RECORD_MODE: recorder.set_record_mode(next_record_mode(recorder.record_mode))
+                    elif event.button == BUTTON_SCOPES: scope_view = next_scope_view(scope_view); print(f"Gamepad: Scope {scope_view}")
+        handle_camera_command_results()
+        key = cv2.waitKey(1) & 0xFF if not HEADLESS else 0xFF
         if key == 27: is_running = False; print("ESC exit")
         elif key == ord('r'): is_recording = not is_recording; print(f"Key: R/S. State: {is_recording}"); (recorder.start_recording() if is_recording else recorder.stop_recording())
-        elif key == ord('+'): print("Key: Gain Up"); core_module.set_gain(10)
-        elif key == ord('-'): print("Key: Gain Down"); core_module.set_gain(-10)
-        elif key == ord('w'): print("Key: WB"); wb_result=core_module.trigger_wb_and_get_gains(); r_gain,b_gain=wb_result if wb_result and wb_result[0]>0 else (None,None); recorder.update_wb_gains([r_gain,1.0,b_gain]) if r_gain else print(" -> Warn: No valid WB")
+        elif key == ord('+'): print("Key: Gain Up"); core_module.queue_gain_delta(10)
+        elif key == ord('-'): print("Key: Gain Down"); core_module.queue_gain_delta(-10)
+        elif key == ord('w'): print("Key: WB (async)"); core_module.queue_white_balance()
+        elif key == ord('m'): recorder.set_record_mode(next_record_mode(recorder.record_mode))
+        elif key == ord('s'): scope_view = next_scope_view(scope_view); print(f"Key: Scope {scope_view}")
+        elif key == ord('l'): preview_lut = LUT_KINDS[(LUT_KINDS.index(preview_lut) + 1) % len(LUT_KINDS)]; apply_preview_options(preview_lut, recorder.wb_gains); print(f"Key: Preview LUT {preview_lut}")
         elif key == ord('c'): show_clipping = not show_clipping; print(f"Key: Clip. State: {'ON' if show_clipping else 'OFF'}")
     except Exception as loop_exception: print(f"ERROR loop: {loop_exception}\n{traceback.format_exc()}"); is_running = False
 
 # --- Shutdown & Cleanup (Identical) ---
 if gamepad: pygame.joystick.quit(); pygame.quit(); print("Gamepad uninit.") 
-print("Exiting main loop..."); recorder.stop_recording() if 'recorder' in locals() and recorder.is_recording() else None
+print("Exiting main loop..."); scopes.close(); recorder.shutdown() if 'recorder' in locals() else None
 try: print("Shutting down camera..."); core_module.shutdown_camera(); print("Camera shutdown.")
 except Exception as shutdown_exc: print(f"Error C++ shutdown: {shutdown_exc}")
-cv2.destroyAllWindows(); print("Script finished.")
+if bench is not None and 'bench_result' in globals(): # After shutdown, so the encoder workers' peak RSS is in RUSAGE_CHILDREN
+    import json, resource
+    bench_result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0; bench_result["peak_rss_children_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0
+    bench_output = os.environ.get("BOLEX_BENCH_OUTPUT") or os.path.join(STORAGE_PATH, "bench_result.json")
+    with open(bench_output, "w") as f: json.dump(bench_result, f, indent=2)
+    print(f"Benchmark result written to {bench_output}")
+if not HEADLESS: cv2.destroyAllWindows()
+print("Script finished.")
 try: sys.path.remove(cpp_build_dir)
 except ValueError: pass
@@ -0,0 +1,122 @@
+# bolex_bench.py (End-to-end benchmark: runs FauxBolex_Beta_0.93.py headless on the replay camera for a fixed-length take)
+# python bolex_bench.py [--seconds 10] [--fps 24] [--source samples|synthetic|path] [--workers N] [--buffer-mb MB] [--mode lj92|raw12] [--take-file] [--out run.json]
+# python bolex_bench.py --compare base.json new.json
+import os, sys, json, time, resource, platform, subprocess, tempfile, argparse
+import numpy as np
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "FauxBolex_Beta_0.93.py")
+QUEUE_SAMPLE_INTERVAL_S = 0.1
+
+def _dist(values) -> dict:
+    # Summary of a sample list in ms-ready form: count, mean, p50/p95/p99, max
+    if not values: return {"count": 0}
+    a = np.asarray(values, dtype=np.float64)
+    return {"count": int(a.size), "mean": float(a.mean()), "p50": float(np.percentile(a, 50)), "p95": float(np.percentile(a, 95)), "p99": float(np.percentile(a, 99)), "max": float(a.max())}
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try: total += os.path.getsize(os.path.join(root, f))
+            except OSError: pass
+    return total
+
+class BenchMetrics:
+    """Collected inside the main loop when BOLEX_BENCH_SECONDS is set. All times from time.monotonic(), the clock
+    core_module stamps `host_time_s` with, so grab-to-display latency is a plain subtraction."""
+    def __init__(self, seconds: float):
+        self.seconds = seconds; self.t_start = time.monotonic(); self.t_record = None; self.t_stop = None
+        self.latency_ms = []; self.overlay_ms = []; self.loop_ms = []; self.displayed = 0; self.queue_samples = []; self._last_q = 0.0
+
+    def start_take(self): self.t_record = time.monotonic()
+    def take_done(self) -> bool: return self.t_record is not None and time.monotonic() - self.t_record >= self.seconds
+
+    def frame_displayed(self, frame_meta, overlay_s: float, loop_s: float):
+        now = time.monotonic(); self.displayed += 1; self.overlay_ms.append(overlay_s * 1000.0); self.loop_ms.append(loop_s * 1000.0)
+        if frame_meta is not None: self.latency_ms.append((now - frame_meta["host_time_s"]) * 1000.0)
+
+    def sample_queue(self, recorder):
+        now = time.monotonic()
+        if now - self._last_q < QUEUE_SAMPLE_INTERVAL_S: return
+        self._last_q = now; q = recorder.get_queue_size(detailed=True)
+        self.queue_samples.append([round(now - self.t_start, 3), q["pending"], round(q["occupancy"], 4), q["spilled"], q["dropped"], q["camera_dropped"]])
+
+    def report(self, recorder, encoder_stats: dict, take_folder: str, capture_stats: dict = None) -> dict:
+        self.t_stop = self.t_stop or time.monotonic(); span = (self.t_stop - self.t_record) if self.t_record else 0.0
+        q = recorder.get_queue_size(detailed=True); depths = [s[1] for s in self.queue_samples]
+        bytes_on_disk = _dir_bytes(take_folder) if take_folder and os.path.isdir(take_folder) else 0
+        return {"take_seconds": round(span, 3), "frames_added": recorder.total_frames_added_this_segment, "frames_saved": recorder.frame_save_count,
+                "preview_fps": self.displayed / span if span > 0 else 0.0, "grab_to_display_ms": _dist(self.latency_ms), "overlay_ms": _dist(self.overlay_ms),
+                "loop_ms": _dist(self.loop_ms), "queue_depth": {"max": max(depths, default=0), "mean": float(np.mean(depths)) if depths else 0.0, "columns": ["t", "pending", "occupancy", "spilled", "dropped", "camera_dropped"], "samples": self.queue_samples},
+                "pool": {k: q[k] for k in ("capacity", "high_water", "spilled", "dropped", "camera_dropped")}, "encoder": encoder_stats, "write": recorder.get_write_stats(),
+                "encoder_fps": encoder_stats.get("fps", 0.0), "bytes_written": bytes_on_disk, "write_mb_per_s": bytes_on_disk / span / 1e6 if span > 0 else 0.0,
+                "capture": capture_stats or {}, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                "peak_rss_children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0, "take_folder": take_folder}
+
+
+# --- Runner / comparison ---
+COMPARE_KEYS = [("preview_fps", "preview_fps", 1), ("encoder_fps", "encoder_fps", 1), ("write_mb_per_s", "write_mb_per_s", 1),
+                ("write.p95_ms", "write p95 ms", -1), ("write.stall_s", "encoder stall s", -1),
+                ("grab_to_display_ms.p50", "latency p50 ms", -1), ("grab_to_display_ms.p95", "latency p95 ms", -1), ("overlay_ms.mean", "overlay mean ms", -1),
+                ("overlay_ms.p95", "overlay p95 ms", -1), ("queue_depth.max", "queue max", -1), ("pool.dropped", "pool drops", -1),
+                ("startup.first_preview_s", "first preview s", -1), ("startup.record_ready_s", "record ready s", -1),
+                ("peak_rss_mb", "peak RSS MB", -1), ("peak_rss_children_mb", "peak RSS workers MB", -1)]
+
+def _get(d: dict, dotted: str):
+    for k in dotted.split("."): d = d.get(k, {}) if isinstance(d, dict) else {}
+    return d if isinstance(d, (int, float)) else None
+
+def compare(base_path: str, new_path: str):
+    with open(base_path) as f: base = json.load(f)
+    with open(new_path) as f: new = json.load(f)
+    print(f"{'metric':22s} {'base':>12s} {'new':>12s} {'change':>9s}")
+    for key, label, better in COMPARE_KEYS:
+        a, b = _get(base["results"], key), _get(new["results"], key)
+        if a is None or b is None: continue
+        pct = (b - a) / a * 100.0 if a else 0.0; flag = "" if abs(pct) < 5 else ("  better" if pct * better > 0 else "  WORSE")
+        print(f"{label:22s} {a:12.2f} {b:12.2f} {pct:+8.1f}%{flag}")
+
+def run(seconds: float, fps: float, source: str, workers: int, out: str, storage: str = None, buffer_mb: int = None, timeout: float = None, mode: str = None, take_file: bool = False, scope: str = None, preview_lut: str = None, preview_every: int = None) -> dict:
+    storage = storage or tempfile.mkdtemp(prefix="bolex_bench_"); result_path = os.path.join(storage, "bench_result.json")
+    env = dict(os.environ, BOLEX_CAMERA="replay", BOLEX_BENCH_SECONDS=str(seconds), BOLEX_BENCH_OUTPUT=result_path, BOLEX_STORAGE=storage, BOLEX_REPLAY_FPS=str(fps))
+    if source: env["BOLEX_REPLAY_SOURCE"] = source
+    if workers is not None: env["BOLEX_ENCODER_WORKERS"] = str(workers)
+    if buffer_mb is not None: env["BOLEX_BUFFER_MB"] = str(buffer_mb)
+    if mode: env["BOLEX_RECORD_MODE"] = mode
+    if take_file: env["BOLEX_TAKE_FILE"] = "1"
+    if scope: env["BOLEX_SCOPE_VIEW"] = scope
+    if preview_lut: env["BOLEX_PREVIEW_LUT"] = preview_lut
+    if preview_every is not None: env["BOLEX_PREVIEW_EVERY"] = str(preview_every)
+    t0 = time.monotonic(); proc = subprocess.run([sys.executable, SCRIPT], env=env, timeout=timeout or seconds * 4 + 120)
+    if proc.returncode != 0 or not os.path.exists(result_path): exit(f"Benchmark run failed (exit {proc.returncode}), no result at {result_path}")
+    with open(result_path) as f: results = json.load(f)
+    doc = {"config": {"seconds": seconds, "fps": fps, "source": source or "samples", "workers": workers, "buffer_mb": buffer_mb, "mode": mode or "lj92", "take_file": take_file, "scope": scope or "off", "preview_lut": preview_lut or "linear",
+                      "preview_every": 1 if preview_every is None else preview_every, "storage": storage},
+           "host": {"machine": platform.machine(), "python": platform.python_version(), "cpus": os.cpu_count()}, "wall_seconds": round(time.monotonic() - t0, 2), "results": results}
+    if out:
+        with open(out, "w") as f: json.dump(doc, f, indent=2)
+        print(f"Benchmark written to {out}")
+    r = results
+    print(f"Take {r['take_seconds']:.1f} s: {r['frames_saved']}/{r['frames_added']} frames saved, preview {r['preview_fps']:.1f} fps, encoder {r['encoder_fps']:.1f} fps, "
+          f"{r['write_mb_per_s']:.1f} MB/s, latency p50/p95 {r['grab_to_display_ms'].get('p50', 0):.1f}/{r['grab_to_display_ms'].get('p95', 0):.1f} ms, "
+          f"overlay {r['overlay_ms'].get('mean', 0):.2f} ms, queue max {r['queue_depth']['max']}, drops {r['pool']['dropped']}, peak RSS {r['peak_rss_mb']:.0f} MB")
+    return doc
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Faux Bolex end-to-end benchmark on the replay camera")
+    ap.add_argument("--seconds", type=float, default=10.0, help="Length of the recorded take")
+    ap.add_argument("--fps", type=float, default=24.0, help="Replay frame rate")
+    ap.add_argument("--source", default=None, help="DNG file/folder, or 'synthetic' (default: samples/)")
+    ap.add_argument("--workers", type=int, default=None, help="Encoder worker processes (0 = inline, default: cores - 1)")
+    ap.add_argument("--buffer-mb", type=int, default=None, help="RAM frame pool budget (default: the Recorder's 2048 MB)")
+    ap.add_argument("--mode", choices=("lj92", "raw12"), default=None, help="Record mode: LJ92 DNGs (default) or uncompressed 12-bit")
+    ap.add_argument("--take-file", action="store_true", help="Record into one take.fbt instead of a DNG per frame")
+    ap.add_argument("--preview-lut", choices=("linear", "gamma", "log"), default=None, help="Preview display LUT")
+    ap.add_argument("--preview-every", type=int, default=None, help="Preview every Nth frame (0 = no preview, raw only)")
+    ap.add_argument("--scope", choices=("off", "histogram", "waveform", "false_colour", "clip"), default=None, help="Raw scope shown during the take (clip = raw clip overlay)")
+    ap.add_argument("--storage", default=None, help="Where the take is written (default: a temp dir)")
+    ap.add_argument("--out", default=None, help="Write the full result (incl. queue depth over time) as JSON")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files instead of running")
+    args = ap.parse_args()
+    if args.compare: compare(*args.compare)
+    else: run(args.seconds, args.fps, args.source, args.workers, args.out, args.storage, args.buffer_mb, mode=args.mode, take_file=args.take_file, scope=args.scope, preview_lut=args.preview_lut, preview_every=args.preview_every)
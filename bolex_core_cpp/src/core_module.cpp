@@ -32,6 +32,19 @@
 #include <cmath>
 #include <algorithm>
 #include <utility> // For std::pair
+#include <array>
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <mutex>
+#include <thread>
+#include <deque>
+#include <functional>
+#include <fstream>
+
+#include "lj92_tiles.h" // Tiled lossless JPEG encoder for DNG writing (bolex_dng.py)
+#include "raw12_pack.h" // 12-bit packed frames (bolex_pack12.py)
+#include "preview_bin.h" // Half-resolution binned preview with WB + display LUT (bolex_preview.py)
 
 namespace py = pybind11;
 using namespace GenApi;
@@ -40,6 +53,73 @@ using namespace GenApi;
 static Pylon::CInstantCamera* camera = nullptr;
 static bool pylonInitialized = false;
 static const double TARGET_FPS = 24.0; // Or your desired target
+// Recording configuration set by apply_camera_configuration(); a restored cache or user set must still hold these values
+static const int64_t CONFIG_WIDTH = 2048, CONFIG_HEIGHT = 1108, CONFIG_GAIN_RAW = 300, CONFIG_BLACK_LEVEL_RAW = 32;
+static const int64_t CONFIG_EXPOSURE_US = static_cast<int64_t>(std::round(1000000.0 / (2.0 * TARGET_FPS))); // 180-degree shutter
+static const int64_t GRAB_BUFFER_COUNT = 24; // Pylon buffer pool: ring (8) + frames held by Python + camera in-flight, with headroom for zero-copy
+
+// Cached at initialize_camera() so the grab path never touches the nodemap for the format
+static std::string cachedPixelFormat; static int cachedBayerCode = -1; static double cachedPreviewScale = 1.0; static bool cachedRaw16 = false;
+static std::atomic<bool> zeroCopyRaw{false}; // Capture thread hands out read-only NumPy views of the Pylon buffer instead of clones
+static int cachedCfa[4] = {1, 2, 0, 1}; // Colour (0=R, 1=G, 2=B) at mosaic [0,0], [0,1], [1,0], [1,1]; GBRG until the format is read
+
+// --- Preview (set_preview_options) ---
+static const int PREVIEW_WIDTH = 1024, PREVIEW_HEIGHT = 600;
+static std::atomic<int> previewEvery{1}; // Capture thread builds a preview for every Nth frame (0 = none, raw only)
+static std::atomic<int> previewStep{1};  // Cell decimation: 1 = every 2x2 cell (half resolution), 2 = every other cell, ...
+static std::mutex previewMutex; static std::shared_ptr<const preview::Tables> previewTables; // Swapped whole, read per frame
+
+// --- Capture Ring (single producer: capture thread, single consumer: Python UI loop) ---
+struct CapturedFrame {
+    cv::Mat preview; cv::Mat raw;
+    Pylon::CGrabResultPtr grab_result; // Only set in zero-copy mode: keeps the buffer `raw` points into alive
+    uint64_t grab_index = 0;  // Sequential per start_capture()
+    double host_time_s = 0.0; // steady_clock seconds at RetrieveResult return
+    uint64_t block_id = 0;         // GigE stream block ID (16-bit, wraps 65535 -> 1); gaps = frames lost before Python
+    uint64_t camera_timestamp = 0; // Camera tick counter at exposure
+    uint64_t skipped_images = 0;   // Images the LatestImageOnly strategy discarded before this one
+};
+
+template <size_t N>
+class SpscFrameRing {
+public:
+    bool push(CapturedFrame&& f) {
+        const size_t h = head_.load(std::memory_order_relaxed); const size_t next = (h + 1) % N;
+        if (next == tail_.load(std::memory_order_acquire)) return false; // Full
+        slots_[h] = std::move(f); head_.store(next, std::memory_order_release); return true;
+    }
+    bool pop(CapturedFrame& out) {
+        const size_t t = tail_.load(std::memory_order_relaxed);
+        if (t == head_.load(std::memory_order_acquire)) return false; // Empty
+        out = std::move(slots_[t]); slots_[t] = CapturedFrame(); tail_.store((t + 1) % N, std::memory_order_release); return true;
+    }
+    bool empty() const { return head_.load(std::memory_order_acquire) == tail_.load(std::memory_order_acquire); }
+    size_t size() const { const size_t h = head_.load(std::memory_order_acquire), t = tail_.load(std::memory_order_acquire); return (h + N - t) % N; }
+    size_t capacity() const { return N - 1; }
+    void clear() { CapturedFrame f; while (pop(f)) {} } // Only while the producer is stopped
+private:
+    std::array<CapturedFrame, N> slots_;
+    std::atomic<size_t> head_{0}; std::atomic<size_t> tail_{0};
+};
+
+static SpscFrameRing<8> frameRing;
+static std::thread captureThread;
+static std::atomic<bool> captureRunning{false};
+static std::mutex frameReadyMutex; static std::condition_variable frameReadyCv;
+static std::atomic<uint64_t> framesCaptured{0}, captureOverruns{0}, captureErrors{0};
+static uint64_t captureGrabIndex = 0; // Capture thread only
+
+// --- Control Channel State ---
+struct CameraState { int64_t gain = -1; int64_t exposure_us = -1; double wb_red = 1.0; double wb_blue = 1.0; uint64_t version = 0; };
+enum class CameraCommandType { GainDelta, SetExposure, WhiteBalanceOnce, Refresh };
+struct CameraCommand { uint64_t id; CameraCommandType type; int64_t value; };
+struct CameraCommandResult { uint64_t id; std::string command; bool ok; int64_t value; double red_gain; double blue_gain; std::string error; };
+static CameraState cameraState; static std::mutex cameraStateMutex;
+static std::thread controlThread; static std::atomic<bool> controlRunning{false};
+static std::mutex controlMutex; static std::condition_variable controlCv; // Guards controlQueue, controlResults, nextCommandId
+static std::deque<CameraCommand> controlQueue; static std::deque<CameraCommandResult> controlResults; static uint64_t nextCommandId = 1;
+static const int WB_TIMEOUT_MS = 2000; static const int WB_POLL_MS = 20;
+static void start_control_thread(); static void stop_control_thread();
 
 // --- Helper Functions ---
 int get_ocv_bayer_code_for_rgb(const std::string& pylon_format) {
@@ -52,49 +132,183 @@ int get_ocv_bayer_code_for_rgb(const std::string& pylon_format) {
     return -1;
 }
 
+// Cache pixel format, Bayer code and preview scale once (initialize_camera), instead of a nodemap string lookup per grab
+static bool cache_pixel_format() {
+    cachedPixelFormat = Pylon::CEnumParameter(camera->GetNodeMap(), "PixelFormat").ToString().c_str();
+    cachedBayerCode = get_ocv_bayer_code_for_rgb(cachedPixelFormat);
+    const std::string& f = cachedPixelFormat;
+    static const int gb[4] = {1, 2, 0, 1}, rg[4] = {0, 1, 1, 2}, gr[4] = {1, 0, 2, 1}, bg[4] = {2, 1, 1, 0};
+    const int* cfa = f.find("BayerRG") == 0 ? rg : f.find("BayerGR") == 0 ? gr : f.find("BayerBG") == 0 ? bg : gb;
+    std::copy(cfa, cfa + 4, cachedCfa);
+    cachedRaw16 = f.find("Bayer") != std::string::npos && (f.find("12") != std::string::npos || f.find("10") != std::string::npos || f.find("16") != std::string::npos);
+    // Scale MSB-aligned data down for 8-bit visibility (e.g., 12-bit needs /16)
+    cachedPreviewScale = 1.0;
+    if (f.find("12") != std::string::npos) cachedPreviewScale = 1.0 / 16.0; // 2^(16-12) = 16
+    else if (f.find("10") != std::string::npos) cachedPreviewScale = 1.0 / 64.0; // 2^(16-10) = 64
+    std::cout << "[C++] Cached PixelFormat=" << cachedPixelFormat << " BayerCode=" << cachedBayerCode << std::endl;
+    return cachedBayerCode != -1;
+}
+
+// --- Camera configuration cache (initialize_camera) ---
+// config_cache: a Pylon feature file (.pfs), or "userset:UserSet1" for a camera user set. Restoring it is one call instead of ~20 node writes.
+static std::string initConfigSource = "none"; // full, cache or userset
+static double initPhaseMs[4] = {0, 0, 0, 0}; // runtime, open, config, start grabbing
+static double ms_since(std::chrono::steady_clock::time_point t0) { return std::chrono::duration<double, std::milli>(std::chrono::steady_clock::now() - t0).count(); }
+
+// The validated recording configuration, node by node (first start, or when the cache is missing/stale). Throws if ExposureMode fails.
+static void apply_camera_configuration(GenApi::INodeMap& nodemap) {
+    std::cout << "[C++] Applying final configuration..." << std::endl;
+    try { Pylon::CEnumParameter(nodemap, "PixelFormat").FromString("BayerGB12"); std::cout << " -> PixelFormat=BayerGB12 OK" << std::endl; } catch(const std::exception& e) { std::cerr << "Warn: PixelFormat: " << e.what() << std::endl; } // Use GBRG
+    try { Pylon::CBooleanParameter(nodemap, "ProcessedRawEnable").SetValue(false); std::cout << " -> ProcessedRawEnable=false OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: ProcessedRawEnable: " << e.what() << std::endl; }
+    try { Pylon::CEnumParameter(nodemap, "GainAuto").FromString("Off"); std::cout << " -> GainAuto=Off OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: GainAuto: " << e.what() << std::endl; }
+    try { Pylon::CIntegerParameter(nodemap, "GainRaw").SetValue(CONFIG_GAIN_RAW); std::cout << " -> GainRaw=" << Pylon::CIntegerParameter(nodemap, "GainRaw").GetValue() << " OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: GainRaw: " << e.what() << std::endl; }
+    try { Pylon::CIntegerParameter(nodemap, "GevSCPSPacketSize").SetValue(9000); std::cout << " -> Packet Size OK" << std::endl; } catch(const std::exception& e) { std::cerr << "Warn: GevSCPSPacketSize: " << e.what() << std::endl; }
+    try { Pylon::CIntegerParameter(nodemap, "Width").SetValue(CONFIG_WIDTH); std::cout << " -> Width=" << Pylon::CIntegerParameter(nodemap, "Width").GetValue() << " OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: Width: " << e.what() << std::endl; }
+    try { Pylon::CIntegerParameter(nodemap, "Height").SetValue(CONFIG_HEIGHT); std::cout << " -> Height=" << Pylon::CIntegerParameter(nodemap, "Height").GetValue() << " OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: Height: " << e.what() << std::endl; }
+    try { Pylon::CBooleanParameter(nodemap, "CenterX").SetValue(true); std::cout << " -> CenterX OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: CenterX: " << e.what() << std::endl; }
+    try { Pylon::CBooleanParameter(nodemap, "CenterY").SetValue(true); std::cout << " -> CenterY OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: CenterY: " << e.what() << std::endl; }
+    try { std::cout << "[C++] Setting BlackLevelRaw..." << std::endl; try { Pylon::CEnumParameter(nodemap, "BlackLevelSelector").FromString("All"); } catch(...) {} Pylon::CIntegerParameter(nodemap, "BlackLevelRaw").SetValue(CONFIG_BLACK_LEVEL_RAW); std::cout << " -> BlackLevelRaw=" << Pylon::CIntegerParameter(nodemap, "BlackLevelRaw").GetValue() << " OK" << std::endl; } catch (const GenICam::GenericException &e) { std::cerr << "Warn: BlackLevelRaw: " << e.GetDescription() << std::endl;}
+    try { std::cout << "[C++] Setting AutoFunctionProfile..." << std::endl; Pylon::CEnumParameter(nodemap, "AutoFunctionProfile").FromString("GainMinimum"); std::cout << " -> AutoFunctionProfile set to: " << Pylon::CEnumParameter(nodemap, "AutoFunctionProfile").ToString() << std::endl; } catch (const GenICam::GenericException &e) { std::cerr << "Warn: AutoFunctionProfile: " << e.GetDescription() << std::endl;}
+    try { std::cout << "[C++] Setting ExposureMode to Timed..." << std::endl; Pylon::CEnumParameter(nodemap, "ExposureMode").FromString("Timed"); std::cout << " -> ExposureMode set to: " << Pylon::CEnumParameter(nodemap, "ExposureMode").ToString() << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "ERROR: Could not set ExposureMode: " << e.GetDescription() << std::endl; throw; }
+    try { Pylon::CEnumParameter(nodemap, "ExposureAuto").FromString("Off"); std::cout << " -> ExposureAuto Off OK" << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "Warn: ExposureAuto: " << e.GetDescription() << std::endl;}
+    try { std::cout << "[C++] Setting ExposureTimeRaw to " << CONFIG_EXPOSURE_US << " us..." << std::endl; Pylon::CIntegerParameter(nodemap, "ExposureTimeRaw").SetValue(CONFIG_EXPOSURE_US); std::cout << " -> ExposureTimeRaw=" << Pylon::CIntegerParameter(nodemap, "ExposureTimeRaw").GetValue() << " OK" << std::endl; } catch (const GenICam::GenericException &e) { std::cerr << "Warn: ExposureTimeRaw failed: " << e.GetDescription() << std::endl; }
+    try { Pylon::CBooleanParameter(nodemap, "AcquisitionFrameRateEnable").SetValue(true); std::cout << " -> FrameRateEnable OK" << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "Warn: FrameRateEnable: " << e.GetDescription() << std::endl;}
+    try { Pylon::CFloatParameter(nodemap, "AcquisitionFrameRateAbs").SetValue(TARGET_FPS); std::cout << " -> FrameRateAbs OK" << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "Warn: FrameRateAbs: " << e.GetDescription() << std::endl;}
+}
+
+// A restored set must still be the recording configuration (sensor window, 12-bit GBRG, timed exposure, frame rate, exposure, gain,
+// black level): a cache saved before these constants changed would otherwise record at the old values. Anything else is re-applied in full.
+static bool camera_configuration_matches(GenApi::INodeMap& nodemap) {
+    const char* differs = nullptr;
+    try {
+        if (std::string(Pylon::CEnumParameter(nodemap, "PixelFormat").ToString().c_str()) != "BayerGB12") differs = "PixelFormat";
+        else if (Pylon::CIntegerParameter(nodemap, "Width").GetValue() != CONFIG_WIDTH || Pylon::CIntegerParameter(nodemap, "Height").GetValue() != CONFIG_HEIGHT) differs = "Width/Height";
+        else if (std::string(Pylon::CEnumParameter(nodemap, "ExposureMode").ToString().c_str()) != "Timed") differs = "ExposureMode";
+        else if (!Pylon::CBooleanParameter(nodemap, "AcquisitionFrameRateEnable").GetValue() || std::abs(Pylon::CFloatParameter(nodemap, "AcquisitionFrameRateAbs").GetValue() - TARGET_FPS) > 0.01) differs = "AcquisitionFrameRateAbs";
+        else if (Pylon::CIntegerParameter(nodemap, "ExposureTimeRaw").GetValue() != CONFIG_EXPOSURE_US) differs = "ExposureTimeRaw";
+        else if (Pylon::CIntegerParameter(nodemap, "GainRaw").GetValue() != CONFIG_GAIN_RAW) differs = "GainRaw";
+        else {
+            try { Pylon::CEnumParameter(nodemap, "BlackLevelSelector").FromString("All"); } catch (...) {} // As applied
+            if (Pylon::CIntegerParameter(nodemap, "BlackLevelRaw").GetValue() != CONFIG_BLACK_LEVEL_RAW) differs = "BlackLevelRaw";
+        }
+    } catch (...) { differs = "unreadable node"; }
+    if (differs != nullptr) std::cerr << "Warn: Restored camera configuration differs in " << differs << "." << std::endl;
+    return differs == nullptr;
+}
+
+static bool restore_camera_configuration(GenApi::INodeMap& nodemap, const std::string& cache) {
+    try {
+        if (cache.rfind("userset:", 0) == 0) { Pylon::CEnumParameter(nodemap, "UserSetSelector").FromString(cache.substr(8).c_str()); Pylon::CCommandParameter(nodemap, "UserSetLoad").Execute(); }
+        else { if (!std::ifstream(cache).good()) return false; Pylon::CFeaturePersistence::Load(cache.c_str(), &nodemap, true); }
+        if (camera_configuration_matches(nodemap)) { std::cout << "[C++] Camera configuration restored from " << cache << std::endl; return true; }
+        std::cerr << "Warn: Configuration in " << cache << " doesn't match the recording format, applying it in full." << std::endl;
+    } catch (const GenICam::GenericException& e) { std::cerr << "Warn: Restoring " << cache << ": " << e.GetDescription() << std::endl; }
+    catch (const std::exception& e) { std::cerr << "Warn: Restoring " << cache << ": " << e.what() << std::endl; }
+    return false;
+}
+
+// power_on_default: also make a saved user set the camera's power-on default (persists in the camera; only on request)
+static bool save_camera_configuration(GenApi::INodeMap& nodemap, const std::string& cache, bool power_on_default) {
+    try {
+        if (cache.rfind("userset:", 0) == 0) {
+            const std::string set = cache.substr(8); Pylon::CEnumParameter(nodemap, "UserSetSelector").FromString(set.c_str()); Pylon::CCommandParameter(nodemap, "UserSetSave").Execute();
+            if (power_on_default) {
+                try { Pylon::CEnumParameter(nodemap, "UserSetDefaultSelector").FromString(set.c_str()); std::cout << "[C++] Camera power-on default set to " << set << std::endl; }
+                catch (const GenICam::GenericException& e) { std::cerr << "Warn: UserSetDefaultSelector=" << set << ": " << e.GetDescription() << std::endl; }
+            }
+        } else Pylon::CFeaturePersistence::Save(cache.c_str(), &nodemap);
+        std::cout << "[C++] Camera configuration saved to " << cache << std::endl; return true;
+    } catch (const GenICam::GenericException& e) { std::cerr << "Warn: Saving " << cache << ": " << e.GetDescription() << std::endl; }
+    catch (const std::exception& e) { std::cerr << "Warn: Saving " << cache << ": " << e.what() << std::endl; }
+    return false;
+}
+
 // --- Functions Exposed to Python ---
 
-// Initialize camera - unchanged from previous working versions
-bool initialize_camera() {
+// Initialize camera. config_cache: restore the saved configuration in one call ("" = always configure node by node)
+// power_on_default: when a "userset:" cache is (re)saved, also select it as the camera's power-on default
+bool initialize_camera(const std::string& config_cache, bool power_on_default) {
     std::cout << "[C++] initialize_camera called." << std::endl;
     if (camera != nullptr && camera->IsOpen()) { std::cerr << "[C++] Warning: Camera already initialized." << std::endl; return true; }
     try {
+        const auto t_runtime = std::chrono::steady_clock::now();
         if (!pylonInitialized) { std::cout << "[C++] Initializing Pylon runtime..." << std::endl; Pylon::PylonInitialize(); pylonInitialized = true; std::cout << "[C++] Pylon runtime initialized." << std::endl; }
         else { std::cout << "[C++] Pylon runtime already initialized." << std::endl; }
+        initPhaseMs[0] = ms_since(t_runtime); const auto t_open = std::chrono::steady_clock::now();
         std::cout << "[C++] Creating camera object..." << std::endl; Pylon::CTlFactory& tlFactory = Pylon::CTlFactory::GetInstance(); Pylon::DeviceInfoList_t devices;
         if (tlFactory.EnumerateDevices(devices) == 0) { throw std::runtime_error("[C++] No camera devices found."); }
         camera = new Pylon::CInstantCamera(tlFactory.CreateDevice(devices[0])); std::cout << "[C++] Camera object created." << std::endl; std::cout << "[C++] Using device " << camera->GetDeviceInfo().GetModelName() << std::endl;
         std::cout << "[C++] Opening camera..." << std::endl; camera->Open(); std::cout << "[C++] Camera opened." << std::endl;
-        std::cout << "[C++] Getting node map..." << std::endl; GenApi::INodeMap& nodemap = camera->GetNodeMap(); std::cout << "[C++] Node map obtained." << std::endl;
-        std::cout << "[C++] Applying final configuration..." << std::endl;
-        // --- Camera Settings ---
-        try { Pylon::CEnumParameter(nodemap, "PixelFormat").FromString("BayerGB12"); std::cout << " -> PixelFormat=BayerGB12 OK" << std::endl; } catch(const std::exception& e) { std::cerr << "Warn: PixelFormat: " << e.what() << std::endl; } // Use GBRG
-        try { Pylon::CBooleanParameter(nodemap, "ProcessedRawEnable").SetValue(false); std::cout << " -> ProcessedRawEnable=false OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: ProcessedRawEnable: " << e.what() << std::endl; }
-        try { Pylon::CEnumParameter(nodemap, "GainAuto").FromString("Off"); std::cout << " -> GainAuto=Off OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: GainAuto: " << e.what() << std::endl; }
-        try { const int gain_raw_value = 300; Pylon::CIntegerParameter(nodemap, "GainRaw").SetValue(gain_raw_value); std::cout << " -> GainRaw=" << Pylon::CIntegerParameter(nodemap, "GainRaw").GetValue() << " OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: GainRaw: " << e.what() << std::endl; }
-        try { Pylon::CIntegerParameter(nodemap, "GevSCPSPacketSize").SetValue(9000); std::cout << " -> Packet Size OK" << std::endl; } catch(const std::exception& e) { std::cerr << "Warn: GevSCPSPacketSize: " << e.what() << std::endl; }
-        try { const int target_width = 2048; Pylon::CIntegerParameter(nodemap, "Width").SetValue(target_width); std::cout << " -> Width=" << Pylon::CIntegerParameter(nodemap, "Width").GetValue() << " OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: Width: " << e.what() << std::endl; }
-        try { const int target_height = 1108; Pylon::CIntegerParameter(nodemap, "Height").SetValue(target_height); std::cout << " -> Height=" << Pylon::CIntegerParameter(nodemap, "Height").GetValue() << " OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: Height: " << e.what() << std::endl; }
-        try { Pylon::CBooleanParameter(nodemap, "CenterX").SetValue(true); std::cout << " -> CenterX OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: CenterX: " << e.what() << std::endl; }
-        try { Pylon::CBooleanParameter(nodemap, "CenterY").SetValue(true); std::cout << " -> CenterY OK" << std::endl;} catch(const std::exception& e) { std::cerr << "Warn: CenterY: " << e.what() << std::endl; }
-        try { std::cout << "[C++] Setting BlackLevelRaw..." << std::endl; try { Pylon::CEnumParameter(nodemap, "BlackLevelSelector").FromString("All"); } catch(...) {} Pylon::CIntegerParameter(nodemap, "BlackLevelRaw").SetValue(32); std::cout << " -> BlackLevelRaw=" << Pylon::CIntegerParameter(nodemap, "BlackLevelRaw").GetValue() << " OK" << std::endl; } catch (const GenICam::GenericException &e) { std::cerr << "Warn: BlackLevelRaw: " << e.GetDescription() << std::endl;}
-        try { std::cout << "[C++] Setting AutoFunctionProfile..." << std::endl; Pylon::CEnumParameter(nodemap, "AutoFunctionProfile").FromString("GainMinimum"); std::cout << " -> AutoFunctionProfile set to: " << Pylon::CEnumParameter(nodemap, "AutoFunctionProfile").ToString() << std::endl; } catch (const GenICam::GenericException &e) { std::cerr << "Warn: AutoFunctionProfile: " << e.GetDescription() << std::endl;}
-        try { std::cout << "[C++] Setting ExposureMode to Timed..." << std::endl; Pylon::CEnumParameter(nodemap, "ExposureMode").FromString("Timed"); std::cout << " -> ExposureMode set to: " << Pylon::CEnumParameter(nodemap, "ExposureMode").ToString() << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "ERROR: Could not set ExposureMode: " << e.GetDescription() << std::endl; throw; }
-        try { Pylon::CEnumParameter(nodemap, "ExposureAuto").FromString("Off"); std::cout << " -> ExposureAuto Off OK" << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "Warn: ExposureAuto: " << e.GetDescription() << std::endl;}
-        try { int exposure_us_value = static_cast<int>(std::round(1000000.0 / (2.0 * TARGET_FPS))); std::cout << "[C++] Setting ExposureTimeRaw to " << exposure_us_value << " us..." << std::endl; Pylon::CIntegerParameter(nodemap, "ExposureTimeRaw").SetValue(exposure_us_value); std::cout << " -> ExposureTimeRaw=" << Pylon::CIntegerParameter(nodemap, "ExposureTimeRaw").GetValue() << " OK" << std::endl; } catch (const GenICam::GenericException &e) { std::cerr << "Warn: ExposureTimeRaw failed: " << e.GetDescription() << std::endl; }
-        try { Pylon::CBooleanParameter(nodemap, "AcquisitionFrameRateEnable").SetValue(true); std::cout << " -> FrameRateEnable OK" << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "Warn: FrameRateEnable: " << e.GetDescription() << std::endl;}
-        try { Pylon::CFloatParameter(nodemap, "AcquisitionFrameRateAbs").SetValue(TARGET_FPS); std::cout << " -> FrameRateAbs OK" << std::endl;} catch (const GenICam::GenericException &e) { std::cerr << "Warn: FrameRateAbs: " << e.GetDescription() << std::endl;}
+        GenApi::INodeMap& nodemap = camera->GetNodeMap(); initPhaseMs[1] = ms_since(t_open);
+        // --- Camera Settings: one load from the cache when it still matches, otherwise every node (then cached for next start) ---
+        const auto t_config = std::chrono::steady_clock::now();
+        if (!config_cache.empty() && restore_camera_configuration(nodemap, config_cache)) initConfigSource = config_cache.rfind("userset:", 0) == 0 ? "userset" : "cache";
+        else { apply_camera_configuration(nodemap); initConfigSource = "full"; if (!config_cache.empty()) save_camera_configuration(nodemap, config_cache, power_on_default); }
+        initPhaseMs[2] = ms_since(t_config);
+        try { camera->MaxNumBuffer.SetValue(GRAB_BUFFER_COUNT); std::cout << " -> MaxNumBuffer=" << GRAB_BUFFER_COUNT << " OK" << std::endl; } catch (const GenICam::GenericException &e) { std::cerr << "Warn: MaxNumBuffer: " << e.GetDescription() << std::endl; }
+        if (!cache_pixel_format()) std::cerr << "Warn: Unsupported PixelFormat for preview: " << cachedPixelFormat << std::endl;
         // --- End Settings ---
-        std::cout << "[C++] Starting grabbing..." << std::endl; camera->StartGrabbing(Pylon::EGrabStrategy::GrabStrategy_LatestImageOnly); std::cout << "[C++] Camera initialized and grabbing started successfully." << std::endl; return true;
+        const auto t_start = std::chrono::steady_clock::now();
+        std::cout << "[C++] Starting grabbing..." << std::endl; camera->StartGrabbing(Pylon::EGrabStrategy::GrabStrategy_LatestImageOnly); initPhaseMs[3] = ms_since(t_start);
+        std::cout << "[C++] Camera initialized (" << initConfigSource << " configuration) and grabbing started." << std::endl; start_control_thread(); return true;
     } catch (const GenICam::GenericException &e) { std::cerr << "[C++] GenICam Ex: " << e.GetDescription() << std::endl; if (camera != nullptr) { if (camera->IsOpen()) camera->Close(); delete camera; camera = nullptr; } return false;
     } catch (const std::exception &e) { std::cerr << "[C++] Std Ex: " << e.what() << std::endl; if (camera != nullptr) { if (camera->IsOpen()) camera->Close(); delete camera; camera = nullptr; } return false;
     } catch (...) { std::cerr << "[C++] Unknown ex." << std::endl; if (camera != nullptr) { if (camera->IsOpen()) camera->Close(); delete camera; camera = nullptr; } return false; }
 }
 
 
-// Grab and process frame, returning preview and UNSCALED raw
-std::pair<cv::Mat, cv::Mat> grab_preview_and_raw() {
+static std::shared_ptr<const preview::Tables> current_preview_tables() {
+    std::lock_guard<std::mutex> lk(previewMutex);
+    if (!previewTables) { auto t = std::make_shared<preview::Tables>(); const double unity[3] = {1.0, 1.0, 1.0}; preview::build_tables(nullptr, unity, 0, *t); previewTables = t; }
+    return previewTables;
+}
+
+// Process one grab result into preview and UNSCALED raw (shared by the synchronous grab and the capture thread).
+// zero_copy: `raw_frame` is a header over the Pylon buffer; the caller must keep grabResult alive as long as it is used.
+// want_preview=false: raw only, `preview_frame` stays empty (no preview work at all).
+static bool process_grab_result(const Pylon::CGrabResultPtr& grabResult, cv::Mat& preview_frame, cv::Mat& raw_frame, bool zero_copy = false, bool want_preview = true) {
+    if (!grabResult->GrabSucceeded()) { std::cerr << "Err: Grab Failed: " << grabResult->GetErrorCode() << " " << grabResult->GetErrorDescription() << std::endl; return false; }
+    int width = grabResult->GetWidth(); int height = grabResult->GetHeight(); const void* pImageBuffer = grabResult->GetBuffer();
+    if (cachedBayerCode == -1 && !cache_pixel_format()) { std::cerr << "Err: Unsupported Bayer fmt for color preview: " << cachedPixelFormat << std::endl; return false; }
+    const std::string& pylonFormat = cachedPixelFormat; const int cvBayerCode = cachedBayerCode;
+
+    // --- Prepare RAW frame (Unscaled, MSB aligned) ---
+    // Assuming 12-bit or similar packed into 16-bit container
+    if (cachedRaw16) {
+        // Create a Mat header pointing to the Pylon buffer (no copy yet)
+        cv::Mat raw_bayer_mat_16u = cv::Mat(height, width, CV_16UC1, const_cast<void*>(pImageBuffer)); // Use const_cast if buffer is const
+
+        // *** Clone the raw data directly (NO SCALING), or hand out the buffer itself in zero-copy mode ***
+        raw_frame = zero_copy ? raw_bayer_mat_16u : raw_bayer_mat_16u.clone();
+
+        // --- Prepare PREVIEW frame: 2x2 cells binned straight to the preview size, WB + display LUT in the same pass ---
+        if (want_preview) {
+            const auto tables = current_preview_tables();
+            preview_frame.create(PREVIEW_HEIGHT, PREVIEW_WIDTH, CV_8UC3);
+            preview::bin_to_rgb(raw_bayer_mat_16u.ptr<uint16_t>(), height, width, raw_bayer_mat_16u.step / sizeof(uint16_t), cachedCfa, previewStep.load(std::memory_order_relaxed), *tables,
+                                preview_frame.data, PREVIEW_WIDTH, PREVIEW_HEIGHT);
+        }
+
+    } else if (pylonFormat.find("8") != std::string::npos) {
+        // Handle 8-bit Bayer case (less common for raw)
+        cv::Mat raw_bayer_8bit_direct = cv::Mat(height, width, CV_8UC1, const_cast<void*>(pImageBuffer));
+        raw_frame = zero_copy ? raw_bayer_8bit_direct : raw_bayer_8bit_direct.clone(); // Save the 8-bit raw directly
+
+        // Prepare preview frame
+        if (want_preview) {
+            cv::Mat rgb_8bit;
+            cv::cvtColor(raw_bayer_8bit_direct, rgb_8bit, cvBayerCode);
+            cv::resize(rgb_8bit, preview_frame, cv::Size(PREVIEW_WIDTH, PREVIEW_HEIGHT), 0, 0, cv::INTER_NEAREST);
+        }
+
+    } else { std::cerr << "Err: Unhandled pixel format type for raw saving: " << pylonFormat << std::endl; return false; }
+    return true;
+}
+
+// Grab and process frame, returning preview and UNSCALED raw (synchronous; GIL is released by the binding). want_preview=false: (None, raw)
+std::pair<cv::Mat, cv::Mat> grab_preview_and_raw(bool want_preview) {
     if (camera == nullptr || !camera->IsGrabbing()) { return std::make_pair(cv::Mat(), cv::Mat()); }
+    if (captureRunning.load()) { std::cerr << "Err: grab_preview_and_raw called while capture thread is running. Use get_frame()." << std::endl; return std::make_pair(cv::Mat(), cv::Mat()); }
 
     Pylon::CGrabResultPtr grabResult;
     cv::Mat preview_frame; // Resized RGB frame for preview
@@ -102,51 +316,7 @@ std::pair<cv::Mat, cv::Mat> grab_preview_and_raw() {
 
     try {
         camera->RetrieveResult(5000, grabResult, Pylon::TimeoutHandling_ThrowException);
-
-        if (grabResult->GrabSucceeded()) {
-            int width = grabResult->GetWidth(); int height = grabResult->GetHeight(); const void* pImageBuffer = grabResult->GetBuffer();
-            std::string pylonFormat = Pylon::CEnumParameter(camera->GetNodeMap(), "PixelFormat").ToString().c_str();
-            int cvBayerCode = get_ocv_bayer_code_for_rgb(pylonFormat); // Use code matching Pylon format
-            if (cvBayerCode == -1) { std::cerr << "Err: Unsupported Bayer fmt for color preview: " << pylonFormat << std::endl; return std::make_pair(cv::Mat(), cv::Mat()); }
-
-            // --- Prepare RAW frame (Unscaled, MSB aligned) ---
-            // Assuming 12-bit or similar packed into 16-bit container
-             if (pylonFormat.find("Bayer") != std::string::npos && (pylonFormat.find("12") != std::string::npos || pylonFormat.find("10") != std::string::npos || pylonFormat.find("16") != std::string::npos)) {
-                 // Create a Mat header pointing to the Pylon buffer (no copy yet)
-                 cv::Mat raw_bayer_mat_16u = cv::Mat(height, width, CV_16UC1, const_cast<void*>(pImageBuffer)); // Use const_cast if buffer is const
-
-                 // *** Clone the raw data directly (NO SCALING) ***
-                 raw_frame = raw_bayer_mat_16u.clone();
-
-                 // --- Prepare PREVIEW frame (Scale for 8-bit display) ---
-                 cv::Mat raw_bayer_8bit;
-                 // Scale MSB-aligned data down for 8-bit visibility (e.g., 12-bit needs /16)
-                 double scale_factor_8bit = 1.0;
-                 if (pylonFormat.find("12") != std::string::npos) scale_factor_8bit = 1.0 / 16.0; // 2^(16-12) = 16
-                 else if (pylonFormat.find("10") != std::string::npos) scale_factor_8bit = 1.0 / 64.0; // 2^(16-10) = 64
-                 // Add other bit depths if needed
-
-                 raw_bayer_mat_16u.convertTo(raw_bayer_8bit, CV_8U, scale_factor_8bit);
-                 // Debayer 8-bit data using the correct code for the sensor
-                 cv::Mat rgb_8bit;
-                 cv::cvtColor(raw_bayer_8bit, rgb_8bit, cvBayerCode);
-                 // Resize to 720p
-                 cv::Size target_size(1024, 600);
-                 cv::resize(rgb_8bit, preview_frame, target_size, 0, 0, cv::INTER_NEAREST);
-
-            } else if (pylonFormat.find("8") != std::string::npos) {
-                 // Handle 8-bit Bayer case (less common for raw)
-                 cv::Mat raw_bayer_8bit_direct = cv::Mat(height, width, CV_8UC1, const_cast<void*>(pImageBuffer));
-                 raw_frame = raw_bayer_8bit_direct.clone(); // Save the 8-bit raw directly
-
-                 // Prepare preview frame
-                 cv::Mat rgb_8bit;
-                 cv::cvtColor(raw_bayer_8bit_direct, rgb_8bit, cvBayerCode);
-                 cv::resize(rgb_8bit, preview_frame, cv::Size(1024, 600), 0, 0, cv::INTER_NEAREST);
-
-            } else { std::cerr << "Err: Unhandled pixel format type for raw saving: " << pylonFormat << std::endl; return std::make_pair(cv::Mat(), cv::Mat()); }
-
-        } else { std::cerr << "Err: Grab Failed: " << grabResult->GetErrorCode() << " " << grabResult->GetErrorDescription() << std::endl; return std::make_pair(cv::Mat(), cv::Mat()); }
+        if (!process_grab_result(grabResult, preview_frame, raw_frame, false, want_preview)) return std::make_pair(cv::Mat(), cv::Mat());
     // Exception handling
     } catch (const GenICam::GenericException &e) { std::cerr << "Grab GenICam Ex: " << e.GetDescription() << std::endl; return std::make_pair(cv::Mat(), cv::Mat());
     } catch (const std::exception &e) { std::cerr << "Grab Std Ex: " << e.what() << std::endl; return std::make_pair(cv::Mat(), cv::Mat());
@@ -157,8 +327,113 @@ std::pair<cv::Mat, cv::Mat> grab_preview_and_raw() {
 }
 
 
+// --- Background Capture Thread ---
+// Acquisition runs on its own native thread (no GIL) and pushes finished frames into a small lock-free SPSC ring.
+// Python pulls them with try_get_frame() / get_frame(timeout). One consumer thread only (the UI loop).
+static double host_time_s() { return std::chrono::duration<double>(std::chrono::steady_clock::now().time_since_epoch()).count(); } // Same clock as Python's time.monotonic()
+
+static void capture_loop() {
+    std::cout << "[C++] Capture thread started." << std::endl;
+    while (captureRunning.load(std::memory_order_acquire)) {
+        try {
+            Pylon::CGrabResultPtr grabResult;
+            if (!camera->RetrieveResult(500, grabResult, Pylon::TimeoutHandling_Return)) continue; // Timeout: re-check the stop flag
+            CapturedFrame frame;
+            frame.host_time_s = host_time_s();
+            const bool zero_copy = zeroCopyRaw.load(std::memory_order_relaxed);
+            const int every = previewEvery.load(std::memory_order_relaxed); const bool want_preview = every > 0 && captureGrabIndex % every == 0; // Preview rate independent of the record rate
+            if (!process_grab_result(grabResult, frame.preview, frame.raw, zero_copy, want_preview)) { captureErrors.fetch_add(1); continue; }
+            if (zero_copy) frame.grab_result = grabResult; // Buffer goes back to Pylon when the NumPy view is released
+            frame.grab_index = captureGrabIndex++;
+            frame.block_id = grabResult->GetBlockID(); frame.camera_timestamp = grabResult->GetTimeStamp(); frame.skipped_images = grabResult->GetNumberOfSkippedImages();
+            if (!frameRing.push(std::move(frame))) { captureOverruns.fetch_add(1); continue; } // Consumer is behind: drop the newest, keep order
+            framesCaptured.fetch_add(1);
+            { std::lock_guard<std::mutex> lk(frameReadyMutex); } // Pairs with the predicate wait in get_frame(), no lost wakeups
+            frameReadyCv.notify_one();
+        } catch (const GenICam::GenericException &e) { captureErrors.fetch_add(1); std::cerr << "Capture GenICam Ex: " << e.GetDescription() << std::endl;
+        } catch (const std::exception &e) { captureErrors.fetch_add(1); std::cerr << "Capture Std Ex: " << e.what() << std::endl;
+        } catch (...) { captureErrors.fetch_add(1); std::cerr << "Capture Unknown ex." << std::endl; }
+    }
+    frameReadyCv.notify_all();
+    std::cout << "[C++] Capture thread stopped." << std::endl;
+}
+
+bool start_capture() {
+    if (camera == nullptr || !camera->IsGrabbing()) { std::cerr << "[C++] Error: start_capture needs an initialized, grabbing camera." << std::endl; return false; }
+    if (captureRunning.load()) return true;
+    frameRing.clear(); framesCaptured = 0; captureOverruns = 0; captureErrors = 0; captureGrabIndex = 0;
+    captureRunning.store(true, std::memory_order_release);
+    captureThread = std::thread(capture_loop);
+    return true;
+}
+
+bool stop_capture() {
+    if (!captureRunning.exchange(false)) return false;
+    frameReadyCv.notify_all();
+    if (captureThread.joinable()) captureThread.join();
+    frameRing.clear();
+    return true;
+}
+
+// Read-only NumPy view of the Pylon grab buffer. The capsule owns a CGrabResultPtr copy, so the buffer stays
+// out of Pylon's free pool until Python drops the last reference to the array.
+static py::object raw_view_to_py(const CapturedFrame& f) {
+    if (f.raw.empty()) return py::cast(f.raw);
+    auto* holder = new Pylon::CGrabResultPtr(f.grab_result);
+    py::capsule owner(holder, [](void* p) { delete static_cast<Pylon::CGrabResultPtr*>(p); });
+    const py::ssize_t rows = f.raw.rows, cols = f.raw.cols, elem = static_cast<py::ssize_t>(f.raw.elemSize());
+    py::array arr;
+    if (f.raw.type() == CV_16UC1) arr = py::array_t<uint16_t>({rows, cols}, {cols * elem, elem}, reinterpret_cast<const uint16_t*>(f.raw.data), owner);
+    else arr = py::array_t<uint8_t>({rows, cols}, {cols * elem, elem}, reinterpret_cast<const uint8_t*>(f.raw.data), owner);
+    arr.attr("setflags")(py::arg("write") = false);
+    return std::move(arr);
+}
+
+static py::object captured_frame_to_py(CapturedFrame& f) {
+    py::dict meta;
+    meta["grab_index"] = f.grab_index; meta["host_time_s"] = f.host_time_s; meta["zero_copy"] = static_cast<bool>(f.grab_result);
+    meta["block_id"] = f.block_id; meta["camera_timestamp"] = f.camera_timestamp; meta["skipped_images"] = f.skipped_images;
+    py::object raw = f.grab_result ? raw_view_to_py(f) : py::cast(f.raw);
+    return py::make_tuple(f.preview.empty() ? py::none() : py::cast(f.preview), raw, meta); // None: preview skipped for this frame
+}
+
+bool set_zero_copy_raw(bool enable) { zeroCopyRaw.store(enable); std::cout << "[C++] Zero-copy raw " << (enable ? "enabled" : "disabled") << std::endl; return enable; }
+bool get_zero_copy_raw() { return zeroCopyRaw.load(); }
+
+// Non-blocking: (preview, raw, meta) or None if the ring is empty
+py::object try_get_frame() {
+    CapturedFrame f;
+    if (!frameRing.pop(f)) return py::none();
+    return captured_frame_to_py(f);
+}
+
+// Blocking with timeout (seconds); the GIL is released while waiting. Returns None on timeout or when capture stops.
+py::object get_frame(double timeout_s) {
+    CapturedFrame f; bool got = false;
+    {
+        py::gil_scoped_release release;
+        got = frameRing.pop(f);
+        if (!got && captureRunning.load()) {
+            std::unique_lock<std::mutex> lk(frameReadyMutex);
+            frameReadyCv.wait_for(lk, std::chrono::duration<double>(std::max(0.0, timeout_s)), [] { return !frameRing.empty() || !captureRunning.load(); });
+            lk.unlock();
+            got = frameRing.pop(f);
+        }
+    }
+    if (!got) return py::none();
+    return captured_frame_to_py(f);
+}
+
+py::dict get_capture_stats() {
+    py::dict d;
+    d["running"] = captureRunning.load(); d["captured"] = framesCaptured.load(); d["overruns"] = captureOverruns.load();
+    d["errors"] = captureErrors.load(); d["queued"] = frameRing.size(); d["ring_capacity"] = frameRing.capacity();
+    return d;
+}
+
+
 // Shutdown camera - unchanged
-bool shutdown_camera() { std::cout << "[C++] Shutting down camera..." << std::endl; if (camera != nullptr) { try { if (camera->IsGrabbing()) { camera->StopGrabbing(); } if (camera->IsOpen()) { camera->Close(); } } catch (...) { /* Ignore shutdown errors */ } delete camera; camera = nullptr; std::cout << "[C++] Camera object deleted." << std::endl; } else { std::cout << "[C++] Camera pointer null." << std::endl; } std::cout << "[C++] shutdown_camera finished." << std::endl; return true; }
+bool shutdown_camera() { std::cout << "[C++] Shutting down camera..." << std::endl; stop_capture(); stop_control_thread(); if (camera != nullptr) { try { if (camera->IsGrabbing()) { camera->StopGrabbing(); } if (camera->IsOpen()) { camera->Close(); } } catch (...) { /* Ignore shutdown errors */ } delete camera; camera = nullptr; std::cout << "[C++] Camera object deleted." << std::endl; } else { std::cout << "[C++] Camera pointer null." << std::endl; } std::cout << "[C++] shutdown_camera finished." << std::endl; return true; }
 
 // Gain/Exposure functions - unchanged
 int set_gain(int delta) { if (!camera || !camera->IsOpen()) return -1; try { GenApi::INodeMap& n = camera->GetNodeMap(); Pylon::CIntegerParameter p(n,"GainRaw"); int64_t c=p.GetValue(),mn=p.GetMin(),mx=p.GetMax(),v=std::max(mn,std::min(mx,c+static_cast<int64_t>(delta))); p.SetValue(v); std::cout<<"-> Gain="<<v<<std::endl; return (int)v;} catch(...){return -1;} }
@@ -214,18 +489,239 @@ std::pair<double, double> trigger_wb_and_get_gains() {
 }
 
 
+// --- Camera Control Channel ---
+// Gain/exposure/WB changes run on a worker thread; Python queues them (returns a command id immediately), reads
+// results with poll_command_results() and reads the cached parameter snapshot with get_camera_state() without
+// touching the nodemap. The snapshot version increments on every change.
+
+static int read_wb_ratios(GenApi::INodeMap& n, double& red_gain, double& blue_gain) {
+    Pylon::CEnumParameter balRatioSel(n, "BalanceRatioSelector"); Pylon::CFloatParameter balRatioAbs(n, "BalanceRatioAbs");
+    balRatioSel.FromString("Red"); red_gain = balRatioAbs.GetValue();
+    balRatioSel.FromString("Blue"); blue_gain = balRatioAbs.GetValue();
+    return (red_gain > 0 && blue_gain > 0 && std::isfinite(red_gain) && std::isfinite(blue_gain)) ? 0 : -1;
+}
+
+// Re-read the snapshot from the nodemap (control thread only)
+static void refresh_camera_state() {
+    if (!camera || !camera->IsOpen()) return;
+    CameraState s;
+    { std::lock_guard<std::mutex> lk(cameraStateMutex); s = cameraState; }
+    try { s.gain = Pylon::CIntegerParameter(camera->GetNodeMap(), "GainRaw").GetValue(); } catch (...) {}
+    try { s.exposure_us = Pylon::CIntegerParameter(camera->GetNodeMap(), "ExposureTimeRaw").GetValue(); } catch (...) {}
+    std::lock_guard<std::mutex> lk(cameraStateMutex);
+    if (s.gain != cameraState.gain || s.exposure_us != cameraState.exposure_us) { s.version = cameraState.version + 1; cameraState = s; }
+}
+
+static void publish_camera_state(const std::function<void(CameraState&)>& update) {
+    std::lock_guard<std::mutex> lk(cameraStateMutex); update(cameraState); cameraState.version++;
+}
+
+static CameraCommandResult execute_camera_command(const CameraCommand& cmd) {
+    CameraCommandResult r{cmd.id, "", false, -1, -1.0, -1.0, ""};
+    try {
+        GenApi::INodeMap& n = camera->GetNodeMap();
+        switch (cmd.type) {
+        case CameraCommandType::GainDelta: {
+            r.command = "gain"; Pylon::CIntegerParameter p(n, "GainRaw");
+            int64_t c = p.GetValue(), mn = p.GetMin(), mx = p.GetMax(), v = std::max(mn, std::min(mx, c + cmd.value));
+            p.SetValue(v); r.value = v; r.ok = true; std::cout << "-> Gain=" << v << std::endl;
+            publish_camera_state([v](CameraState& s) { s.gain = v; }); break; }
+        case CameraCommandType::SetExposure: {
+            r.command = "exposure"; Pylon::CIntegerParameter p(n, "ExposureTimeRaw");
+            int64_t v = std::max(p.GetMin(), std::min(p.GetMax(), cmd.value)); p.SetValue(v); r.value = p.GetValue(); r.ok = true;
+            const int64_t applied = r.value; publish_camera_state([applied](CameraState& s) { s.exposure_us = applied; }); break; }
+        case CameraCommandType::WhiteBalanceOnce: {
+            r.command = "white_balance"; Pylon::CEnumParameter balAuto(n, "BalanceWhiteAuto");
+            balAuto.FromString("Off"); balAuto.FromString("Once");
+            std::cout << "[C++] BalanceWhiteAuto set to Once triggered (async)." << std::endl;
+            // The camera sets BalanceWhiteAuto back to Off once it has converged; poll instead of a fixed inline sleep
+            const auto deadline = std::chrono::steady_clock::now() + std::chrono::milliseconds(WB_TIMEOUT_MS);
+            while (std::string(balAuto.ToString().c_str()) != "Off" && std::chrono::steady_clock::now() < deadline && controlRunning.load())
+                std::this_thread::sleep_for(std::chrono::milliseconds(WB_POLL_MS));
+            double red_gain = 1.0, blue_gain = 1.0;
+            if (read_wb_ratios(n, red_gain, blue_gain) != 0) { r.error = "invalid gains read after WB"; break; }
+            r.red_gain = red_gain; r.blue_gain = blue_gain; r.ok = true;
+            std::cout << "[C++] WB done. Gains R=" << red_gain << ", B=" << blue_gain << std::endl;
+            publish_camera_state([red_gain, blue_gain](CameraState& s) { s.wb_red = red_gain; s.wb_blue = blue_gain; }); break; }
+        case CameraCommandType::Refresh: r.command = "refresh"; refresh_camera_state(); r.ok = true; break;
+        }
+    } catch (const GenICam::GenericException &e) { r.error = e.GetDescription(); std::cerr << "[C++] Control GenICam Ex: " << r.error << std::endl;
+    } catch (const std::exception &e) { r.error = e.what(); std::cerr << "[C++] Control Std Ex: " << r.error << std::endl;
+    } catch (...) { r.error = "unknown"; std::cerr << "[C++] Control Unknown ex." << std::endl; }
+    return r;
+}
+
+static void control_loop() {
+    std::cout << "[C++] Control thread started." << std::endl;
+    refresh_camera_state();
+    while (controlRunning.load()) {
+        CameraCommand cmd;
+        {
+            std::unique_lock<std::mutex> lk(controlMutex);
+            // Idle wake-ups re-read the snapshot, so changes made outside this channel still show up
+            if (!controlCv.wait_for(lk, std::chrono::seconds(1), [] { return !controlQueue.empty() || !controlRunning.load(); })) { lk.unlock(); refresh_camera_state(); continue; }
+            if (!controlRunning.load()) break;
+            cmd = controlQueue.front(); controlQueue.pop_front();
+        }
+        CameraCommandResult r = execute_camera_command(cmd);
+        std::lock_guard<std::mutex> lk(controlMutex);
+        controlResults.push_back(std::move(r));
+        while (controlResults.size() > 64) controlResults.pop_front(); // Nobody polling: keep the newest
+    }
+    std::cout << "[C++] Control thread stopped." << std::endl;
+}
+
+static void start_control_thread() {
+    if (controlRunning.exchange(true)) return;
+    controlThread = std::thread(control_loop);
+}
+
+static void stop_control_thread() {
+    if (!controlRunning.exchange(false)) return;
+    controlCv.notify_all();
+    if (controlThread.joinable()) controlThread.join();
+    std::lock_guard<std::mutex> lk(controlMutex); controlQueue.clear();
+}
+
+static uint64_t queue_camera_command(CameraCommandType type, int64_t value) {
+    if (!controlRunning.load()) return 0;
+    std::lock_guard<std::mutex> lk(controlMutex);
+    const uint64_t id = nextCommandId++;
+    controlQueue.push_back({id, type, value}); controlCv.notify_one();
+    return id;
+}
+
+// Return a command id (0 = control channel not running)
+uint64_t queue_gain_delta(int delta) { return queue_camera_command(CameraCommandType::GainDelta, delta); }
+uint64_t queue_exposure(int exposure_us) { return queue_camera_command(CameraCommandType::SetExposure, exposure_us); }
+uint64_t queue_white_balance() { return queue_camera_command(CameraCommandType::WhiteBalanceOnce, 0); }
+
+py::list poll_command_results() {
+    std::deque<CameraCommandResult> results;
+    { std::lock_guard<std::mutex> lk(controlMutex); results.swap(controlResults); }
+    py::list out;
+    for (const auto& r : results) {
+        py::dict d; d["id"] = r.id; d["command"] = r.command; d["ok"] = r.ok;
+        if (r.command == "white_balance") { d["red_gain"] = r.red_gain; d["blue_gain"] = r.blue_gain; } else d["value"] = r.value;
+        if (!r.error.empty()) d["error"] = r.error;
+        out.append(d);
+    }
+    return out;
+}
+
+// Cached snapshot: no nodemap access, safe to call every frame
+py::dict get_camera_state() {
+    CameraState s; { std::lock_guard<std::mutex> lk(cameraStateMutex); s = cameraState; }
+    size_t pending; { std::lock_guard<std::mutex> lk(controlMutex); pending = controlQueue.size(); }
+    py::dict d;
+    d["version"] = s.version; d["gain"] = s.gain; d["exposure_us"] = s.exposure_us; d["wb_red"] = s.wb_red; d["wb_blue"] = s.wb_blue; d["pending_commands"] = pending;
+    return d;
+}
+
+// --- 12-bit packing (Recorder frame pool, uncompressed 12-bit DNGs) ---
+// Both write into a caller-owned contiguous array (a pool slot), so there is no allocation per frame.
+void pack_raw12(py::array_t<uint16_t, py::array::c_style | py::array::forcecast> raw, py::array_t<uint8_t, py::array::c_style> out) {
+    if (raw.ndim() != 2 || (raw.shape(1) % 2)) throw std::runtime_error("pack_raw12: expected a 2D uint16 array with an even width");
+    if (static_cast<size_t>(out.size()) != static_cast<size_t>(raw.size()) * 3 / 2) throw std::runtime_error("pack_raw12: out must hold width * 3 / 2 bytes per row");
+    const uint16_t* src = raw.data(); uint8_t* dst = out.mutable_data(); const size_t n = static_cast<size_t>(raw.size());
+    py::gil_scoped_release release; raw12::pack(src, dst, n);
+}
+
+void unpack_raw12(py::array_t<uint8_t, py::array::c_style | py::array::forcecast> packed, py::array_t<uint16_t, py::array::c_style> out) {
+    if (static_cast<size_t>(packed.size()) != static_cast<size_t>(out.size()) * 3 / 2) throw std::runtime_error("unpack_raw12: size mismatch between packed and out");
+    const uint8_t* src = packed.data(); uint16_t* dst = out.mutable_data(); const size_t n = static_cast<size_t>(out.size());
+    py::gil_scoped_release release; raw12::unpack(src, dst, n);
+}
+
+py::dict get_init_timing() {
+    py::dict d; d["config_source"] = initConfigSource; d["runtime_ms"] = initPhaseMs[0]; d["open_ms"] = initPhaseMs[1]; d["config_ms"] = initPhaseMs[2]; d["start_ms"] = initPhaseMs[3];
+    return d;
+}
+
+// --- Preview options ---
+static std::shared_ptr<preview::Tables> make_preview_tables(const std::vector<double>& gains, int black_level, py::object lut) {
+    if (gains.size() != 3) throw std::runtime_error("preview: gains must be (r, g, b)");
+    auto t = std::make_shared<preview::Tables>();
+    if (lut.is_none()) { preview::build_tables(nullptr, gains.data(), black_level, *t); return t; }
+    auto arr = py::array_t<uint8_t, py::array::c_style | py::array::forcecast>::ensure(lut);
+    if (!arr || arr.size() != preview::LUT_SIZE) throw std::runtime_error("preview: lut must be 4096 uint8 values (one per 12-bit code)");
+    preview::build_tables(arr.data(), gains.data(), black_level, *t); return t;
+}
+
+// every_n: preview for every Nth captured frame (0 = none, e.g. recording headless); decimation: cell step (1 = half resolution).
+// gains: preview-only WB (r, g, b) around black_level; lut: 4096 display values (None = linear, code >> 4). Applies from the next frame.
+void set_preview_options(int every_n, int decimation, std::vector<double> gains, int black_level, py::object lut) {
+    auto t = make_preview_tables(gains, black_level, lut);
+    { std::lock_guard<std::mutex> lk(previewMutex); previewTables = t; }
+    previewEvery.store(std::max(0, every_n)); previewStep.store(std::max(1, decimation));
+}
+
+py::dict get_preview_options() { py::dict d; d["every_n"] = previewEvery.load(); d["decimation"] = previewStep.load(); d["width"] = PREVIEW_WIDTH; d["height"] = PREVIEW_HEIGHT; return d; }
+
+// The same binning on any mosaic (replay camera, tests), GIL released. out: contiguous uint8 (out_h, out_w, 3).
+void debayer_preview(py::array_t<uint16_t, py::array::c_style | py::array::forcecast> raw, py::array_t<uint8_t, py::array::c_style> out, std::vector<int> cfa,
+                     int decimation, std::vector<double> gains, int black_level, py::object lut) {
+    if (raw.ndim() != 2 || out.ndim() != 3 || out.shape(2) != 3) throw std::runtime_error("debayer_preview: expected a 2D uint16 mosaic and an (h, w, 3) uint8 out");
+    if (cfa.size() != 4) throw std::runtime_error("debayer_preview: cfa must have 4 entries");
+    auto t = make_preview_tables(gains, black_level, lut);
+    const int h = static_cast<int>(raw.shape(0)), w = static_cast<int>(raw.shape(1)), oh = static_cast<int>(out.shape(0)), ow = static_cast<int>(out.shape(1));
+    const uint16_t* src = raw.data(); uint8_t* dst = out.mutable_data();
+    py::gil_scoped_release release; preview::bin_to_rgb(src, h, w, static_cast<size_t>(w), cfa.data(), decimation, *t, dst, ow, oh);
+}
+
+// --- DNG tile encoding ---
+// Splits the raw mosaic into tile_w x tile_h tiles and LJ92-encodes them on `threads` threads (0 = all cores), GIL released.
+// Returns the tiles row-major as bytes, ready to be written behind a TileOffsets/TileByteCounts header.
+py::list encode_lj92_tiles(py::array_t<uint16_t, py::array::c_style | py::array::forcecast> raw, int tile_w, int tile_h, int bits, int threads, int predictor) {
+    if (raw.ndim() != 2) throw std::runtime_error("encode_lj92_tiles: expected a 2D uint16 array");
+    if (tile_w <= 0 || tile_h <= 0 || (tile_w % 16) || (tile_h % 16)) throw std::runtime_error("encode_lj92_tiles: tile size must be a positive multiple of 16");
+    const int h = static_cast<int>(raw.shape(0)), w = static_cast<int>(raw.shape(1));
+    std::vector<std::vector<uint8_t>> tiles;
+    { py::gil_scoped_release release; lj92::encode_tiles(raw.data(), h, w, tile_w, tile_h, bits, predictor, threads, tiles); }
+    py::list out;
+    for (const auto& t : tiles) out.append(py::bytes(reinterpret_cast<const char*>(t.data()), t.size()));
+    return out;
+}
+
 // --- Module Definition ---
 PYBIND11_MODULE(core_module, m) {
     NDArrayConverter::init_numpy(); // Important for OpenCV Mat <-> NumPy conversion
     m.doc() = "Core C++ module for Bolex camera control and preview";
     // Camera Functions
-    m.def("initialize_camera", &initialize_camera, "Initializes the Pylon runtime and the first camera found.");
-    m.def("grab_preview_and_raw", &grab_preview_and_raw, "Grabs one frame, returns tuple (720p_RGB_preview, full_res_raw16_MSB_unscaled)"); // Updated doc
-    m.def("shutdown_camera", &shutdown_camera, "Stops grabbing, closes camera, and terminates Pylon runtime.");
+    m.def("initialize_camera", &initialize_camera, "Initializes the Pylon runtime and the first camera found. config_cache: .pfs file or 'userset:UserSetN' restored in one call, saved after a full configuration. power_on_default: a saved user set also becomes the camera's power-on default.",
+          py::arg("config_cache") = std::string(), py::arg("power_on_default") = false);
+    m.def("get_init_timing", &get_init_timing, "Returns dict: config_source (full/cache/userset) and runtime/open/config/start phase times of initialize_camera in ms.");
+    m.def("grab_preview_and_raw", &grab_preview_and_raw, "Grabs one frame, returns tuple (1024x600 RGB preview or None, full_res_raw16_MSB_unscaled)", py::arg("want_preview") = true, py::call_guard<py::gil_scoped_release>());
+    m.def("shutdown_camera", &shutdown_camera, "Stops grabbing, closes camera, and terminates Pylon runtime.", py::call_guard<py::gil_scoped_release>());
+    // Background Capture
+    m.def("start_capture", &start_capture, "Starts the native capture thread (GIL-free) feeding a small frame ring.");
+    m.def("stop_capture", &stop_capture, "Stops and joins the capture thread, discarding queued frames.", py::call_guard<py::gil_scoped_release>());
+    m.def("try_get_frame", &try_get_frame, "Non-blocking: returns (preview, raw, meta_dict) or None if no frame is ready.");
+    m.def("get_frame", &get_frame, "Blocks up to timeout seconds (GIL released): returns (preview, raw, meta_dict) or None.", py::arg("timeout") = 0.5);
+    m.def("set_zero_copy_raw", &set_zero_copy_raw, "Capture thread returns raw as a read-only NumPy view of the Pylon buffer (held until the array is released).", py::arg("enable"));
+    m.def("get_zero_copy_raw", &get_zero_copy_raw, "Returns whether zero-copy raw hand-off is enabled.");
+    m.def("get_capture_stats", &get_capture_stats, "Returns dict with captured/overruns/errors/queued counters of the capture thread.");
+    // Preview
+    m.def("set_preview_options", &set_preview_options, "Preview every Nth frame (0 = none), cell decimation, preview WB gains and 4096-entry display LUT (None = linear).",
+          py::arg("every_n") = 1, py::arg("decimation") = 1, py::arg("gains") = std::vector<double>{1.0, 1.0, 1.0}, py::arg("black_level") = 0, py::arg("lut") = py::none());
+    m.def("get_preview_options", &get_preview_options, "Returns dict with every_n, decimation, width, height of the preview.");
+    m.def("debayer_preview", &debayer_preview, "Bins a raw mosaic into out (h, w, 3 uint8) like the capture preview, GIL released.", py::arg("raw"), py::arg("out"),
+          py::arg("cfa") = std::vector<int>{1, 2, 0, 1}, py::arg("decimation") = 1, py::arg("gains") = std::vector<double>{1.0, 1.0, 1.0}, py::arg("black_level") = 0, py::arg("lut") = py::none());
     // Parameter Control
     m.def("set_gain", &set_gain, "Increases/decreases GainRaw by delta.", py::arg("delta"));
     m.def("get_gain", &get_gain, "Gets the current GainRaw value.");
     m.def("get_exposure", &get_exposure, "Gets the current ExposureTimeRaw value in microseconds.");
+    // Async Control Channel
+    m.def("queue_gain_delta", &queue_gain_delta, "Queues a GainRaw change by delta; returns command id (0 if control channel not running).", py::arg("delta"));
+    m.def("queue_exposure", &queue_exposure, "Queues an ExposureTimeRaw change (microseconds); returns command id.", py::arg("exposure_us"));
+    m.def("queue_white_balance", &queue_white_balance, "Queues a BalanceWhiteAuto Once run; result (red_gain, blue_gain) arrives via poll_command_results().");
+    m.def("poll_command_results", &poll_command_results, "Returns and clears the list of finished command result dicts.");
+    m.def("get_camera_state", &get_camera_state, "Cached parameter snapshot dict (version, gain, exposure_us, wb_red, wb_blue, pending_commands). No nodemap access.");
     // White Balance
     m.def("trigger_wb_and_get_gains", &trigger_wb_and_get_gains, "Triggers WB Once and returns tuple (red_gain, blue_gain). Returns (1,1) or (-1,-1) on error.");
+    // DNG writing
+    m.def("pack_raw12", &pack_raw12, "Packs a uint16 12-bit raw frame into out (uint8, width * 3 / 2 per row, DNG bit order), GIL released.", py::arg("raw"), py::arg("out"));
+    m.def("unpack_raw12", &unpack_raw12, "Unpacks a 12-bit packed frame into out (uint16), GIL released.", py::arg("packed"), py::arg("out"));
+    m.def("encode_lj92_tiles", &encode_lj92_tiles, "LJ92-encodes the raw mosaic as DNG tiles (row-major list of bytes), GIL released, threads=0 uses all cores.",
+          py::arg("raw"), py::arg("tile_w") = 256, py::arg("tile_h") = 256, py::arg("bits") = 12, py::arg("threads") = 0, py::arg("predictor") = 6);
 }
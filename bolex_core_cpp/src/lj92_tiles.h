@@ -0,0 +1,142 @@
+// src/lj92_tiles.h (Lossless JPEG (ITU T.81 process 14, "LJ92") encoder for DNG tiles, parallel over tiles)
+// Header-only, no Pylon/OpenCV dependencies. Tiles use the same layout as pidng's pack16tolj: a tile_w x tile_h CFA tile
+// is coded as one component, (tile_w * 2) x (tile_h / 2), so the row above is two sensor rows up (same CFA colour).
+#pragma once
+
+#include <cstdint>
+#include <cstring>
+#include <vector>
+#include <array>
+#include <thread>
+#include <atomic>
+#include <algorithm>
+
+namespace lj92 {
+
+struct BitWriter {
+    // Writes into a buffer the caller has sized for the worst case (32 bits + stuffing per sample); 64-bit accumulator
+    uint8_t* p; uint64_t acc = 0; int nbits = 0;
+    explicit BitWriter(uint8_t* dst) : p(dst) {}
+    inline void put(uint32_t bits, int n) { // n <= 32 per call
+        acc = (acc << n) | (bits & ((1ull << n) - 1)); nbits += n;
+        while (nbits >= 8) {
+            const uint8_t b = static_cast<uint8_t>(acc >> (nbits - 8)); nbits -= 8; *p++ = b;
+            if (b == 0xFF) *p++ = 0x00; // Byte stuffing
+        }
+    }
+    void flush() { if (nbits > 0) put(0x7F, 8 - nbits); } // Pad with 1-bits
+};
+
+static inline int ssss_of(int diff) { const unsigned a = static_cast<unsigned>(diff < 0 ? -diff : diff); return a ? 32 - __builtin_clz(a) : 0; }
+
+// JPEG Annex K.2: optimal code lengths (limited to 16 bits) for the 17 difference categories
+static void build_huffman(const std::array<uint32_t, 17>& counts, std::array<uint8_t, 17>& bits_out, std::vector<uint8_t>& huffval, std::array<uint16_t, 17>& code, std::array<uint8_t, 17>& size) {
+    long freq[18]; int codesize[18], others[18];
+    for (int i = 0; i < 17; i++) freq[i] = counts[i];
+    freq[17] = 1; // Reserved symbol, so no real code is all ones
+    for (int i = 0; i < 18; i++) { codesize[i] = 0; others[i] = -1; }
+    for (;;) {
+        int c1 = -1, c2 = -1; long v = 0x7FFFFFFFL;
+        for (int i = 0; i < 18; i++) if (freq[i] && freq[i] <= v) { v = freq[i]; c1 = i; }
+        v = 0x7FFFFFFFL;
+        for (int i = 0; i < 18; i++) if (freq[i] && freq[i] <= v && i != c1) { v = freq[i]; c2 = i; }
+        if (c2 < 0) break;
+        freq[c1] += freq[c2]; freq[c2] = 0;
+        codesize[c1]++; while (others[c1] >= 0) { c1 = others[c1]; codesize[c1]++; }
+        others[c1] = c2;
+        codesize[c2]++; while (others[c2] >= 0) { c2 = others[c2]; codesize[c2]++; }
+    }
+    int bits[33] = {0};
+    for (int i = 0; i < 18; i++) if (codesize[i]) bits[std::min(codesize[i], 32)]++;
+    for (int i = 32; i > 16; i--) while (bits[i] > 0) { int j = i - 2; while (bits[j] == 0) j--; bits[i] -= 2; bits[i - 1]++; bits[j + 1] += 2; bits[j]--; }
+    int i = 16; while (bits[i] == 0) i--; bits[i]--; // Drop the reserved symbol (it has the longest code)
+    huffval.clear();
+    for (int len = 1; len <= 32; len++) for (int s = 0; s < 17; s++) if (codesize[s] == len) huffval.push_back(static_cast<uint8_t>(s));
+    bits_out[0] = 0; for (int l = 1; l <= 16; l++) bits_out[l] = static_cast<uint8_t>(bits[l]);
+    size.fill(0); code.fill(0);
+    uint16_t c = 0; size_t k = 0; // Canonical codes (Annex C)
+    for (int l = 1; l <= 16; l++) { for (int n = 0; n < bits[l]; n++, k++) { code[huffval[k]] = c++; size[huffval[k]] = static_cast<uint8_t>(l); } c <<= 1; }
+}
+
+template <int P> static inline int predict(int ra, int rb, int rc) {
+    switch (P) {
+        case 1: return ra; case 2: return rb; case 3: return rc; case 4: return ra + rb - rc;
+        case 5: return ra + ((rb - rc) >> 1); case 6: return rb + ((ra - rc) >> 1); default: return (ra + rb) >> 1;
+    }
+}
+
+// Prediction differences (modulo 2^16, as decoders reconstruct) and their category histogram; predictor fixed at compile time
+template <int P> static void differences(const uint16_t* px, int width, int height, int precision, int32_t* diffs, std::array<uint32_t, 17>& counts) {
+    for (int r = 0; r < height; r++) {
+        const uint16_t* row = px + static_cast<size_t>(r) * width; const uint16_t* up = row - width; int32_t* d = diffs + static_cast<size_t>(r) * width;
+        d[0] = static_cast<int16_t>(static_cast<uint16_t>(row[0] - (r ? up[0] : (1 << (precision - 1)))));
+        if (r == 0) for (int c = 1; c < width; c++) d[c] = static_cast<int16_t>(static_cast<uint16_t>(row[c] - row[c - 1]));
+        else for (int c = 1; c < width; c++) d[c] = static_cast<int16_t>(static_cast<uint16_t>(row[c] - predict<P>(row[c - 1], up[c], up[c - 1])));
+        for (int c = 0; c < width; c++) counts[d[c] == -32768 ? 16 : ssss_of(d[c])]++;
+    }
+}
+
+// Encode `height` rows of `width` samples (contiguous, row stride == width) as one LJ92 frame
+static void encode_frame(const uint16_t* px, int width, int height, int precision, int predictor, std::vector<uint8_t>& out, std::vector<int32_t>& diffs) {
+    const size_t n = static_cast<size_t>(width) * height; diffs.resize(n);
+    std::array<uint32_t, 17> counts{};
+    switch (predictor) {
+        case 1: differences<1>(px, width, height, precision, diffs.data(), counts); break; case 2: differences<2>(px, width, height, precision, diffs.data(), counts); break;
+        case 3: differences<3>(px, width, height, precision, diffs.data(), counts); break; case 4: differences<4>(px, width, height, precision, diffs.data(), counts); break;
+        case 5: differences<5>(px, width, height, precision, diffs.data(), counts); break; case 6: differences<6>(px, width, height, precision, diffs.data(), counts); break;
+        default: predictor = 7; differences<7>(px, width, height, precision, diffs.data(), counts); break;
+    }
+    std::array<uint8_t, 17> bits; std::vector<uint8_t> huffval; std::array<uint16_t, 17> code; std::array<uint8_t, 17> size;
+    build_huffman(counts, bits, huffval, code, size);
+    out.clear(); out.reserve(n * 2 + 256);
+    auto u16 = [&](int v) { out.push_back(static_cast<uint8_t>(v >> 8)); out.push_back(static_cast<uint8_t>(v)); };
+    out.push_back(0xFF); out.push_back(0xD8); // SOI
+    out.push_back(0xFF); out.push_back(0xC3); u16(11); out.push_back(static_cast<uint8_t>(precision)); u16(height); u16(width); out.push_back(1); out.push_back(0); out.push_back(0x11); out.push_back(0); // SOF3
+    out.push_back(0xFF); out.push_back(0xC4); u16(2 + 1 + 16 + static_cast<int>(huffval.size())); out.push_back(0x00); // DHT
+    for (int l = 1; l <= 16; l++) out.push_back(bits[l]);
+    out.insert(out.end(), huffval.begin(), huffval.end());
+    out.push_back(0xFF); out.push_back(0xDA); u16(8); out.push_back(1); out.push_back(0); out.push_back(0x00); out.push_back(static_cast<uint8_t>(predictor)); out.push_back(0); out.push_back(0); // SOS
+    const size_t head = out.size(); out.resize(head + n * 8 + 16); // Worst case: 32 bits per sample, every byte stuffed
+    BitWriter bw(out.data() + head);
+    for (size_t i = 0; i < n; i++) {
+        const int diff = diffs[i];
+        if (diff == -32768) { bw.put(code[16], size[16]); continue; } // Category 16 carries no extra bits
+        const int s = ssss_of(diff);
+        if (s) bw.put((static_cast<uint32_t>(code[s]) << s) | (static_cast<uint32_t>(diff < 0 ? diff - 1 : diff) & ((1u << s) - 1)), size[s] + s); // Code + extra bits in one go
+        else bw.put(code[0], size[0]);
+    }
+    bw.flush();
+    out.resize(static_cast<size_t>(bw.p - out.data()));
+    out.push_back(0xFF); out.push_back(0xD9); // EOI
+}
+
+// Split a (height x width) mosaic into tile_h x tile_w tiles (row-major, as TileOffsets expects) and LJ92-encode them on `threads`
+// threads. Edge tiles are padded by repeating the last two rows/columns, which keeps the CFA phase.
+static void encode_tiles(const uint16_t* frame, int height, int width, int tile_w, int tile_h, int precision, int predictor, int threads, std::vector<std::vector<uint8_t>>& tiles) {
+    const int tiles_across = (width + tile_w - 1) / tile_w, tiles_down = (height + tile_h - 1) / tile_h, count = tiles_across * tiles_down;
+    tiles.assign(count, {});
+    if (threads <= 0) threads = static_cast<int>(std::max(1u, std::thread::hardware_concurrency()));
+    threads = std::min(threads, count);
+    std::atomic<int> next{0};
+    auto work = [&]() {
+        std::vector<uint16_t> scratch(static_cast<size_t>(tile_w) * tile_h); std::vector<int32_t> diffs;
+        for (int t; (t = next.fetch_add(1)) < count;) {
+            const int y0 = (t / tiles_across) * tile_h, x0 = (t % tiles_across) * tile_w;
+            for (int y = 0; y < tile_h; y++) {
+                int sy = y0 + y; while (sy >= height) sy -= 2;
+                const uint16_t* src = frame + static_cast<size_t>(sy) * width; uint16_t* dst = scratch.data() + static_cast<size_t>(y) * tile_w;
+                const int inside = std::min(tile_w, width - x0);
+                std::memcpy(dst, src + x0, sizeof(uint16_t) * inside);
+                for (int x = inside; x < tile_w; x++) { int sx = x0 + x; while (sx >= width) sx -= 2; dst[x] = src[sx]; }
+            }
+            encode_frame(scratch.data(), tile_w * 2, tile_h / 2, precision, predictor, tiles[t], diffs);
+        }
+    };
+    if (threads == 1) { work(); return; }
+    std::vector<std::thread> pool; pool.reserve(threads - 1);
+    for (int i = 1; i < threads; i++) pool.emplace_back(work);
+    work();
+    for (auto& th : pool) th.join();
+}
+
+} // namespace lj92
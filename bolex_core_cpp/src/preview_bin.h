@@ -0,0 +1,57 @@
+// src/preview_bin.h (Fast preview: each 2x2 Bayer cell -> one RGB pixel, WB + display LUT folded into one table lookup per channel)
+// Header-only, no Pylon/OpenCV dependencies. Same result as bolex_preview.py's NumPy reference (bin_preview).
+// Replaces convertTo(8 bit) + full-resolution bilinear demosaic + resize: the mosaic is read once, at the resolution the display needs.
+#pragma once
+
+#include <cstdint>
+#include <cstddef>
+#include <cstring>
+#include <cmath>
+#include <array>
+#include <vector>
+#include <algorithm>
+
+namespace preview {
+
+static const int LUT_SIZE = 4096; // 12-bit raw codes; larger values clamp
+
+// Per channel: raw code -> display byte, white balance gain already applied (around the black level)
+struct Tables { std::array<std::array<uint8_t, LUT_SIZE>, 3> rgb; };
+
+// lut: LUT_SIZE display values for balanced raw codes (nullptr = linear code >> 4, the old convertTo(1/16) look)
+static void build_tables(const uint8_t* lut, const double gains[3], int black, Tables& t) {
+    for (int c = 0; c < 3; c++)
+        for (int v = 0; v < LUT_SIZE; v++) {
+            const int balanced = std::min(LUT_SIZE - 1, std::max(0, static_cast<int>(std::lround((v - black) * gains[c])) + black));
+            t.rgb[c][v] = lut ? lut[balanced] : static_cast<uint8_t>(balanced >> 4);
+        }
+}
+
+// raw: height x width mosaic (row stride `stride` samples), cfa: colour (0=R, 1=G, 2=B) at [0,0], [0,1], [1,0], [1,1].
+// step: use every step-th cell (1 = every 2x2 cell, half resolution). Output out_h x out_w RGB (row stride out_w * 3), cells
+// picked nearest-neighbour; output rows that map to the same cell row are copied, not recomputed.
+static void bin_to_rgb(const uint16_t* raw, int height, int width, size_t stride, const int cfa[4], int step, const Tables& t, uint8_t* out, int out_w, int out_h) {
+    step = std::max(1, step);
+    const int cells_w = width / 2 / step, cells_h = height / 2 / step;
+    if (cells_w <= 0 || cells_h <= 0) return;
+    int r_pos = 0, b_pos = 3, g_pos[2] = {1, 2}, gi = 0; // Positions in the 2x2 cell: 0 = [0,0], 1 = [0,1], 2 = [1,0], 3 = [1,1]
+    for (int p = 0; p < 4; p++) { if (cfa[p] == 0) r_pos = p; else if (cfa[p] == 2) b_pos = p; else if (gi < 2) g_pos[gi++] = p; }
+    std::vector<int> cols(out_w);
+    for (int x = 0; x < out_w; x++) cols[x] = static_cast<int>(static_cast<int64_t>(x) * cells_w / out_w) * step * 2;
+    const auto& lr = t.rgb[0]; const auto& lg = t.rgb[1]; const auto& lb = t.rgb[2];
+    auto at = [](const uint16_t* rows[2], int pos, int col) { const uint16_t v = rows[pos >> 1][col + (pos & 1)]; return v < LUT_SIZE ? v : LUT_SIZE - 1; };
+    int prev_cell = -1;
+    for (int y = 0; y < out_h; y++) {
+        uint8_t* dst = out + static_cast<size_t>(y) * out_w * 3;
+        const int cell = static_cast<int>(static_cast<int64_t>(y) * cells_h / out_h);
+        if (cell == prev_cell) { std::memcpy(dst, dst - static_cast<size_t>(out_w) * 3, static_cast<size_t>(out_w) * 3); continue; }
+        prev_cell = cell;
+        const uint16_t* rows[2] = {raw + static_cast<size_t>(cell) * step * 2 * stride, raw + (static_cast<size_t>(cell) * step * 2 + 1) * stride};
+        for (int x = 0; x < out_w; x++, dst += 3) {
+            const int c = cols[x];
+            dst[0] = lr[at(rows, r_pos, c)]; dst[1] = lg[(at(rows, g_pos[0], c) + at(rows, g_pos[1], c)) >> 1]; dst[2] = lb[at(rows, b_pos, c)];
+        }
+    }
+}
+
+} // namespace preview
@@ -0,0 +1,24 @@
+// src/raw12_pack.h (12-bit Bayer packing: 2 pixels -> 3 bytes, MSB first, the layout of an uncompressed BitsPerSample=12 DNG strip)
+// Header-only, no Pylon/OpenCV dependencies. Same byte order as bolex_pack12.py / pidng.packing.pack12.
+#pragma once
+
+#include <cstdint>
+#include <cstddef>
+
+namespace raw12 {
+
+// `pixels` samples (even) of LSB-aligned 12-bit data -> pixels * 3 / 2 bytes
+static inline void pack(const uint16_t* src, uint8_t* dst, size_t pixels) {
+    for (size_t i = 0; i + 1 < pixels; i += 2, dst += 3) {
+        const uint16_t a = src[i], b = src[i + 1];
+        dst[0] = static_cast<uint8_t>(a >> 4); dst[1] = static_cast<uint8_t>((a << 4) | ((b >> 8) & 0x0F)); dst[2] = static_cast<uint8_t>(b);
+    }
+}
+
+static inline void unpack(const uint8_t* src, uint16_t* dst, size_t pixels) {
+    for (size_t i = 0; i + 1 < pixels; i += 2, src += 3) {
+        dst[i] = static_cast<uint16_t>((src[0] << 4) | (src[1] >> 4)); dst[i + 1] = static_cast<uint16_t>(((src[1] & 0x0F) << 8) | src[2]);
+    }
+}
+
+} // namespace raw12
@@ -0,0 +1,242 @@
+# bolex_dng.py (Tiled DNG writer: header/IFD built once per segment, per-tile LJ92 in parallel, one writev per frame)
+import os, sys, time
+import numpy as np
+from bolex_pack12 import pack12, unpack12, packed_shape
+from pidng.dng import DNG, dngIFD, dngTag, Tag
+from pidng.defs import Compression, DNGVersion
+from pidng.packing import pack10, pack14 # 12-bit goes through bolex_pack12 (same layout, native when built)
+
+DEFAULT_TILE = 256 # TIFF needs multiples of 16; 256 gives 8 x 5 tiles for the 2048 x 1108 window
+LJ92_PREDICTOR = 6 # Same as pidng: Rb + (Ra - Rc) / 2 on the 2-rows-per-line layout
+_LAYOUT_TAGS = {Tag.StripOffsets[0], Tag.StripByteCounts[0], Tag.RowsPerStrip[0], Tag.TileOffsets[0], Tag.TileByteCounts[0], Tag.TileWidth[0], Tag.TileLength[0], Tag.Compression[0], Tag.NewSubfileType[0]}
+_IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") and "SC_IOV_MAX" in os.sysconf_names else 1024
+
+def native_tile_encoder():
+    # core_module.encode_lj92_tiles (C++, GIL released, threads over tiles) when the built module is importable, else None
+    mod = sys.modules.get("core_module")
+    if mod is None:
+        try: import core_module as mod
+        except ImportError: return None
+    return getattr(mod, "encode_lj92_tiles", None)
+
+def _padded_tile(frame: np.ndarray, y0: int, x0: int, th: int, tw: int) -> np.ndarray:
+    # Edge tiles repeat the last two rows/columns (keeps the CFA phase), same as the C++ encoder
+    tile = frame[y0:y0 + th, x0:x0 + tw]
+    if tile.shape == (th, tw): return np.ascontiguousarray(tile)
+    h, w = frame.shape; ys = np.arange(y0, y0 + th); xs = np.arange(x0, x0 + tw)
+    ys = np.where(ys >= h, ys - 2 * ((ys - h) // 2 + 1), ys); xs = np.where(xs >= w, xs - 2 * ((xs - w) // 2 + 1), xs)
+    return np.ascontiguousarray(frame[np.ix_(ys, xs)])
+
+
+class TiledDNGWriter:
+    """Writes one DNG per frame from a header template that is built once per segment.
+
+    The IFD (all tags, TileOffsets/TileByteCounts placeholders) is serialised once with pidng's own tag classes.
+    Per frame only the two offset/count arrays are patched. The tiles are encoded as LJ92 streams in parallel
+    (core_module.encode_lj92_tiles, or pidng's ljpegCompress per tile on a thread pool as a fallback). Then header + tiles
+    go to disk with one writev. compress=False writes bit-packed uncompressed tiles instead."""
+    def __init__(self, tags, width: int, height: int, tile_size: int = DEFAULT_TILE, compress: bool = True, threads: int = 0):
+        self.width = int(width); self.height = int(height); self.tile_w = self.tile_h = int(tile_size); self.compress = compress
+        self.threads = threads if threads > 0 else (os.cpu_count() or 1)
+        self.bpp = tags.get(Tag.BitsPerSample).rawValue[0]
+        self.tiles_across = -(-self.width // self.tile_w); self.tiles_down = -(-self.height // self.tile_h); self.tile_count = self.tiles_across * self.tiles_down
+        self._native = native_tile_encoder() if compress else None; self._executor = None; self._unpacked = None
+        if compress and self._native is None:
+            from ljpegCompress import pack16tolj # Raises ImportError if there is no LJ92 encoder at all
+            self._pack16tolj = pack16tolj
+        self._build_template(tags)
+
+    def _build_template(self, tags):
+        layout = [dngTag(Tag.NewSubfileType, [0]), dngTag(Tag.Compression, [Compression.LJ92 if self.compress else Compression.Uncompressed]),
+                  dngTag(Tag.TileWidth, [self.tile_w]), dngTag(Tag.TileLength, [self.tile_h])]
+        offsets_tag = dngTag(Tag.TileOffsets, [0] * self.tile_count); counts_tag = dngTag(Tag.TileByteCounts, [0] * self.tile_count)
+        self.header = _header_template(layout + [offsets_tag, counts_tag], tags); self.header_len = len(self.header)
+        self._offsets_pos = _value_pos(offsets_tag); self._counts_pos = _value_pos(counts_tag)
+
+    def update_tags(self, tags): self._build_template(tags) # e.g. AsShotNeutral changed mid-segment
+    def template(self) -> tuple: return self.header, self._offsets_pos, self._counts_pos # For take files (bolex_take.py)
+    def encode(self, frame: np.ndarray) -> list: return self.encode_tiles(frame) # Image data parts, in TileOffsets order
+
+    def encode_tiles(self, frame: np.ndarray) -> list:
+        if frame.dtype == np.uint8: # 12-bit packed pool slot: unpack into one reused buffer
+            if self._unpacked is None: self._unpacked = np.empty((self.height, self.width), dtype=np.uint16)
+            frame = unpack12(frame, self._unpacked)
+        if frame.shape != (self.height, self.width): raise ValueError(f"Frame shape {frame.shape} != writer {(self.height, self.width)}")
+        if frame.dtype != np.uint16 or not frame.flags.c_contiguous: frame = np.ascontiguousarray(frame, dtype=np.uint16)
+        if self._native is not None: return self._native(frame, self.tile_w, self.tile_h, self.bpp, self.threads, LJ92_PREDICTOR)
+        coords = [(ty * self.tile_h, tx * self.tile_w) for ty in range(self.tiles_down) for tx in range(self.tiles_across)]
+        if not self.compress: return [self._pack_tile(_padded_tile(frame, y, x, self.tile_h, self.tile_w)) for y, x in coords]
+        encode = lambda yx: self._pack16tolj(_padded_tile(frame, yx[0], yx[1], self.tile_h, self.tile_w), self.tile_w * 2, self.tile_h // 2, self.bpp, 0, 0, 0, "", LJ92_PREDICTOR)
+        if self.threads == 1: return [encode(c) for c in coords]
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="DNGTile")
+        return list(self._executor.map(encode, coords))
+
+    def _pack_tile(self, tile: np.ndarray) -> bytes:
+        if self.bpp == 12: return pack12(tile).tobytes()
+        if self.bpp == 10: return pack10(tile).tobytes()
+        if self.bpp == 14: return pack14(tile).tobytes()
+        if self.bpp == 8: return tile.astype(np.uint8).tobytes()
+        return tile.astype("<u2").tobytes()
+
+    def build_header(self, tiles: list) -> bytearray: return patch_header(self.header, self._offsets_pos, self._counts_pos, map(len, tiles), len(tiles))
+
+    def write(self, frame: np.ndarray, filepath_no_ext: str) -> tuple:
+        # Returns (path, bytes written)
+        tiles = self.encode_tiles(frame); header = self.build_header(tiles)
+        path = filepath_no_ext if filepath_no_ext.endswith(".dng") else filepath_no_ext + ".dng"
+        total = write_buffers(path, [header] + list(tiles))
+        return path, total
+
+    def close(self):
+        if self._executor is not None: self._executor.shutdown(wait=False); self._executor = None
+
+
+class PidngWriter:
+    # Single-strip pidng RAW2DNG behind the same interface (tile_size=0, or no LJ92 encoder usable for tiles)
+    def __init__(self, tags, compress: bool = True):
+        from pidng.core import RAW2DNG
+        self.compress = compress; self.converter = RAW2DNG(); self.converter.options(tags, path="", compress=compress)
+    def update_tags(self, tags): self.converter.options(tags, path="", compress=self.compress)
+    def write(self, frame: np.ndarray, filepath_no_ext: str) -> tuple:
+        if frame.dtype == np.uint8: frame = unpack12(frame)
+        elif frame.dtype != np.uint16: frame = frame.astype(np.uint16)
+        path = self.converter.convert(frame, filename=filepath_no_ext); return path, os.path.getsize(path)
+    def close(self): pass
+
+class PackedDNGWriter:
+    """Uncompressed 12-bit DNGs for the fast recording mode: one strip, and the 12-bit packed frame already is that strip.
+
+    The whole header (offset and byte count included) is constant for a segment, so a frame is one writev of the cached
+    header plus the pool slot, with no encoding and no copy. uint16 frames are packed into a reused buffer first."""
+    compress = False
+    def __init__(self, tags, width: int, height: int):
+        self.width = int(width); self.height = int(height); self.strip_bytes = int(np.prod(packed_shape((self.height, self.width)))); self._packed = None
+        if tags.get(Tag.BitsPerSample).rawValue[0] != 12: raise ValueError("PackedDNGWriter writes BitsPerSample=12 only")
+        self._build_template(tags)
+
+    def _build_template(self, tags):
+        layout = [dngTag(Tag.NewSubfileType, [0]), dngTag(Tag.Compression, [Compression.Uncompressed]), dngTag(Tag.RowsPerStrip, [self.height])]
+        offsets_tag = dngTag(Tag.StripOffsets, [0]); counts_tag = dngTag(Tag.StripByteCounts, [self.strip_bytes])
+        header = bytearray(_header_template(layout + [offsets_tag, counts_tag], tags)); self._offsets_pos = _value_pos(offsets_tag); self._counts_pos = _value_pos(counts_tag)
+        header[self._offsets_pos:self._offsets_pos + 4] = len(header).to_bytes(4, "little")
+        self.header = bytes(header); self.header_len = len(header)
+
+    def update_tags(self, tags): self._build_template(tags)
+    def template(self) -> tuple: return self.header, self._offsets_pos, self._counts_pos
+
+    def encode(self, frame: np.ndarray) -> list:
+        if frame.dtype != np.uint8:
+            if self._packed is None: self._packed = np.empty(packed_shape((self.height, self.width)), dtype=np.uint8)
+            frame = pack12(frame, self._packed)
+        if frame.size != self.strip_bytes: raise ValueError(f"Packed frame is {frame.size} bytes, expected {self.strip_bytes}")
+        return [np.ascontiguousarray(frame)]
+
+    def build_header(self, parts: list) -> bytes: return self.header # One strip of fixed size: nothing to patch
+
+    def write(self, frame: np.ndarray, filepath_no_ext: str) -> tuple:
+        path = filepath_no_ext if filepath_no_ext.endswith(".dng") else filepath_no_ext + ".dng"
+        return path, write_buffers(path, [self.header] + self.encode(frame))
+
+    def close(self): pass
+
+def make_dng_writer(tags, width: int, height: int, compress: bool = True, tile_size: int = DEFAULT_TILE, threads: int = 0):
+    # compress=False with 12-bit tags: PackedDNGWriter (fast mode). Otherwise tiled LJ92, or pidng when tile_size=0 / no LJ92 encoder.
+    if not compress and tags.get(Tag.BitsPerSample).rawValue[0] == 12: return PackedDNGWriter(tags, width, height)
+    if tile_size > 0:
+        try: return TiledDNGWriter(tags, width, height, tile_size, compress, threads)
+        except ImportError as e: print(f"Warn: No LJ92 tile encoder ({e}), using pidng single-strip DNGs.")
+    return PidngWriter(tags, compress)
+
+
+def _header_template(layout: list, tags) -> bytes:
+    # TIFF header + IFD0 (layout tags first, then the caller's tags minus layout ones), serialised by pidng, no image data
+    ifd = dngIFD(); seen = set()
+    for tag in layout: ifd.tags.append(tag); seen.add(tag.TagId)
+    for tag in tags.list():
+        if tag.TagId in _LAYOUT_TAGS or tag.TagId in seen: continue
+        ifd.tags.append(tag); seen.add(tag.TagId)
+    if Tag.DNGVersion[0] not in seen: ifd.tags.append(dngTag(Tag.DNGVersion, DNGVersion.V1_4))
+    if Tag.DNGBackwardVersion[0] not in seen: ifd.tags.append(dngTag(Tag.DNGBackwardVersion, DNGVersion.V1_0))
+    dng = DNG(); dng.IFDs.append(ifd)
+    header_len = 8 + ((ifd.dataLen() + 3) & ~3) # DNG.dataLen() without image data
+    buf = bytearray(header_len); dng.setBuffer(buf); dng.write()
+    return bytes(buf)
+
+def patch_header(template: bytes, offsets_pos: int, counts_pos: int, sizes, count: int) -> bytearray:
+    # Copy of a header template with the offset/byte count arrays filled in for image data parts laid out right behind it
+    counts = np.fromiter(sizes, dtype="<u4", count=count); header_len = len(template)
+    offsets = np.empty_like(counts); offsets[0] = header_len; np.cumsum(counts[:-1], out=offsets[1:]); offsets[1:] += header_len
+    header = bytearray(template); n = 4 * count
+    header[offsets_pos:offsets_pos + n] = offsets.tobytes(); header[counts_pos:counts_pos + n] = counts.tobytes()
+    return header
+
+def _value_pos(tag: dngTag) -> int:
+    # File position of a written tag's value (inline in the IFD entry when it fits in 4 bytes)
+    return tag.DataOffset if not tag.selfContained else tag.TagOffset + 8
+
+def write_buffers(path: str, buffers: list) -> int:
+    # One writev per IOV_MAX buffers, resuming after short writes
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644); total = 0
+    try:
+        views = [memoryview(b).cast("B") for b in buffers] # Flat byte views: len() is then the byte count, also for 2D arrays
+        while views:
+            n = os.writev(fd, views[:_IOV_MAX]); total += n
+            while views and n >= len(views[0]): n -= len(views[0]); views.pop(0)
+            if n: views[0] = views[0][n:]
+    finally: os.close(fd)
+    return total
+
+
+# --- Validation: python bolex_dng.py [samples_dir] [--raw12] ---
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+def _read_ifd(path: str) -> dict:
+    import struct
+    with open(path, "rb") as f: data = f.read()
+    off = struct.unpack_from("<I", data, 4)[0]; n = struct.unpack_from("<H", data, off)[0]
+    tags = {}
+    for i in range(n):
+        tag, typ, count, val = struct.unpack_from("<HHI4s", data, off + 2 + 12 * i); size = _TYPE_SIZES.get(typ, 1) * count
+        raw = val[:size] if size <= 4 else data[struct.unpack("<I", val)[0]:struct.unpack("<I", val)[0] + size]
+        tags.setdefault(tag, (typ, count, raw)) # First wins, like most readers (pidng writes some tags twice)
+    return tags
+
+def _raw_tag(tag_id: int, typ: int, count: int, raw: bytes) -> dngTag:
+    # dngTag carrying bytes exactly as read from a file (no re-encoding)
+    size = _TYPE_SIZES.get(typ, 1); t = dngTag.__new__(dngTag)
+    t.TagId = tag_id; t.DataType = (typ, size); t.Type = (tag_id, t.DataType); t.DataCount = count; t.subIFD = None
+    t.rawValue = list(np.frombuffer(raw, "<u2" if typ == 3 else "<u4")) if typ in (3, 4) else raw
+    t.Value = raw + b"\0" * (-len(raw) % 4); t.DataLength = len(t.Value); t.selfContained = t.DataLength <= 4
+    return t
+
+def validate(samples_dir: str, tile_size: int = DEFAULT_TILE, threads: int = 0, raw12: bool = False) -> bool:
+    """Decode each sample DNG (written by pidng), rewrite it with TiledDNGWriter (raw12: PackedDNGWriter from a 12-bit packed
+    frame), decode that, and require identical pixels and identical non-layout tags. Needs rawpy for decoding."""
+    import glob, tempfile, rawpy
+    from pidng.core import DNGTags
+    ok = True; tmp = tempfile.mkdtemp(prefix="bolex_dng_")
+    for src in sorted(glob.glob(os.path.join(samples_dir, "*.dng"))):
+        with rawpy.imread(src) as r: pixels = np.array(r.raw_image_visible, dtype=np.uint16, copy=True)
+        src_tags = _read_ifd(src); tags = DNGTags()
+        for tag_id, (typ, count, raw) in src_tags.items(): # Rebuild a DNGTags from the file, as the Recorder would have set it
+            if tag_id not in _LAYOUT_TAGS: t = _raw_tag(tag_id, typ, count, raw); tags.__tags__[t.Type] = t
+        if raw12: writer = PackedDNGWriter(tags, pixels.shape[1], pixels.shape[0]); frame = pack12(pixels)
+        else: writer = TiledDNGWriter(tags, pixels.shape[1], pixels.shape[0], tile_size, compress=True, threads=threads); frame = pixels
+        t0 = time.perf_counter(); out, nbytes = writer.write(frame, os.path.join(tmp, os.path.basename(src))); ms = (time.perf_counter() - t0) * 1000.0
+        with rawpy.imread(out) as r: decoded = np.array(r.raw_image_visible, copy=True)
+        out_tags = _read_ifd(out)
+        tag_diff = [t for t in src_tags if t not in _LAYOUT_TAGS and t != Tag.Software[0] and src_tags[t][2] != out_tags.get(t, (0, 0, None))[2]]
+        same = decoded.shape == pixels.shape and np.array_equal(decoded, pixels)
+        ok &= same and not tag_diff
+        how = "uncompressed 12-bit" if raw12 else f"{writer.tile_count} tiles, {'native' if writer._native else 'ljpegCompress'}"
+        print(f"{os.path.basename(src)}: {'OK ' if same else 'PIXEL MISMATCH'} {pixels.shape} {os.path.getsize(src)/1e6:.2f} MB -> {nbytes/1e6:.2f} MB ({how}, {ms:.0f} ms)"
+              f"{'  TAG DIFF: ' + str(tag_diff) if tag_diff else ''}")
+        writer.close()
+    return ok
+
+if __name__ == "__main__": # python bolex_dng.py [samples_dir] [--raw12]
+    args = [a for a in sys.argv[1:] if a != "--raw12"]
+    ok = validate(args[0] if args else os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples"), raw12="--raw12" in sys.argv)
+    exit(0 if ok else 1)
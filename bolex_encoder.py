@@ -0,0 +1,273 @@
+# bolex_encoder.py (Multi-process DNG encoder pool, shared memory frame hand-off, ordered frame naming)
+# Each worker is an encode stage feeding its own bolex_writer.WriteStage thread: a slot is free again once its frame is encoded,
+# and the parent hears separately when the frame is on disk, so encode and write throughput are measured apart.
+import os, time, queue, threading, traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from bolex_pack12 import packed_shape
+from bolex_writer import WriteStats
+
+# Workers are forked, not spawned: spawning (or forkserver) would re-run FauxBolex_Beta_0.93.py (camera init, UI) in every child.
+# So start() the pool while the caller is still single-threaded: before Pylon/capture/control threads and the GUI exist (a fork
+# inherits locks held by threads it doesn't copy), and before large buffers are allocated (children would keep their pages mapped).
+_MP_CONTEXT = "fork"
+_CMD_CONFIG = "config"; _CMD_ENCODE = "encode"; _CMD_TAGS = "tags"
+_RES_ENCODED = "encoded"; _RES_WRITTEN = "written"; _RES_BATCH = "batch"; _RES_READY = "ready"
+
+def default_workers() -> int: return max(1, (os.cpu_count() or 4) - 1) # All cores but one, which stays with grab/UI
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    # The parent owns (and unlinks) the block; children must not register it with the resource tracker.
+    try: return shared_memory.SharedMemory(name=name, track=False) # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        try: resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception: pass
+        return shm
+
+def _encoder_process(worker_id: int, task_q, result_q, parent_pid: int):
+    # Child side: attach to the segment's shared memory slots, encode the slot named by each task, hand the result to the write stage.
+    # Results: (_RES_ENCODED, wid, seq, slot to free or -1, encode s, stall s, err), (_RES_WRITTEN, wid, seq, slot or -1, nbytes, offset, err),
+    # (_RES_BATCH, wid, frames, nbytes, write s) per write call, and (_RES_READY, wid, native LJ92 tile encoder found) once at start.
+    from bolex_dng import make_dng_writer, native_tile_encoder
+    from bolex_take import TakeFileWriter
+    from bolex_writer import WriteStage
+    writer = None; shm = None; slots = None; layout = None; take = None; template_id = 0; stage = None
+    result_q.put((_RES_READY, worker_id, native_tile_encoder() is not None)) # core_module imported here, not inherited: the parent forks before loading it
+    def written(seq, slot):
+        return lambda nbytes, offset, err: result_q.put((_RES_WRITTEN, worker_id, seq, slot, nbytes, offset, err))
+    while True:
+        # daemon=True only reaps workers when the parent exits cleanly: a killed parent leaves them to init, so they watch for that themselves
+        try: task = task_q.get(timeout=1.0)
+        except queue.Empty:
+            if os.getppid() != parent_pid: print(f"[Encoder {worker_id}] Parent process gone, exiting."); break
+            continue
+        if task is None: break
+        cmd = task[0]
+        try:
+            if cmd == _CMD_CONFIG:
+                _, shm_name, slot_count, shape, packed, tags, compress, tile_size, tile_threads, take_path, template_id, write_opts = task
+                if stage is not None: stage.close() # Everything of the last segment on disk before its take file is let go
+                stage = WriteStage(**write_opts, on_batch=lambda f, n, t: result_q.put((_RES_BATCH, worker_id, f, n, t)), name=f"Writer-{worker_id}")
+                if shm is not None: shm.close()
+                shm = _attach_shm(shm_name)
+                slot_shape, dtype = (packed_shape(shape), np.uint8) if packed else (tuple(shape), np.uint16) # Writers take packed slots as is
+                slots = np.ndarray((slot_count,) + slot_shape, dtype=dtype, buffer=shm.buf)
+                if writer is not None: writer.close()
+                layout = (shape, compress, tile_size, tile_threads); writer = make_dng_writer(tags, shape[1], shape[0], compress, tile_size, tile_threads)
+                if take is not None: take.close()
+                take = TakeFileWriter.attach(take_path) if take_path else None; continue # Take file mode: append frame chunks instead of DNG files
+            if cmd == _CMD_TAGS:
+                _, tags, compress, template_id = task
+                if compress == layout[1]: writer.update_tags(tags) # Header template rebuilt once, not per frame
+                else: writer.close(); layout = (layout[0], compress) + layout[2:]; writer = make_dng_writer(tags, layout[0][1], layout[0][0], compress, layout[2], layout[3])
+                continue
+            _, seq, slot, filepath = task
+            t0 = time.monotonic()
+            try:
+                if not hasattr(writer, "encode"): # pidng fallback: encode and write are one call
+                    _, nbytes = writer.write(slots[slot], filepath)
+                    result_q.put((_RES_ENCODED, worker_id, seq, -1, time.monotonic() - t0, 0.0, None)); result_q.put((_RES_WRITTEN, worker_id, seq, slot, nbytes, 0, None)); continue
+                parts = writer.encode(slots[slot]); elapsed = time.monotonic() - t0
+                own = writer.compress # LJ92 tiles are new buffers: the slot is free now. Uncompressed parts are the slot itself: free once written.
+                stall0 = stage.stats.stall_s
+                if take is not None: stage.submit_chunk(take, seq, template_id, parts, done=written(seq, -1 if own else slot))
+                else: stage.submit_file(filepath if filepath.endswith(".dng") else filepath + ".dng", [writer.build_header(parts)] + parts, done=written(seq, -1 if own else slot))
+                result_q.put((_RES_ENCODED, worker_id, seq, slot if own else -1, elapsed, stage.stats.stall_s - stall0, None))
+            except Exception as e:
+                result_q.put((_RES_ENCODED, worker_id, seq, -1, time.monotonic() - t0, 0.0, f"{e}")); result_q.put((_RES_WRITTEN, worker_id, seq, slot, 0, 0, f"{e}"))
+        except Exception as e: print(f"[Encoder {worker_id}] ERROR handling '{cmd}': {e}\n{traceback.format_exc()}")
+    if stage is not None: stage.close()
+    if writer is not None: writer.close()
+    if take is not None: take.close()
+    if shm is not None: shm.close()
+
+
+class DNGEncoderPool:
+    """Spreads DNG encoding over N worker processes. Frames travel through shared memory slots, never pickled.
+
+    File names are assigned from a sequence counter at submit time, so `frame_%06d` stays strictly ordered
+    no matter which worker finishes first. `submit()` blocks while every slot is in flight (backpressure), and returns False
+    once a worker has died (`failed` says which): its in-flight frames are failed and the caller encodes the rest itself.
+    `get_stats()` is the encode stage, `get_write_stats()` the workers' write stages (latency percentiles, MB/s, runway)."""
+    def __init__(self, num_workers: int, slots_per_worker: int = 2, target_fps: float = 24.0, tile_threads: int = 1):
+        # tile_threads: threads per worker for per-tile LJ92 (the workers already run in parallel, so 1 by default)
+        self.num_workers = max(1, int(num_workers)); self.slot_count = self.num_workers * max(1, int(slots_per_worker)); self.target_fps = target_fps; self.tile_threads = tile_threads
+        self._ctx = mp.get_context(_MP_CONTEXT); self._procs = []; self._task_qs = []; self._result_q = None
+        self._shm = None; self._slots = None; self._shape = None; self._slot_shape = None; self._packed = False; self._free_slots = queue.Queue(); self._collector = None
+        self._lock = threading.Lock(); self._idle = threading.Condition(self._lock)
+        self._in_flight = {}; self._worker_load = [0] * self.num_workers; self._running = False; self._closing = False
+        self.failed = None # Set (reason) once a worker process has died; the pool takes no more frames
+        self.native_encoder = [None] * self.num_workers # Per worker, once it has started: core_module.encode_lj92_tiles importable (else pidng per tile)
+        self.write_stats = WriteStats(); self._write_opts = {}
+        self.on_done = None # Optional callback(seq, nbytes, offset) from the collector thread once a frame is on disk (e.g. take index)
+        self.reset_stats()
+
+    def start(self):
+        if self._running: return
+        if threading.active_count() > 1: print(f"Warn: Encoder pool forked from a process already running {threading.active_count() - 1} other thread(s); start it earlier.")
+        self._result_q = self._ctx.Queue()
+        for wid in range(self.num_workers):
+            tq = self._ctx.Queue(); p = self._ctx.Process(target=_encoder_process, args=(wid, tq, self._result_q, os.getpid()), name=f"DNGEncoder-{wid}", daemon=True)
+            p.start(); self._procs.append(p); self._task_qs.append(tq)
+        self._running = True
+        self._collector = threading.Thread(target=self._collect_results, name="EncoderCollector", daemon=True); self._collector.start()
+        print(f"Encoder pool started: {self.num_workers} worker processes, {self.slot_count} shared slots.")
+
+    def configure(self, shape: tuple, tags, compress: bool = True, tile_size: int = 256, packed: bool = False, take_path: str = None, template_id: int = 0, write_opts: dict = None):
+        # Called once per segment (first frame): (re)allocates the shared slots for this frame shape and pushes the DNG tags.
+        # Workers build their DNG header template from the tags here; tile_size=0 falls back to pidng single-strip files.
+        # packed=True: submit() takes 12-bit packed frames (RawFramePool(packed=True) slots) and the slots are 25% smaller.
+        # take_path: workers append frame chunks to this bolex_take file (header template `template_id`) instead of writing DNGs.
+        # write_opts: each worker's WriteStage arguments (hand-off size, coalescing, direct, fsync_frames, storage_path).
+        self.drain(); self._write_opts = dict(write_opts or {}); self.write_stats.storage_path = self._write_opts.get("storage_path")
+        if self._shm is None or tuple(shape) != self._shape or packed != self._packed:
+            self._release_shm()
+            slot_shape, dtype = (packed_shape(shape), np.uint8) if packed else (tuple(shape), np.uint16)
+            nbytes = int(np.prod(slot_shape)) * np.dtype(dtype).itemsize * self.slot_count
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes); self._shape = tuple(shape); self._slot_shape = slot_shape; self._packed = packed
+            self._slots = np.ndarray((self.slot_count,) + slot_shape, dtype=dtype, buffer=self._shm.buf)
+            self._free_slots = queue.Queue()
+            for s in range(self.slot_count): self._free_slots.put(s)
+        for tq in self._task_qs: tq.put((_CMD_CONFIG, self._shm.name, self.slot_count, self._shape, self._packed, tags, compress, tile_size, self.tile_threads, take_path, template_id, self._write_opts))
+
+    def update_tags(self, tags, compress: bool = True, template_id: int = 0):
+        for tq in self._task_qs: tq.put((_CMD_TAGS, tags, compress, template_id))
+
+    def submit(self, frame: np.ndarray, filepath_no_ext: str, seq: int, timeout: float = None) -> bool:
+        # False on timeout, or once a worker has died (a dead worker never hands its slots back: waiting on them would block forever)
+        if not self._running or self._slots is None: raise RuntimeError("Encoder pool not started/configured")
+        if frame.shape != self._slot_shape: raise ValueError("Frame shape mismatch!")
+        if frame.dtype != self._slots.dtype: raise ValueError(f"Frame dtype {frame.dtype} doesn't match the {self._slots.dtype} slots (packed={self._packed})")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.failed is not None or self._dead_worker() is not None: return False
+            wait = 0.25 if deadline is None else min(0.25, deadline - time.monotonic())
+            try: slot = self._free_slots.get(timeout=max(0.0, wait)); break
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline: return False
+        np.copyto(self._slots[slot], frame) # The only copy: queue buffer -> shared slot
+        with self._lock:
+            wid = min(range(self.num_workers), key=self._worker_load.__getitem__)
+            self._worker_load[wid] += 1; self._in_flight[seq] = wid
+            if self._first_submit_time is None: self._first_submit_time = time.monotonic()
+            self.frames_submitted += 1
+        self._task_qs[wid].put((_CMD_ENCODE, seq, slot, filepath_no_ext))
+        return True
+
+    def _collect_results(self):
+        while self._running:
+            try: item = self._result_q.get(timeout=0.2)
+            except queue.Empty: self._check_workers(); continue # Queue empty: every result a dead worker sent has been handled
+            except (EOFError, OSError): break
+            kind, wid = item[:2]
+            if kind == _RES_BATCH: self.write_stats.record(*item[2:]); continue
+            if kind == _RES_READY:
+                if not item[2] and not any(n is False for n in self.native_encoder):
+                    print(f"Warn: Encoder worker {wid} has no native LJ92 tile encoder (core_module not importable); LJ92 goes through pidng per tile, far slower.")
+                self.native_encoder[wid] = item[2]; continue
+            if kind == _RES_ENCODED:
+                _, _, seq, slot, elapsed, stall, err = item
+                if slot >= 0: self._free_slots.put(slot)
+                if stall: self.write_stats.stall(stall)
+                with self._lock:
+                    if seq not in self._in_flight: continue # Already failed with its dead worker
+                    self._encoded_seqs.add(seq)
+                    self._encode_time_total += elapsed; self._last_encoded_time = time.monotonic()
+                    self._awaiting_write += 1 # A failed encode still gets its _RES_WRITTEN (with the error)
+                    if err is None: self.frames_encoded += 1
+                continue
+            _, _, seq, slot, nbytes, offset, err = item
+            if slot >= 0: self._free_slots.put(slot)
+            with self._lock:
+                if not self._finish(seq, wid): continue
+                if err is None: self.frames_written += 1; self.bytes_written += nbytes
+                else: self.worker_errors[wid] += 1; print(f"ERROR encoding/writing frame {seq} (worker {wid}): {err}")
+            if err is None and self.on_done is not None:
+                try: self.on_done(seq, nbytes, offset)
+                except Exception as e: print(f"Warn: encoder on_done callback failed for frame {seq}: {e}")
+
+    def _finish(self, seq: int, wid: int) -> bool:
+        # Under _lock: frame `seq` leaves the pool (written, or failed), in-order commit count advances. False if it already had.
+        if self._in_flight.pop(seq, None) is None: return False
+        self._worker_load[wid] -= 1
+        if seq in self._encoded_seqs: self._encoded_seqs.discard(seq); self._awaiting_write -= 1
+        self._done_seqs.add(seq)
+        while self.frames_committed in self._done_seqs: self._done_seqs.discard(self.frames_committed); self.frames_committed += 1
+        self._last_done_time = time.monotonic()
+        if not self._in_flight: self._idle.notify_all()
+        return True
+
+    def _dead_worker(self):
+        # wid of the first worker process that has exited outside shutdown() (OOM kill, crash in the native encoder), else None.
+        # Sets `failed`: a dead worker never hands its slots back, so the pool takes no more frames.
+        if self._closing: return None
+        for wid, p in enumerate(self._procs):
+            if p.is_alive(): continue
+            if self.failed is None: self.failed = f"encoder worker {wid} died (exit code {p.exitcode})"
+            return wid
+        return None
+
+    def _check_workers(self):
+        # Collector thread, result queue empty (so every result a dead worker sent is in): its in-flight frames are failed
+        if self._dead_worker() is None: return
+        for wid, p in enumerate(self._procs):
+            if p.is_alive(): continue
+            with self._lock:
+                lost = sorted(seq for seq, w in self._in_flight.items() if w == wid)
+                for seq in lost: self._finish(seq, wid); self.worker_errors[wid] += 1
+            if lost: print(f"ERROR: {self.failed}; frames {lost[0]}..{lost[-1]} ({len(lost)}) lost.")
+
+    def drain(self, timeout: float = 60.0) -> bool:
+        with self._lock:
+            ok = self._idle.wait_for(lambda: not self._in_flight, timeout=timeout)
+        if not ok: print(f"Warn: Encoder drain timeout, {len(self._in_flight)} frames still in flight.")
+        return ok
+
+    def in_flight(self) -> int:
+        with self._lock: return len(self._in_flight)
+
+    def reset_stats(self):
+        with self._lock:
+            self.frames_submitted = 0; self.frames_encoded = 0; self.frames_written = 0; self.frames_committed = 0; self.bytes_written = 0; self._awaiting_write = 0
+            self.worker_errors = [0] * self.num_workers; self._done_seqs = set(); self._encoded_seqs = set(); self._encode_time_total = 0.0
+            self._first_submit_time = None; self._last_done_time = None; self._last_encoded_time = None
+        self.write_stats.reset()
+
+    def get_stats(self) -> dict:
+        # Encode stage: fps is frames encoded over the time since the first submit, whether or not the disk has caught up
+        with self._lock:
+            span = (self._last_encoded_time - self._first_submit_time) if (self._first_submit_time and self._last_encoded_time) else 0.0
+            done = self.frames_encoded + sum(self.worker_errors)
+            fps = self.frames_encoded / span if span > 0 else 0.0
+            return {"workers": self.num_workers, "submitted": self.frames_submitted, "encoded": self.frames_encoded, "written": self.frames_written, "committed": self.frames_committed,
+                    "in_flight": len(self._in_flight), "awaiting_write": self._awaiting_write, "worker_errors": list(self.worker_errors), "bytes_written": self.bytes_written,
+                    "fps": fps, "mb_per_s": (self.bytes_written / span / 1e6) if span > 0 else 0.0,
+                    "avg_encode_ms": (self._encode_time_total / done * 1000.0) if done else 0.0,
+                    "target_fps": self.target_fps, "keeping_up": fps >= self.target_fps if self.frames_encoded else None}
+
+    def get_write_stats(self) -> dict:
+        st = self.write_stats.get()
+        with self._lock: st["awaiting_write"] = self._awaiting_write # Encoded, still in the workers' write stages
+        return st
+
+    def _release_shm(self):
+        self._slots = None
+        if self._shm is not None:
+            try: self._shm.close(); self._shm.unlink()
+            except FileNotFoundError: pass
+            self._shm = None; self._shape = None; self._slot_shape = None
+
+    def shutdown(self, timeout: float = 10.0):
+        if not self._running: return
+        self.drain(timeout=timeout); self._closing = True
+        for tq in self._task_qs: tq.put(None)
+        for p in self._procs:
+            p.join(timeout=timeout)
+            if p.is_alive(): print(f"Warn: {p.name} did not exit, terminating."); p.terminate()
+        self._running = False
+        if self._collector is not None: self._collector.join(timeout=1.0)
+        self._procs = []; self._task_qs = []; self._release_shm()
+        print("Encoder pool shut down.")
@@ -0,0 +1,101 @@
+# bolex_framepool.py (Bounded, preallocated raw frame pool with spill-to-disk backpressure)
+import os, threading, collections
+import numpy as np
+from bolex_pack12 import pack12, packed_shape
+
+POOL_MEM = 0; POOL_SPILL = 1
+
+class RawFramePool:
+    """Fixed budget of preallocated uint16 frame slots, sized in MB rather than frames.
+
+    `store()` copies a grabbed frame into a free slot and returns a small ref that goes through the Recorder queue.
+    Once occupancy reaches `spill_watermark`, frames go to a raw scratch file on the SSD instead. The last slots
+    are kept as a reserve for when the spill file is also full. `store()` only returns None (frame dropped) when
+    both the slots and the spill file are exhausted. The consumer calls `load(ref)` and then `release(ref)`.
+    packed=True keeps 12-bit frames packed (uint8, width * 3 / 2 per row): 25% more frames per MB, and `load()` returns
+    the packed slot, which bolex_dng writers take as is."""
+    def __init__(self, budget_mb: int, frame_shape: tuple, spill_dir: str = None, spill_budget_mb: int = 0, spill_watermark: float = 0.9, packed: bool = False):
+        self.budget_mb = budget_mb; self.spill_dir = spill_dir; self.spill_budget_mb = spill_budget_mb; self.spill_watermark = spill_watermark; self.packed = packed
+        self._lock = threading.Lock(); self._buf = None; self._shape = None; self._spill_fd = None; self._spill_path = None
+        self._spill_scratch = None; self._pack_scratch = None; self._free = collections.deque(); self._spill_free = collections.deque()
+        self.slot_count = 0; self.spill_capacity = 0
+        self._allocate(frame_shape)
+        self.reset_stats()
+
+    def _allocate(self, frame_shape: tuple):
+        self._buf = None # Let the old block go before grabbing a new one
+        slot_shape, dtype = (packed_shape(frame_shape), np.uint8) if self.packed else (tuple(frame_shape), np.uint16)
+        frame_bytes = int(np.prod(slot_shape)) * np.dtype(dtype).itemsize
+        self.slot_count = max(2, int(self.budget_mb * 1024 * 1024 // frame_bytes))
+        self._buf = np.empty((self.slot_count,) + slot_shape, dtype=dtype)
+        self._buf.fill(0) # Touch every page now so the kernel commits the memory before the take, not during it
+        self._shape = self.frame_shape = tuple(frame_shape); self.slot_shape = slot_shape; self._free = collections.deque(range(self.slot_count))
+        self._spill_scratch = np.empty(slot_shape, dtype=dtype); self._pack_scratch = np.empty(slot_shape, dtype=dtype) if self.packed else None
+        self.spill_capacity = int(self.spill_budget_mb * 1024 * 1024 // frame_bytes) if self.spill_dir else 0
+        self._spill_free = collections.deque(range(self.spill_capacity))
+        if self._spill_fd is not None: os.ftruncate(self._spill_fd, self.spill_capacity * frame_bytes)
+        print(f"Frame pool: {self.slot_count} slots of {self._shape}{' 12-bit packed' if self.packed else ''} ({self.slot_count * frame_bytes / 1e6:.0f} MB), spill capacity {self.spill_capacity} frames.")
+
+    def _open_spill(self) -> bool:
+        if self._spill_fd is not None: return True
+        if not self.spill_capacity: return False
+        try:
+            self._spill_path = os.path.join(self.spill_dir, f".bolex_spill_{os.getpid()}.raw")
+            self._spill_fd = os.open(self._spill_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.ftruncate(self._spill_fd, self.spill_capacity * self._buf[0].nbytes)
+            print(f"Frame pool spilling to: {self._spill_path}"); return True
+        except OSError as e: print(f"Error opening spill file: {e}"); self._spill_fd = None; self.spill_capacity = 0; self._spill_free.clear(); return False
+
+    def reset_stats(self):
+        with self._lock: self.high_water = 0; self.spilled = 0; self.dropped = 0
+
+    def store(self, frame: np.ndarray):
+        with self._lock:
+            if frame.shape != self._shape:
+                if len(self._free) != self.slot_count or len(self._spill_free) != self.spill_capacity: self.dropped += 1; return None
+                print(f"Frame pool: frame shape changed to {frame.shape}, reallocating."); self._allocate(frame.shape)
+            used = self.slot_count - len(self._free)
+            spill = used >= self.slot_count * self.spill_watermark and self._spill_free and self._open_spill()
+            if spill: kind, idx = POOL_SPILL, self._spill_free.popleft()
+            elif self._free: kind, idx = POOL_MEM, self._free.popleft(); self.high_water = max(self.high_water, used + 1)
+            else: self.dropped += 1; return None
+        if kind == POOL_MEM:
+            if self.packed: pack12(frame, out=self._buf[idx]) # Packed straight into the slot, no uint16 copy
+            else: np.copyto(self._buf[idx], frame, casting="unsafe")
+            return (kind, idx)
+        try:
+            if self.packed: data = pack12(frame, out=self._pack_scratch) # store() has a single caller (the grab loop)
+            else: data = frame if frame.dtype == np.uint16 and frame.flags.c_contiguous else np.ascontiguousarray(frame, dtype=np.uint16)
+            os.pwrite(self._spill_fd, memoryview(data).cast("B"), idx * data.nbytes)
+            with self._lock: self.spilled += 1
+            return (kind, idx)
+        except OSError as e:
+            print(f"Error writing spill frame: {e}")
+            with self._lock: self._spill_free.appendleft(idx); self.dropped += 1
+            return None
+
+    def load(self, ref) -> np.ndarray:
+        # Memory refs return a view of the slot. Spill refs are read into one scratch buffer, so only one consumer thread may call this.
+        kind, idx = ref
+        if kind == POOL_MEM: return self._buf[idx]
+        nbytes = self._spill_scratch.nbytes
+        got = os.preadv(self._spill_fd, [memoryview(self._spill_scratch).cast("B")], idx * nbytes)
+        if got != nbytes: raise IOError(f"Short read from spill file ({got}/{nbytes} bytes)")
+        return self._spill_scratch
+
+    def release(self, ref):
+        kind, idx = ref
+        with self._lock: (self._free if kind == POOL_MEM else self._spill_free).append(idx)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            used = self.slot_count - len(self._free)
+            return {"used": used, "capacity": self.slot_count, "occupancy": used / self.slot_count if self.slot_count else 0.0, "high_water": self.high_water,
+                    "spill_used": self.spill_capacity - len(self._spill_free), "spill_capacity": self.spill_capacity, "spilled": self.spilled, "dropped": self.dropped}
+
+    def close(self):
+        if self._spill_fd is not None:
+            try: os.close(self._spill_fd); os.remove(self._spill_path)
+            except OSError: pass
+            self._spill_fd = None
+        self._buf = None
@@ -0,0 +1,89 @@
+# bolex_index.py (Per-take binary sidecar index: frame number, camera/host timestamps, gain, exposure, file offset/size)
+import os, struct, threading
+
+INDEX_FILENAME = "index.fbi"
+INDEX_MAGIC = b"FBIX"; INDEX_VERSION = 1
+# magic, version, record size, width, height, target fps, header size
+INDEX_HEADER = struct.Struct("<4sHHIIfI")
+# frame_number, dropped_before, block_id, camera_timestamp, host_time_s, gain, exposure_us, file_offset, file_size, flags
+INDEX_RECORD = struct.Struct("<IIQQdiiQII")
+INDEX_HEADER_SIZE = 64 # Header padded so records start at a fixed offset
+FLAG_WRITTEN = 1 # Record was patched with the final file size (frame is on disk)
+BLOCK_ID_WRAP = 65535 # GigE block IDs are 16-bit and skip 0
+
+def block_id_gap(prev: int, cur: int) -> int:
+    # Frames missing between two consecutive block IDs (0 = contiguous)
+    if prev <= 0 or cur <= 0: return 0
+    if cur > prev: return cur - prev - 1
+    if prev > BLOCK_ID_WRAP // 2 and cur < BLOCK_ID_WRAP // 2: return (BLOCK_ID_WRAP - prev) + (cur - 1) # Wrapped
+    return 0 # Went backwards without wrapping (camera restart): not a drop
+
+
+class TakeIndexWriter:
+    """Fixed-size records at `header + n * record_size`, so frame n is found in O(1) and records can be written
+    out of order (encoder workers finish out of order). Thread safe; one file per take folder."""
+    def __init__(self, take_dir: str, width: int = 0, height: int = 0, target_fps: float = 24.0):
+        self.path = os.path.join(take_dir, INDEX_FILENAME); self._lock = threading.Lock(); self._pending = {}
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.set_geometry(width, height, target_fps)
+
+    def set_geometry(self, width: int, height: int, target_fps: float = 24.0):
+        header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, INDEX_RECORD.size, width, height, target_fps, INDEX_HEADER_SIZE)
+        os.pwrite(self._fd, header.ljust(INDEX_HEADER_SIZE, b"\0"), 0)
+
+    def add(self, frame_number: int, meta: tuple):
+        # meta: (dropped_before, block_id, camera_timestamp, host_time_s, gain, exposure_us); size/offset come with mark_written()
+        with self._lock: self._pending[frame_number] = meta
+        self._write(frame_number, meta, 0, 0, 0)
+
+    def mark_written(self, frame_number: int, file_size: int, file_offset: int = 0):
+        with self._lock: meta = self._pending.pop(frame_number, None)
+        if meta is not None: self._write(frame_number, meta, file_offset, file_size, FLAG_WRITTEN)
+
+    def _write(self, n, meta, offset, size, flags):
+        dropped, block_id, cam_ts, host_t, gain, exposure = meta
+        os.pwrite(self._fd, INDEX_RECORD.pack(n, dropped, block_id, cam_ts, host_t, gain, exposure, offset, size, flags), INDEX_HEADER_SIZE + n * INDEX_RECORD.size)
+
+    def close(self):
+        if self._fd is not None: os.close(self._fd); self._fd = None
+
+
+class TakeIndex:
+    """Reader for post tools: `len(idx)`, `idx[n]` -> dict (O(1), memory-mapped), `idx.cadence()` -> summary."""
+    FIELDS = ("frame_number", "dropped_before", "block_id", "camera_timestamp", "host_time_s", "gain", "exposure_us", "file_offset", "file_size", "flags")
+
+    def __init__(self, path: str):
+        import mmap
+        if os.path.isdir(path): path = os.path.join(path, INDEX_FILENAME)
+        with open(path, "rb") as f: self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.record_size, self.width, self.height, self.target_fps, self.header_size = INDEX_HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC: raise ValueError(f"Not a Faux Bolex take index: {path}")
+        self._count = (len(self._mm) - self.header_size) // self.record_size
+
+    def __len__(self): return self._count
+
+    def __getitem__(self, n: int) -> dict:
+        if not 0 <= n < self._count: raise IndexError(n)
+        return dict(zip(self.FIELDS, INDEX_RECORD.unpack_from(self._mm, self.header_size + n * self.record_size)))
+
+    def cadence(self, camera_tick_hz: float = 125_000_000.0) -> dict:
+        # camera_tick_hz: GigE timestamp clock (125 MHz on Basler ace/aviator GigE models)
+        import numpy as np
+        dt = np.dtype([("frame_number", "<u4"), ("dropped_before", "<u4"), ("block_id", "<u8"), ("camera_timestamp", "<u8"), ("host_time_s", "<f8"),
+                       ("gain", "<i4"), ("exposure_us", "<i4"), ("file_offset", "<u8"), ("file_size", "<u4"), ("flags", "<u4")])
+        rec = np.frombuffer(self._mm, dtype=dt, count=self._count, offset=self.header_size)
+        summary = {"frames": int(self._count), "written": int(np.count_nonzero(rec["flags"] & FLAG_WRITTEN)), "dropped": int(rec["dropped_before"].sum()), "target_fps": float(self.target_fps)}
+        if self._count > 1:
+            cam_dt = np.diff(rec["camera_timestamp"].astype(np.float64)) / camera_tick_hz; host_dt = np.diff(rec["host_time_s"])
+            summary.update({"camera_fps": float(1.0 / np.median(cam_dt)) if np.median(cam_dt) > 0 else 0.0, "host_fps": float(1.0 / np.median(host_dt)) if np.median(host_dt) > 0 else 0.0,
+                            "host_interval_ms_max": float(host_dt.max() * 1000.0), "gaps_at": [int(i) for i in np.nonzero(rec["dropped_before"])[0][:50]]})
+        return summary
+
+    def close(self): self._mm.close()
+
+
+if __name__ == "__main__":
+    import sys, json
+    if len(sys.argv) < 2: exit("Usage: python bolex_index.py <take_folder_or_index.fbi> [frame_number]")
+    idx = TakeIndex(sys.argv[1])
+    print(json.dumps(idx[int(sys.argv[2])] if len(sys.argv) > 2 else idx.cadence(), indent=2))
@@ -0,0 +1,133 @@
+# bolex_overlay.py (Cached overlay compositor for the preview UI: frame guide, letterbox, pre-rasterised text sprites)
+import time, collections
+import numpy as np
+import cv2
+
+class TextSprite:
+    # Pre-rasterised text: alpha scaled to 0..256 so blending is (roi * inv + premul) >> 8, exact at 0 and 256
+    __slots__ = ("inv", "premul", "width", "height", "dx", "dy", "text_width")
+    def __init__(self, alpha: np.ndarray, color: tuple, dx: int = 0, dy: int = 0, text_width: int = None):
+        a = (alpha.astype(np.uint16) * 256 + 127) // 255
+        self.inv = (256 - a)[:, :, None]; self.premul = a[:, :, None] * np.array(color, dtype=np.uint16)
+        self.height, self.width = alpha.shape; self.dx = dx; self.dy = dy # dx/dy: sprite top-left relative to the draw origin
+        self.text_width = self.width if text_width is None else text_width # Width used for right alignment, as measured by the font
+
+def rasterise_pil(text: str, font, color: tuple) -> TextSprite:
+    from PIL import Image, ImageDraw
+    l, t, r, b = font.getbbox(text)
+    mask = Image.new("L", (max(1, r), max(1, b)), 0); ImageDraw.Draw(mask).text((0, 0), text, font=font, fill=255)
+    return TextSprite(np.asarray(mask), color, text_width=r - l)
+
+def rasterise_hershey(text: str, font_face: int, scale: float, thickness: int, color: tuple) -> TextSprite:
+    (w, h), baseline = cv2.getTextSize(text, font_face, scale, thickness); pad = thickness + 1
+    mask = np.zeros((h + baseline + 2 * pad, w + 2 * pad), dtype=np.uint8)
+    cv2.putText(mask, text, (pad, h + pad), font_face, scale, 255, thickness, cv2.LINE_AA)
+    return TextSprite(mask, color, dx=-pad, dy=-(h + pad), text_width=w) # putText origin is the baseline, sprite origin is its top-left
+
+
+class OverlayCompositor:
+    """Draws the preview UI onto a frame without any per-frame Pillow work.
+
+    The frame guide strips and the letterbox LUT are computed once. Text elements (FPS, GAIN, ANGLE, CLIP, Q, storage)
+    are rasterised into sprites cached by (string, font, colour); an element is only re-rasterised when its
+    value changes. `compose()` is then slice assignments for the guide, an in-place LUT for the letterbox
+    and one vectorised alpha blend per text element. Pass PIL fonts for Roboto, or None for the Hershey fallback."""
+    SPRITE_CACHE_SIZE = 256
+
+    def __init__(self, width: int, height: int, guide_top: int, guide_bottom: int, guide_thickness: int, darken_factor: float,
+                 font_main=None, font_status=None, font_size_main: int = 22, font_size_status: int = 18, text_margin: int = 15):
+        self.width = width; self.height = height; self.guide_top = guide_top; self.guide_bottom = guide_bottom; self.margin = text_margin
+        self.font_main = font_main; self.font_status = font_status; self.use_pil = font_main is not None and font_status is not None
+        self._sprites = collections.OrderedDict(); self.sprite_hits = 0; self.sprite_misses = 0
+        t = guide_thickness # Same border Pillow's rectangle(width=t) draws inside (0, top, W-1, bottom-1)
+        self._guide_strips = [(slice(guide_top, guide_top + t), slice(0, width)), (slice(guide_bottom - t, guide_bottom), slice(0, width)),
+                              (slice(guide_top, guide_bottom), slice(0, t)), (slice(guide_top, guide_bottom), slice(width - t, width))]
+        self._letterbox = [] if darken_factor >= 1.0 else [s for s in (slice(0, guide_top), slice(guide_bottom, height)) if s.stop > s.start]
+        self._darken_lut = (np.arange(256) * darken_factor).astype(np.uint8)
+        if self.use_pil: # Layout metrics measured once, not per frame
+            tb = font_main.getbbox("Tg"); self.line_height = tb[3] - tb[1] + 8
+            sb = font_status.getbbox("Q"); self.status_y = height - (sb[3] - sb[1]) - 10
+        else:
+            self.cv_font = cv2.FONT_HERSHEY_SIMPLEX; self.cv_scale = 0.8; self.cv_thickness = 2
+            self.cv_line_h = cv2.getTextSize("GAIN(CV2): 0", self.cv_font, self.cv_scale, self.cv_thickness)[0][1]
+        self.no_signal_frame = self._render_no_signal()
+
+    def _sprite(self, text: str, font_key: str, color: tuple) -> TextSprite:
+        key = (text, font_key, color); sprite = self._sprites.get(key)
+        if sprite is not None: self._sprites.move_to_end(key); self.sprite_hits += 1; return sprite
+        self.sprite_misses += 1
+        if self.use_pil: sprite = rasterise_pil(text, self.font_main if font_key == "main" else self.font_status, color)
+        else: sprite = rasterise_hershey(text, self.cv_font, self.cv_scale * (0.9 if font_key == "status" else 1.0), self.cv_thickness, color)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.SPRITE_CACHE_SIZE: self._sprites.popitem(last=False)
+        return sprite
+
+    def _blend(self, frame: np.ndarray, sprite: TextSprite, x: int, y: int):
+        x += sprite.dx; y += sprite.dy
+        x0, y0 = max(x, 0), max(y, 0); x1, y1 = min(x + sprite.width, self.width), min(y + sprite.height, self.height)
+        if x1 <= x0 or y1 <= y0: return
+        sy, sx = slice(y0 - y, y1 - y), slice(x0 - x, x1 - x); roi = frame[y0:y1, x0:x1]
+        roi[:] = (roi * sprite.inv[sy, sx] + sprite.premul[sy, sx]) >> 8
+
+    def _text(self, frame, text, font_key, color, x, y, align_right=False):
+        sprite = self._sprite(text, font_key, color)
+        if align_right: x = self.width - sprite.text_width - x
+        self._blend(frame, sprite, x, y)
+
+    def compose(self, frame: np.ndarray, guide_color: tuple, fps_text: str, gain_text: str, angle_text: str, clip_text: str,
+                queue_text: str = None, text_color: tuple = (200, 200, 200), status_color: tuple = (200, 200, 200), queue_color: tuple = None,
+                record_dot_color: tuple = None, storage_text: str = None):
+        # In place on `frame` (RGB uint8, width x height). queue_text/record_dot_color only while recording; storage_text under FPS.
+        for rows in self._letterbox: cv2.LUT(frame[rows], self._darken_lut, dst=frame[rows])
+        for rows, cols in self._guide_strips: frame[rows, cols] = guide_color
+        queue_color = queue_color or status_color; m = self.margin
+        if self.use_pil:
+            self._text(frame, fps_text, "main", text_color, m, m)
+            if storage_text: self._text(frame, storage_text, "status", status_color, m, m + self.line_height)
+            self._text(frame, gain_text, "main", text_color, m, m, align_right=True)
+            self._text(frame, angle_text, "main", text_color, m, m + self.line_height, align_right=True)
+            self._text(frame, clip_text, "status", status_color, m, self.status_y, align_right=True)
+            if queue_text: self._text(frame, queue_text, "status", queue_color, m, self.status_y)
+        else:
+            self._text(frame, fps_text, "main", text_color, m, 30)
+            if storage_text: self._text(frame, storage_text, "status", status_color, m, 30 + self.cv_line_h + 15)
+            self._text(frame, gain_text, "main", text_color, m, 30, align_right=True)
+            self._text(frame, angle_text, "main", text_color, m, 30 + self.cv_line_h + 15, align_right=True)
+            clip_y = self.height - 20
+            if queue_text:
+                if record_dot_color: cv2.circle(frame, (self.width - 12 - 15, self.height - 12 - 15), 12, record_dot_color, -1)
+                self._text(frame, queue_text, "status", queue_color, m, self.height - 20); clip_y -= 25
+            self._text(frame, clip_text, "status", status_color, m, clip_y)
+        return frame
+
+    def _render_no_signal(self) -> np.ndarray:
+        frame = np.zeros((self.height, self.width, 3), dtype=np.uint8); text = "NO SIGNAL"
+        if self.use_pil:
+            sprite = rasterise_pil(text, self.font_main, (255, 0, 0)); l, t, r, b = self.font_main.getbbox(text)
+            self._blend(frame, sprite, (self.width - (r - l)) // 2, (self.height - (b - t)) // 2)
+        else: cv2.putText(frame, text, (self.width // 2 - 100, self.height // 2), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 0, 0), 2, cv2.LINE_AA)
+        return frame
+
+
+def bench(frames: int = 600, width: int = 1024, height: int = 600):
+    # Per-frame overlay cost for both text paths, with values changing the way they do live (FPS every frame, Q often)
+    import os
+    from PIL import ImageFont
+    font_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "RobotoCondensed-Regular.ttf")
+    fonts = (ImageFont.truetype(font_path, 22), ImageFont.truetype(font_path, 18)) if os.path.exists(font_path) else None
+    fg_height = int(round(width / 2.39)); fg_height -= fg_height % 2; top = (height - fg_height) // 2
+    rng = np.random.default_rng(0); source = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    for name, fnt in (("pillow", fonts), ("hershey", None)):
+        if name == "pillow" and fnt is None: print("pillow: font file not found, skipped"); continue
+        comp = OverlayCompositor(width, height, top, top + fg_height, 8, 0.5, *(fnt or (None, None)))
+        times = []
+        for i in range(frames):
+            frame = source.copy(); t0 = time.perf_counter()
+            comp.compose(frame, (0, 0, 200), f"FPS: {23.5 + (i % 10) / 10:.1f}", "GAIN: 300", "ANGLE: 180", "CLIP: OFF", queue_text=f"Q: {i % 7}", record_dot_color=(0, 0, 200))
+            times.append(time.perf_counter() - t0)
+        t = np.array(times[10:]) * 1000.0
+        print(f"{name:8s} mean {t.mean():.3f} ms  p95 {np.percentile(t, 95):.3f} ms  max {t.max():.3f} ms  (sprite hits {comp.sprite_hits}, misses {comp.sprite_misses})")
+
+if __name__ == "__main__":
+    import sys
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
@@ -0,0 +1,48 @@
+# bolex_pack12.py (12-bit packed raw frames: 2 pixels -> 3 bytes, the bit order DNG/TIFF use for BitsPerSample=12)
+# Byte 0 = p0[11:4], byte 1 = p0[3:0] << 4 | p1[11:8], byte 2 = p1[7:0] (same as pidng.packing.pack12), so a packed frame
+# is already an uncompressed 12-bit DNG strip. core_module.pack_raw12/unpack_raw12 (C++, GIL released) when available, else NumPy.
+import sys
+import numpy as np
+
+_native = {}
+
+def _native_fn(name: str):
+    # Looked up once per process: a failing `import core_module` per frame would cost more than the packing
+    if name not in _native:
+        mod = sys.modules.get("core_module")
+        if mod is None:
+            try: import core_module as mod
+            except ImportError: mod = None
+        _native[name] = getattr(mod, name, None)
+    return _native[name]
+
+def packed_shape(shape: tuple) -> tuple:
+    h, w = shape
+    if w % 2: raise ValueError(f"12-bit packing needs an even width, got {w}")
+    return (h, w * 3 // 2)
+
+def unpacked_shape(shape: tuple) -> tuple: h, pw = shape; return (h, pw * 2 // 3)
+
+def pack12(frame: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    # uint16 (H, W), values 0..4095 -> uint8 (H, W * 3 / 2); `out` (contiguous) lets the caller pack straight into a pool slot
+    if out is None: out = np.empty(packed_shape(frame.shape), dtype=np.uint8)
+    native = _native_fn("pack_raw12")
+    if native is not None: native(frame, out); return out
+    h, w = frame.shape; a = frame[:, 0::2]; b = frame[:, 1::2]; o = out.reshape(h, w // 2, 3)
+    np.right_shift(a, 4, out=o[..., 0], casting="unsafe")
+    np.bitwise_or(np.left_shift(a & 0xF, 4), np.right_shift(b, 8), out=o[..., 1], casting="unsafe")
+    np.bitwise_and(b, 0xFF, out=o[..., 2], casting="unsafe")
+    return out
+
+def unpack12(packed: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    if out is None: out = np.empty(unpacked_shape(packed.shape), dtype=np.uint16)
+    native = _native_fn("unpack_raw12")
+    if native is not None: native(packed, out); return out
+    h, w = out.shape; p = packed.reshape(h, w // 2, 3); b1 = p[..., 1].astype(np.uint16)
+    np.bitwise_or(np.left_shift(p[..., 0], 4, dtype=np.uint16), np.right_shift(b1, 4), out=out[:, 0::2])
+    np.bitwise_or(np.left_shift(b1 & 0xF, 8), p[..., 2], out=out[:, 1::2])
+    return out
+
+def frame_bytes(shape: tuple, packed: bool) -> int:
+    # Bytes per frame of pixel data in RAM (and in an uncompressed 12-bit DNG)
+    return int(np.prod(packed_shape(shape))) if packed else int(np.prod(shape)) * 2
@@ -0,0 +1,58 @@
+# bolex_preview.py (Preview look: display LUTs for core_module.set_preview_options, and the NumPy reference of its binned debayer)
+# The capture thread turns each 2x2 Bayer cell into one RGB pixel (R, mean of the two greens, B), with the preview white balance and
+# the display LUT folded into one 4096-entry table per channel, and picks cells nearest-neighbour straight into the 1024x600 preview.
+# bin_preview() below gives the same bytes (bolex_replay uses it; check against the C++ with `python bolex_preview.py`).
+import time
+import numpy as np
+
+PREVIEW_SIZE = (1024, 600) # (w, h), PREVIEW_WIDTH/PREVIEW_HEIGHT in core_module.cpp
+LUT_SIZE = 4096 # One entry per 12-bit raw code
+LUT_KINDS = ("linear", "gamma", "log")
+LOG_STOPS = 10.0 # "log": this many stops below raw clip span black..white of the display
+
+def display_lut(kind: str = "linear", black_level: int = 0, white_level: int = LUT_SIZE - 1):
+    """4096 display bytes per (white-balanced) raw code, or None for "linear" (code >> 4, the plain 8-bit look).
+    gamma: Rec. 709 transfer curve on the black-subtracted signal. log: log2 exposure over LOG_STOPS, flat and easy to judge clipping on."""
+    if kind == "linear": return None
+    x = np.clip((np.arange(LUT_SIZE, dtype=np.float64) - black_level) / max(1, white_level - black_level), 0.0, 1.0)
+    if kind == "gamma": y = np.where(x < 0.018, 4.5 * x, 1.099 * np.power(x, 0.45) - 0.099)
+    elif kind == "log": y = np.clip((np.log2(np.maximum(x, 2.0 ** -LOG_STOPS)) + LOG_STOPS) / LOG_STOPS, 0.0, 1.0)
+    else: raise ValueError(f"unknown preview LUT '{kind}' (expected one of {', '.join(LUT_KINDS)})")
+    return np.round(y * 255.0).astype(np.uint8)
+
+def build_tables(lut=None, gains=(1.0, 1.0, 1.0), black_level: int = 0) -> np.ndarray:
+    # (3, 4096) uint8: raw code -> display byte per channel, gain applied around black (preview::build_tables)
+    v = np.arange(LUT_SIZE, dtype=np.float64); tables = np.empty((3, LUT_SIZE), np.uint8)
+    for c in range(3):
+        scaled = (v - black_level) * gains[c]; scaled = np.sign(scaled) * np.floor(np.abs(scaled) + 0.5) # lround: halves away from zero
+        balanced = np.clip(scaled.astype(np.int64) + black_level, 0, LUT_SIZE - 1)
+        tables[c] = lut[balanced] if lut is not None else (balanced >> 4).astype(np.uint8)
+    return tables
+
+def bin_preview(raw: np.ndarray, cfa: tuple = (1, 2, 0, 1), decimation: int = 1, tables: np.ndarray = None, size: tuple = PREVIEW_SIZE, out: np.ndarray = None) -> np.ndarray:
+    """Raw mosaic -> (h, w, 3) uint8 RGB preview, byte-identical to preview::bin_to_rgb. cfa: colour (0=R, 1=G, 2=B) at [0,0], [0,1], [1,0], [1,1]."""
+    tables = build_tables() if tables is None else tables; step = max(1, int(decimation)); w, h = size
+    cells_w = raw.shape[1] // 2 // step; cells_h = raw.shape[0] // 2 // step
+    out = np.empty((h, w, 3), np.uint8) if out is None else out
+    if cells_w <= 0 or cells_h <= 0: return out
+    # Table lookups on the (cells_h, cells_w) CFA planes (strided views, take clamps codes to the table), then nearest cell rows/columns
+    cell_cols = np.arange(w, dtype=np.intp) * cells_w // w; cell_rows = np.arange(h, dtype=np.intp) * cells_h // h
+    greens = [p for p in range(4) if cfa[p] == 1][:2]; s2 = 2 * step
+    def plane(pos): return raw[pos >> 1:cells_h * s2:s2, pos & 1:cells_w * s2:s2]
+    green = (np.minimum(plane(greens[0]), LUT_SIZE - 1).astype(np.uint32) + np.minimum(plane(greens[1]), LUT_SIZE - 1)) >> 1
+    for c, codes in ((0, plane(cfa.index(0))), (1, green), (2, plane(cfa.index(2)))):
+        img = np.take(np.take(tables[c], codes, mode="clip"), cell_rows, axis=0)
+        out[..., c] = img if cells_w == w else np.take(img, cell_cols, axis=1)
+    return out
+
+
+if __name__ == "__main__": # Bench the C++ path against this reference (needs the built core_module)
+    import core_module
+    rng = np.random.default_rng(0); raw = rng.integers(0, LUT_SIZE, (1108, 2048), dtype=np.uint16); gains = (1.9, 1.0, 1.6)
+    for kind in LUT_KINDS:
+        for step in (1, 2):
+            lut = display_lut(kind, 30, 4095); ref = bin_preview(raw, decimation=step, tables=build_tables(lut, gains, 30))
+            out = np.empty_like(ref); t0 = time.perf_counter()
+            for _ in range(20): core_module.debayer_preview(raw, out, decimation=step, gains=list(gains), black_level=30, lut=lut)
+            ms = (time.perf_counter() - t0) / 20 * 1000.0
+            print(f"{kind:6s} decimation {step}: {ms:.2f} ms/frame  {'match' if np.array_equal(out, ref) else 'MISMATCH'}")
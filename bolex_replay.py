@@ -0,0 +1,190 @@
+# bolex_replay.py (Replay camera: drop-in stand-in for core_module, plays samples/*.dng or synthetic Bayer frames at a set rate)
+# Same functions and return shapes as the C++ module, so FauxBolex_Beta_0.93.py runs unchanged without a Basler:
+#   BOLEX_CAMERA=replay python FauxBolex_Beta_0.93.py
+# Source and pacing come from configure() or the environment: BOLEX_REPLAY_SOURCE (a .dng file, a folder of them, or "synthetic"),
+# BOLEX_REPLAY_FPS (default 24), BOLEX_REPLAY_DROP_EVERY (skip a block ID every N frames to exercise drop detection).
+import os, glob, time, threading, collections
+import numpy as np
+from bolex_preview import PREVIEW_SIZE, build_tables, bin_preview # Same binned preview as process_grab_result() in core_module.cpp
+
+SENSOR_SHAPE = (1108, 2048); SENSOR_BITS = 12 # avA2300-25gc recording window, LSB-aligned 12-bit in uint16
+SENSOR_CFA = (1, 2, 0, 1) # Sensor is GBRG
+RING_CAPACITY = 8 # frameRing<8>
+CAMERA_TICK_HZ = 125_000_000 # GigE timestamp clock
+BLOCK_ID_WRAP = 65535
+SYNTHETIC_FRAMES = 12
+
+_config = {"source": None, "fps": 24.0, "drop_every": 0, "loop": True}
+_lock = threading.Lock(); _frames = []; _initialized = False; _grab_index = 0; _block_id = 0; _t0 = 0.0; _next_due = 0.0
+_ring = collections.deque(); _ring_cv = threading.Condition(); _capture_thread = None; _capture_running = False
+_stats = {"captured": 0, "overruns": 0, "errors": 0}; _zero_copy = False
+_init_timing = {"config_source": "none", "runtime_ms": 0.0, "open_ms": 0.0, "config_ms": 0.0, "start_ms": 0.0}
+_preview_opts = {"every_n": 1, "decimation": 1, "tables": None}
+_state = {"version": 1, "gain": 300, "exposure_us": 20833, "wb_red": 1.0, "wb_blue": 1.0}; _results = collections.deque(); _next_cmd_id = 1
+
+def configure(source: str = None, fps: float = None, drop_every: int = None, loop: bool = None):
+    # Call before initialize_camera(); None keeps the current (or environment) value
+    for k, v in (("source", source), ("fps", fps), ("drop_every", drop_every), ("loop", loop)):
+        if v is not None: _config[k] = v
+
+def _load_dng(path: str) -> np.ndarray:
+    import rawpy # Optional: only needed to replay real DNGs (pip install rawpy)
+    with rawpy.imread(path) as r: return np.array(r.raw_image_visible, dtype=np.uint16, copy=True) # The view dies with the rawpy handle
+
+def _fit_sensor(raw: np.ndarray, shape: tuple = SENSOR_SHAPE) -> np.ndarray:
+    # A real camera streams one fixed ROI; samples from other crops are centre-cropped/edge-padded to it (even offsets keep the CFA phase)
+    (h, w), (th, tw) = raw.shape, shape
+    y0 = max(0, (h - th) // 2) & ~1; x0 = max(0, (w - tw) // 2) & ~1; out = raw[y0:y0 + th, x0:x0 + tw]
+    if out.shape != tuple(shape): out = np.pad(out, ((0, th - out.shape[0]), (0, tw - out.shape[1])), mode="reflect")
+    return np.ascontiguousarray(out)
+
+def _synthetic_frames(count: int = SYNTHETIC_FRAMES, shape: tuple = SENSOR_SHAPE) -> list:
+    # Smooth scene (gradients + a moving bar) plus sensor noise, in GBRG mosaic: compresses like real footage, not like a flat field
+    h, w = shape; rng = np.random.default_rng(1)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32); base = 300.0 + 2400.0 * (xx / w) * (0.6 + 0.4 * yy / h)
+    cfa_gain = np.empty((2, 2), np.float32); cfa_gain[0, 0] = cfa_gain[1, 1] = 1.0; cfa_gain[0, 1] = 0.55; cfa_gain[1, 0] = 0.7 # G B / R G
+    mosaic = np.tile(cfa_gain, (h // 2, w // 2)); frames = []
+    for i in range(count):
+        img = base.copy(); x0 = int((i / count) * w); img[:, x0:x0 + w // 16] += 1200.0
+        img = img * mosaic + rng.normal(0.0, 12.0, shape).astype(np.float32)
+        frames.append(np.clip(img, 0, (1 << SENSOR_BITS) - 1).astype(np.uint16))
+    return frames
+
+def _load_source() -> list:
+    src = _config["source"] or os.environ.get("BOLEX_REPLAY_SOURCE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples")
+    if src != "synthetic":
+        paths = sorted(glob.glob(os.path.join(src, "*.dng"))) if os.path.isdir(src) else ([src] if os.path.isfile(src) else [])
+        if paths:
+            try:
+                frames = [_fit_sensor(_load_dng(p)) for p in paths]
+                print(f"[Replay] Loaded {len(frames)} DNG frame(s) from {src} ({frames[0].shape})."); return frames
+            except ImportError: print("[Replay] rawpy not installed, can't decode DNGs. Using synthetic frames.")
+            except Exception as e: print(f"[Replay] Error loading DNGs from {src}: {e}. Using synthetic frames.")
+        else: print(f"[Replay] No DNGs at '{src}'. Using synthetic frames.")
+    frames = _synthetic_frames(); print(f"[Replay] Generated {len(frames)} synthetic GBRG frames {frames[0].shape}."); return frames
+
+def _preview(raw: np.ndarray) -> np.ndarray: return bin_preview(raw, SENSOR_CFA, _preview_opts["decimation"], _preview_opts["tables"])
+
+def _next_frame(want_preview: bool = None):
+    # Paced like a free-running camera: sleep until the next frame period, then hand out (preview, raw, meta)
+    global _grab_index, _block_id, _next_due
+    if not _config["loop"] and _grab_index >= len(_frames): return None
+    delay = _next_due - time.monotonic()
+    if delay > 0: time.sleep(delay)
+    now = time.monotonic(); period = 1.0 / _config["fps"]
+    _next_due = max(_next_due + period, now - period) # Catch up after a stall, but never burst more than one frame
+    raw = _frames[_grab_index % len(_frames)].copy()
+    drop_every = _config["drop_every"]; _block_id = _block_id % BLOCK_ID_WRAP + 1
+    if drop_every and _grab_index and _grab_index % drop_every == 0: _block_id = _block_id % BLOCK_ID_WRAP + 1 # Simulated lost frame
+    if _zero_copy: raw.setflags(write=False)
+    meta = {"grab_index": _grab_index, "host_time_s": now, "zero_copy": _zero_copy, "block_id": _block_id,
+            "camera_timestamp": int((now - _t0) * CAMERA_TICK_HZ), "skipped_images": 0}
+    every = _preview_opts["every_n"]
+    if want_preview is None: want_preview = every > 0 and _grab_index % every == 0 # As the capture thread: preview every Nth frame
+    _grab_index += 1
+    return (_preview(raw) if want_preview else None), raw, meta
+
+# --- core_module API ---
+def initialize_camera(config_cache: str = "", power_on_default: bool = False) -> bool:
+    # config_cache and power_on_default are accepted for API parity; there are no camera nodes to restore, so loading the source counts as "open"
+    global _frames, _initialized, _grab_index, _block_id, _t0, _next_due
+    if _initialized: return True
+    t_open = time.perf_counter()
+    if os.environ.get("BOLEX_REPLAY_FPS"): _config["fps"] = float(os.environ["BOLEX_REPLAY_FPS"])
+    if os.environ.get("BOLEX_REPLAY_DROP_EVERY"): _config["drop_every"] = int(os.environ["BOLEX_REPLAY_DROP_EVERY"])
+    _frames = _load_source(); _init_timing.update(config_source="replay", open_ms=(time.perf_counter() - t_open) * 1000.0); _grab_index = 0; _block_id = 0; _t0 = _next_due = time.monotonic(); _initialized = True
+    print(f"[Replay] Camera initialized: {_config['fps']:.2f} fps{', dropping every %d' % _config['drop_every'] if _config['drop_every'] else ''}."); return True
+
+def get_init_timing() -> dict: return dict(_init_timing)
+
+def shutdown_camera():
+    global _initialized
+    stop_capture(); _initialized = False; print("[Replay] Camera shut down.")
+
+def grab_preview_and_raw(want_preview: bool = True):
+    if not _initialized or _capture_running: return None, None
+    entry = _next_frame(want_preview)
+    return (entry[0], entry[1]) if entry is not None else (None, None)
+
+def set_preview_options(every_n: int = 1, decimation: int = 1, gains=(1.0, 1.0, 1.0), black_level: int = 0, lut=None):
+    _preview_opts.update(every_n=max(0, int(every_n)), decimation=max(1, int(decimation)), tables=build_tables(lut, gains, black_level))
+
+def get_preview_options() -> dict:
+    return {"every_n": _preview_opts["every_n"], "decimation": _preview_opts["decimation"], "width": PREVIEW_SIZE[0], "height": PREVIEW_SIZE[1]}
+
+def debayer_preview(raw, out, cfa=SENSOR_CFA, decimation: int = 1, gains=(1.0, 1.0, 1.0), black_level: int = 0, lut=None):
+    bin_preview(raw, tuple(cfa), decimation, build_tables(lut, gains, black_level), (out.shape[1], out.shape[0]), out)
+
+def _capture_loop():
+    while _capture_running:
+        try: entry = _next_frame()
+        except Exception as e: _stats["errors"] += 1; print(f"[Replay] Capture error: {e}"); continue
+        if entry is None: time.sleep(0.05); continue
+        with _ring_cv:
+            if len(_ring) >= RING_CAPACITY: _stats["overruns"] += 1; continue # Consumer is behind: drop the newest, keep order
+            _ring.append(entry); _stats["captured"] += 1; _ring_cv.notify()
+    with _ring_cv: _ring_cv.notify_all()
+
+def start_capture() -> bool:
+    global _capture_thread, _capture_running
+    if not _initialized: print("[Replay] Error: start_capture needs an initialized camera."); return False
+    if _capture_running: return True
+    with _ring_cv: _ring.clear()
+    for k in _stats: _stats[k] = 0
+    _capture_running = True; _capture_thread = threading.Thread(target=_capture_loop, name="ReplayCapture", daemon=True); _capture_thread.start(); return True
+
+def stop_capture() -> bool:
+    global _capture_running, _capture_thread
+    if not _capture_running: return False
+    _capture_running = False
+    with _ring_cv: _ring_cv.notify_all()
+    if _capture_thread is not None: _capture_thread.join(timeout=2.0); _capture_thread = None
+    with _ring_cv: _ring.clear()
+    return True
+
+def try_get_frame():
+    with _ring_cv: return _ring.popleft() if _ring else None
+
+def get_frame(timeout: float = 0.5):
+    with _ring_cv:
+        _ring_cv.wait_for(lambda: _ring or not _capture_running, timeout=max(0.0, timeout))
+        return _ring.popleft() if _ring else None
+
+def get_capture_stats() -> dict:
+    with _ring_cv: return {"running": _capture_running, "captured": _stats["captured"], "overruns": _stats["overruns"], "errors": _stats["errors"], "queued": len(_ring), "ring_capacity": RING_CAPACITY}
+
+def set_zero_copy_raw(enable: bool) -> bool:
+    global _zero_copy
+    _zero_copy = bool(enable); print(f"[Replay] Zero-copy raw {'enabled' if enable else 'disabled'} (read-only arrays)"); return _zero_copy
+
+def get_zero_copy_raw() -> bool: return _zero_copy
+
+# Parameters: applied instantly, results posted like the control thread's
+def _post(command: str, ok: bool = True, **fields) -> int:
+    global _next_cmd_id
+    with _lock:
+        cmd_id = _next_cmd_id; _next_cmd_id += 1; _state["version"] += 1
+        _results.append(dict(id=cmd_id, command=command, ok=ok, **fields)); return cmd_id
+
+def set_gain(delta: int) -> bool:
+    with _lock: _state["gain"] = int(np.clip(_state["gain"] + delta, 0, 1023))
+    return True
+
+def get_gain() -> int: return _state["gain"]
+def get_exposure() -> int: return _state["exposure_us"]
+
+def queue_gain_delta(delta: int) -> int: set_gain(delta); return _post("gain", value=_state["gain"])
+
+def queue_exposure(exposure_us: int) -> int:
+    with _lock: _state["exposure_us"] = int(exposure_us)
+    return _post("exposure", value=_state["exposure_us"])
+
+def queue_white_balance() -> int: return _post("white_balance", red_gain=_state["wb_red"], blue_gain=_state["wb_blue"])
+
+def poll_command_results() -> list:
+    with _lock: out = list(_results); _results.clear(); return out
+
+def get_camera_state() -> dict:
+    with _lock: return dict(_state, pending_commands=0)
+
+def trigger_wb_and_get_gains() -> tuple: return (_state["wb_red"], _state["wb_blue"])
@@ -0,0 +1,139 @@
+# bolex_scopes.py (Raw-domain scopes: per-channel histograms, luma waveform, false colour and raw clip masks, on a worker thread)
+# Everything is computed from a decimated view of the Bayer mosaic (every `decimate`-th 2x2 CFA cell), so the numbers are the
+# sensor's: a channel clips where the 12-bit raw reaches white_level, not where the 8-bit debayered preview saturates.
+# The UI thread only hands over a strided copy (~0.1 ms) every 1/rate_hz s and composites the latest result.
+import time, threading
+import numpy as np
+import cv2
+
+SCOPE_VIEWS = ("off", "histogram", "waveform", "false_colour")
+HIST_STOPS = 10.0 # Histogram x axis: the 10 stops below raw clip, log2 scale
+# False colour zones in stops below raw clip (luma): (low, high, RGB). Unlisted exposures show as display-gamma grey; clipped cells red.
+FALSE_COLOUR_ZONES = ((-99.0, -8.0, (90, 0, 140)), # Noise floor
+                      (-2.8, -2.2, (0, 170, 0)),  # Middle grey (18% is -2.47 stops)
+                      (-1.6, -1.1, (230, 130, 170)), # Skin, about a stop over grey
+                      (-0.33, 0.01, (240, 220, 0))) # Within a third of a stop of clip
+CLIP_COLOUR = (255, 0, 0)
+_LUMA = (0.2126, 0.7152, 0.0722)
+
+def next_scope_view(view: str) -> str: return SCOPE_VIEWS[(SCOPE_VIEWS.index(view) + 1) % len(SCOPE_VIEWS)]
+
+
+class ScopesResult:
+    # One scopes update. Panels are small RGB images for the UI to blit; false_colour is preview-sized; clip_index are flat pixel
+    # indices of raw-clipped cells in the preview, so painting them costs per clipped pixel, not per frame pixel.
+    __slots__ = ("histogram", "clip_fraction", "hist_panel", "waveform_panel", "false_colour", "clip_index", "compute_ms", "time")
+    def __init__(self):
+        self.histogram = None; self.clip_fraction = None; self.hist_panel = None; self.waveform_panel = None
+        self.false_colour = None; self.clip_index = None; self.compute_ms = 0.0; self.time = time.monotonic()
+
+
+class ScopesEngine:
+    """Raw scopes on a worker thread at `rate_hz`. `submit(raw, view, clip)` from the UI loop: returns at once, and only
+    copies the decimated CFA planes when an update is due and the worker is idle. `latest()` is the newest ScopesResult.
+
+    cfa: colour (0=R, 1=G, 2=B) at mosaic positions [0,0], [0,1], [1,0], [1,1], as the Recorder's cfa_pattern.
+    black_level/white_level are raw codes of the 12-bit data (not the DNG's tag values). Nothing is computed while neither
+    a scope view nor the clip overlay is on."""
+    def __init__(self, cfa: tuple = (1, 2, 0, 1), black_level: int = 30, white_level: int = 4095, decimate: int = 4, rate_hz: float = 6.0,
+                 preview_size: tuple = (1024, 600), panel_size: tuple = (256, 96)):
+        self.black_level = black_level; self.white_level = white_level; self.decimate = max(1, int(decimate)); self.rate_hz = rate_hz
+        self.preview_size = preview_size; self.panel_w, self.panel_h = panel_size
+        offsets = [(0, 0), (0, 1), (1, 0), (1, 1)]
+        self._r = offsets[cfa.index(0)]; self._b = offsets[cfa.index(2)]; self._g = [o for o, c in zip(offsets, cfa) if c == 1]
+        self._build_luts()
+        self._cv = threading.Condition(); self._job = None; self._busy = False; self._running = True; self._latest = None; self._next_due = 0.0
+        self.updates = 0; self._compute_total = 0.0
+        self._thread = threading.Thread(target=self._run, name="Scopes", daemon=True); self._thread.start()
+
+    def _build_luts(self):
+        # Indexed by black-subtracted raw code (0..white-black), so the per-update work is table lookups
+        span = self.white_level - self.black_level; codes = np.arange(span + 1, dtype=np.float64)
+        stops = np.log2(np.maximum(codes, 0.5) / span)
+        self._hist_bin = np.clip((stops + HIST_STOPS) / HIST_STOPS * (self.panel_w - 1), 0, self.panel_w - 1).astype(np.intp)
+        fc = np.repeat(np.round((codes / span) ** (1 / 2.2) * 255).astype(np.uint8)[:, None], 3, axis=1) # Display-gamma grey
+        for lo, hi, colour in FALSE_COLOUR_ZONES: fc[(stops >= lo) & (stops < hi)] = colour
+        self._fc_lut = fc; self._wave_row = ((1.0 - codes / span) * (self.panel_h - 1)).astype(np.intp) # Top row = clip
+
+    def submit(self, raw: np.ndarray, view: str = "off", clip: bool = False) -> bool:
+        if (view == "off" and not clip) or raw is None or raw.ndim != 2: return False
+        now = time.monotonic()
+        if now < self._next_due or self._busy: return False
+        step = 2 * self.decimate # Whole CFA cells, so every plane keeps its colour
+        planes = {o: raw[o[0]::step, o[1]::step].copy() for o in (self._r, self._b) + tuple(self._g)} # Copies: raw may be a camera buffer view
+        with self._cv: self._job = (planes, view, clip); self._busy = True; self._next_due = now + 1.0 / self.rate_hz; self._cv.notify()
+        return True
+
+    def latest(self) -> ScopesResult: return self._latest
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while self._job is None and self._running: self._cv.wait()
+                if not self._running: return
+                job = self._job; self._job = None
+            t0 = time.perf_counter()
+            try: res = self._compute(*job); res.compute_ms = (time.perf_counter() - t0) * 1000.0; self._latest = res
+            except Exception as e: print(f"Warn: scopes update failed: {e}")
+            self.updates += 1; self._compute_total += time.perf_counter() - t0
+            with self._cv: self._busy = False
+
+    def _compute(self, planes: dict, view: str, clip: bool) -> ScopesResult:
+        span = self.white_level - self.black_level; res = ScopesResult()
+        h = min(p.shape[0] for p in planes.values()); w = min(p.shape[1] for p in planes.values())
+        raw_r = planes[self._r][:h, :w]; raw_b = planes[self._b][:h, :w]
+        g0, g1 = planes[self._g[0]][:h, :w], planes[self._g[1]][:h, :w]; raw_g = ((g0.astype(np.uint32) + g1) >> 1).astype(np.uint16)
+        clip_g = np.maximum(g0, g1) >= self.white_level; clip_r = raw_r >= self.white_level; clip_b = raw_b >= self.white_level
+        clipped = clip_r | clip_g | clip_b
+        rgb = [np.clip(p.astype(np.int32) - self.black_level, 0, span) for p in (raw_r, raw_g, raw_b)]
+        res.clip_fraction = np.array([np.count_nonzero(m) / m.size for m in (clip_r, clip_g, clip_b)])
+        if view == "histogram":
+            res.histogram = np.stack([np.bincount(self._hist_bin[c].ravel(), minlength=self.panel_w) for c in rgb])
+            res.hist_panel = self._hist_panel(res.histogram)
+        if view in ("waveform", "false_colour"):
+            luma = np.clip(rgb[0] * _LUMA[0] + rgb[1] * _LUMA[1] + rgb[2] * _LUMA[2], 0, span).astype(np.intp)
+            if view == "waveform": res.waveform_panel = self._waveform_panel(luma)
+            else:
+                fc = self._fc_lut[luma]; fc[clipped] = CLIP_COLOUR
+                res.false_colour = cv2.resize(fc, self.preview_size, interpolation=cv2.INTER_NEAREST)
+        if clip:
+            mask = cv2.resize(clipped.view(np.uint8), self.preview_size, interpolation=cv2.INTER_NEAREST)
+            res.clip_index = np.flatnonzero(mask)
+        return res
+
+    def _hist_panel(self, hist: np.ndarray) -> np.ndarray:
+        # Log-count bars, one colour plane per channel: overlaps mix (R+G = yellow, all three = white)
+        heights = (np.log1p(hist) / max(np.log1p(hist.max()), 1e-9) * (self.panel_h - 1)).astype(np.intp)
+        rows = np.arange(self.panel_h)[:, None]; panel = np.zeros((self.panel_h, self.panel_w, 3), np.uint8)
+        for c in range(3): panel[..., c] = (rows >= self.panel_h - heights[c][None, :]) * np.uint8(200)
+        panel[:, np.linspace(0, self.panel_w - 1, int(HIST_STOPS) + 1).astype(int)] |= 40 # One tick per stop
+        return panel
+
+    def _waveform_panel(self, luma: np.ndarray) -> np.ndarray:
+        # Column = image column (resampled to the panel width), row = luma: log-scaled hit counts in green
+        h, w = luma.shape; cols = (np.arange(w) * self.panel_w // w)[None, :].repeat(h, axis=0)
+        counts = np.bincount((self._wave_row[luma] * self.panel_w + cols).ravel(), minlength=self.panel_h * self.panel_w).reshape(self.panel_h, self.panel_w)
+        v = (np.log1p(counts) / max(np.log1p(counts.max()), 1e-9) * 255).astype(np.uint8)
+        panel = np.zeros((self.panel_h, self.panel_w, 3), np.uint8); panel[..., 1] = v; panel[..., 0] = v >> 2; panel[..., 2] = v >> 2
+        for frac in (0.25, 0.5, 0.75): panel[int((1 - frac) * (self.panel_h - 1)), ::4] = 60 # 25/50/75% of clip
+        return panel
+
+    def draw(self, frame: np.ndarray, view: str, clip_colour: tuple = CLIP_COLOUR, panel_xy: tuple = None):
+        # UI thread, in place on the preview (RGB, preview_size): false colour replaces the picture, panels are blended in, clip cells painted
+        res = self._latest
+        if res is None: return frame
+        if view == "false_colour" and res.false_colour is not None and res.false_colour.shape == frame.shape: np.copyto(frame, res.false_colour)
+        panel = res.hist_panel if view == "histogram" else res.waveform_panel if view == "waveform" else None
+        if panel is not None:
+            x, y = panel_xy or (frame.shape[1] - self.panel_w - 15, frame.shape[0] - self.panel_h - 60)
+            roi = frame[y:y + self.panel_h, x:x + self.panel_w]; cv2.addWeighted(roi, 0.35, panel, 0.65, 0, dst=roi)
+        if res.clip_index is not None and res.clip_index.size and frame.size == self.preview_size[0] * self.preview_size[1] * 3:
+            frame.reshape(-1, 3)[res.clip_index] = clip_colour
+        return frame
+
+    def get_stats(self) -> dict:
+        return {"updates": self.updates, "rate_hz": self.rate_hz, "avg_compute_ms": self._compute_total / self.updates * 1000.0 if self.updates else 0.0}
+
+    def close(self):
+        with self._cv: self._running = False; self._cv.notify()
+        self._thread.join(timeout=1.0)
@@ -0,0 +1,242 @@
+# bolex_take.py (Single-file streaming take container: one preallocated .fbt per take instead of one DNG per frame)
+# Layout: 4 KiB header | chunks (each 4 KiB aligned) | trailing frame index chunk (written on close)
+#   FTPL chunk: a DNG header template (tags, TileOffsets/TileByteCounts placeholders), one per tag change (e.g. WB)
+#   FFRM chunk: one frame's DNG image data parts (LJ92 tiles, or the 12-bit packed strip) + the template id it uses
+#   FIDX chunk: (frame_number, offset, length) for every frame, so a finished take opens in O(1)
+# Every chunk carries a CRC32, so a take cut off by power loss is recovered by scanning: every complete frame survives.
+# Several processes append to one take (encoder workers): space is reserved under flock() from the header's allocator fields.
+#   python bolex_take.py info <take.fbt>
+#   python bolex_take.py export <take.fbt> <out_dir> [--frames 0-99] [--workers N]
+#   python bolex_take.py frame <take.fbt> <n> <out.dng>
+#   python bolex_take.py repair <take.fbt>
+import os, sys, time, zlib, fcntl, struct, threading
+import numpy as np
+from bolex_dng import patch_header, write_buffers
+
+TAKE_FILENAME = "take.fbt"
+TAKE_MAGIC = b"FBTK"; TAKE_VERSION = 1
+TAKE_HEADER_SIZE = 4096; CHUNK_ALIGN = 4096 # Chunks start on 4 KiB boundaries: page/sector aligned writes, and a scan can resync
+# magic, version, flags, width, height, bits, target fps, codec, alloc_next, alloc_end, index_offset, frame_count, preallocation step (MB)
+TAKE_HEADER = struct.Struct("<4sHHIIIfIQQQII")
+_ALLOC_POS = struct.calcsize("<4sHHIIIfI"); _ALLOC = struct.Struct("<QQ") # alloc_next/alloc_end, shared by every appender
+FLAG_FINALISED = 1 # Trailing index written, header complete
+CODEC_RAW12 = 0; CODEC_LJ92 = 1
+# magic, frame_number, template_id, part_count, payload_len, crc32 (part table + payload), reserved
+CHUNK_HEADER = struct.Struct("<4sIIIQII")
+CHUNK_FRAME = b"FFRM"; CHUNK_TEMPLATE = b"FTPL"; CHUNK_INDEX = b"FIDX"
+TEMPLATE_HEADER = struct.Struct("<III") # offsets_pos, counts_pos, part count
+INDEX_ENTRY = np.dtype([("frame_number", "<u4"), ("offset", "<u8"), ("length", "<u8")])
+
+def _aligned(n: int) -> int: return (n + CHUNK_ALIGN - 1) // CHUNK_ALIGN * CHUNK_ALIGN
+
+
+class TakeFileWriter:
+    """Appends frames to one take file. The recorder creates it (`TakeFileWriter(path, ...)`), encoder workers open the
+    same file with `TakeFileWriter.attach(path)` and call `append()` themselves. Only the creator calls `add_template()`,
+    `note()` and `close()`.
+
+    Space is preallocated in `prealloc_mb` steps (posix_fallocate), so appends never wait on block allocation.
+    Header and templates are synced here, the index and trimmed tail on close; frame data is synced by whoever writes it
+    (bolex_writer.WriteStage's fsync cadence)."""
+    def __init__(self, path: str, width: int = 0, height: int = 0, bits: int = 12, target_fps: float = 24.0, codec: int = CODEC_LJ92,
+                 prealloc_mb: int = 1024, _attach: bool = False):
+        self.path = path; self.prealloc = max(1, int(prealloc_mb)) * 1024 * 1024; self._creator = not _attach
+        self._lock = threading.Lock(); self._alloc_lock = threading.Lock(); self._index = []; self._templates = []; self._next_template = 0
+        if _attach: # Same growth step as the creator
+            self._fd = os.open(path, os.O_RDWR); self.prealloc = TAKE_HEADER.unpack(os.pread(self._fd, TAKE_HEADER.size, 0))[12] * 1024 * 1024; return
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._fallocate(0, self.prealloc)
+        header = TAKE_HEADER.pack(TAKE_MAGIC, TAKE_VERSION, 0, width, height, bits, target_fps, codec, TAKE_HEADER_SIZE, self.prealloc, 0, 0, self.prealloc >> 20)
+        os.pwrite(self._fd, header.ljust(TAKE_HEADER_SIZE, b"\0"), 0); os.fsync(self._fd) # Header durable before any frame
+        print(f"Take file: {path} ({'LJ92' if codec == CODEC_LJ92 else 'raw12'}, {self.prealloc / 1e6:.0f} MB preallocated)")
+
+    @classmethod
+    def attach(cls, path: str) -> "TakeFileWriter": return cls(path, _attach=True)
+
+    def _fallocate(self, offset: int, length: int):
+        try: os.posix_fallocate(self._fd, offset, length)
+        except OSError as e: # Filesystem without fallocate (EOPNOTSUPP): plain appends still work, just not preallocated
+            if e.errno != 95: raise
+
+    @property
+    def fd(self) -> int: return self._fd
+
+    def reserve(self, nbytes: int) -> int:
+        # Cross-process: flock on the take file, bump alloc_next in the header (the page cache keeps it coherent)
+        # (flock does not exclude threads sharing this fd: the write stage vs add_template() from the UI thread, hence _alloc_lock too)
+        nbytes = _aligned(nbytes); self._alloc_lock.acquire(); fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            nxt, end = _ALLOC.unpack(os.pread(self._fd, _ALLOC.size, _ALLOC_POS))
+            offset = nxt; nxt += nbytes; grow_from = None
+            if nxt > end: grow_from = end; end = max(nxt, end + self.prealloc)
+            os.pwrite(self._fd, _ALLOC.pack(nxt, end), _ALLOC_POS)
+        finally: fcntl.flock(self._fd, fcntl.LOCK_UN); self._alloc_lock.release()
+        if grow_from is not None: self._fallocate(grow_from, end - grow_from)
+        return offset
+
+    def _chunk_buffers(self, magic: bytes, number: int, template_id: int, parts: list) -> tuple:
+        # -> (buffers, length): chunk header, part size table, parts; the caller reserves and writes them
+        sizes = np.fromiter((memoryview(p).nbytes for p in parts), dtype="<u4", count=len(parts)); table = sizes.tobytes()
+        crc = zlib.crc32(table)
+        for p in parts: crc = zlib.crc32(p, crc)
+        payload_len = len(table) + int(sizes.sum())
+        head = CHUNK_HEADER.pack(magic, number, template_id, len(parts), payload_len, crc, 0)
+        return [head, table] + list(parts), CHUNK_HEADER.size + payload_len
+
+    def frame_chunk(self, frame_number: int, template_id: int, parts: list) -> tuple:
+        # For writers that batch several frames into one reservation and one pwritev (bolex_writer.WriteStage)
+        return self._chunk_buffers(CHUNK_FRAME, frame_number, template_id, parts)
+
+    def _write_chunk(self, magic: bytes, number: int, template_id: int, parts: list) -> tuple:
+        buffers, length = self._chunk_buffers(magic, number, template_id, parts)
+        offset = self.reserve(length)
+        views = [memoryview(b).cast("B") for b in buffers]; pos = offset
+        while views: # pwritev, resuming after short writes
+            n = os.pwritev(self._fd, views[:1024], pos); pos += n
+            while views and n >= len(views[0]): n -= len(views[0]); views.pop(0)
+            if n: views[0] = views[0][n:]
+        return offset, length
+
+    def append(self, frame_number: int, template_id: int, parts: list) -> tuple:
+        # parts: the frame's DNG image data (LJ92 tiles or the packed strip), as the bolex_dng writers' encode() returns it -> (offset, length)
+        return self._write_chunk(CHUNK_FRAME, frame_number, template_id, parts)
+
+    def add_template(self, dng_writer) -> int:
+        # Stores the writer's current DNG header template; frames appended after this reference the returned id
+        header, offsets_pos, counts_pos = dng_writer.template(); parts_per_frame = getattr(dng_writer, "tile_count", 1)
+        with self._lock: template_id = self._next_template; self._next_template += 1
+        offset, length = self._write_chunk(CHUNK_TEMPLATE, 0, template_id, [TEMPLATE_HEADER.pack(offsets_pos, counts_pos, parts_per_frame), header])
+        with self._lock: self._templates.append((template_id, offset, length))
+        os.fdatasync(self._fd) # Frames are useless without their template
+        return template_id
+
+    def note(self, frame_number: int, offset: int, length: int):
+        # A frame chunk is complete (written here or by a worker's write stage): index it
+        with self._lock: self._index.append((frame_number, offset, length))
+
+    def close(self) -> int:
+        # Creator: trailing index, finalised header, unused preallocation trimmed. Returns the frame count. Attached appenders just close.
+        if self._fd is None: return 0
+        count = 0
+        if self._creator:
+            with self._lock: frames = np.array(sorted(self._index), dtype=INDEX_ENTRY); templates = np.array(sorted(self._templates), dtype=INDEX_ENTRY)
+            offset, length = self._write_chunk(CHUNK_INDEX, len(frames), 0, [frames, templates]); end = offset + _aligned(length); count = len(frames)
+            h = list(TAKE_HEADER.unpack(os.pread(self._fd, TAKE_HEADER.size, 0)))
+            h[2] |= FLAG_FINALISED; h[8:12] = [end, end, offset, count]; os.pwrite(self._fd, TAKE_HEADER.pack(*h), 0)
+            os.ftruncate(self._fd, end); os.fsync(self._fd)
+        os.close(self._fd); self._fd = None
+        return count
+
+
+class TakeFile:
+    """Reader: `len(take)`, `take.frame_numbers`, `take.dng_buffers(n)` -> [DNG header] + image data as zero-copy memoryviews
+    of the mmap, `take.export_frame(n, path)`. A take without a trailing index (recording cut off) is recovered by
+    scanning its chunks (CRC-checked); `recovered` tells which way it was opened."""
+    def __init__(self, path: str, verify: bool = False):
+        import mmap
+        if os.path.isdir(path): path = os.path.join(path, TAKE_FILENAME)
+        self.path = path
+        with open(path, "rb") as f: self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.version, self.flags, self.width, self.height, self.bits, self.target_fps, self.codec,
+         self.alloc_next, _, index_offset, _, _) = TAKE_HEADER.unpack_from(self._mm, 0)
+        if magic != TAKE_MAGIC: raise ValueError(f"Not a Faux Bolex take file: {path}")
+        self._frames = {}; self._templates = {}; self._chunk_ends = [TAKE_HEADER_SIZE]; self.recovered = not (self.flags & FLAG_FINALISED and index_offset)
+        if not self.recovered:
+            parts = self._chunk(index_offset, verify)[3]
+            for n, off, length in np.frombuffer(parts[0], dtype=INDEX_ENTRY): self._frames[int(n)] = (int(off), int(length))
+            for t, off, length in np.frombuffer(parts[1], dtype=INDEX_ENTRY): self._templates[int(t)] = self._template(int(off))
+        else: self._scan()
+        self.frame_numbers = sorted(self._frames)
+
+    def _chunk(self, offset: int, verify: bool = False):
+        # -> (magic, number, template_id, [part memoryviews]); ValueError if the chunk is not complete and intact
+        if offset + CHUNK_HEADER.size > len(self._mm): raise ValueError("chunk past end of file")
+        magic, number, template_id, count, payload_len, crc, _ = CHUNK_HEADER.unpack_from(self._mm, offset)
+        if magic not in (CHUNK_FRAME, CHUNK_TEMPLATE, CHUNK_INDEX): raise ValueError("no chunk")
+        start = offset + CHUNK_HEADER.size; end = start + payload_len
+        if end > len(self._mm) or 4 * count > payload_len: raise ValueError("truncated chunk")
+        body = memoryview(self._mm)[start:end]
+        if verify and zlib.crc32(body) != crc: raise ValueError("CRC mismatch")
+        sizes = np.frombuffer(body[:4 * count], dtype="<u4"); bounds = np.concatenate(([4 * count], 4 * count + np.cumsum(sizes, dtype=np.int64)))
+        if bounds[-1] != payload_len: raise ValueError("part table does not match payload")
+        return magic, number, template_id, [body[int(a):int(b)] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def _template(self, offset: int) -> tuple:
+        parts = self._chunk(offset)[3]; offsets_pos, counts_pos, count = TEMPLATE_HEADER.unpack(parts[0])
+        return bytes(parts[1]), offsets_pos, counts_pos, count
+
+    def _scan(self):
+        # Recovery: walk aligned chunk starts, keep every chunk whose CRC checks out, step over holes 4 KiB at a time
+        pos = TAKE_HEADER_SIZE; size = len(self._mm)
+        while pos + CHUNK_HEADER.size <= size:
+            try: magic, number, template_id, parts = self._chunk(pos, verify=True)
+            except ValueError: pos += CHUNK_ALIGN; continue
+            length = CHUNK_HEADER.size + 4 * len(parts) + sum(p.nbytes for p in parts)
+            if magic == CHUNK_FRAME: self._frames[number] = (pos, length)
+            elif magic == CHUNK_TEMPLATE: self._templates[template_id] = self._template(pos) + (pos, length)
+            pos += _aligned(length); self._chunk_ends.append(pos)
+
+    def __len__(self): return len(self._frames)
+
+    def dng_buffers(self, frame_number: int) -> list:
+        offset, _ = self._frames[frame_number]
+        _, _, template_id, parts = self._chunk(offset)
+        header, offsets_pos, counts_pos, count = self._templates[template_id][:4]
+        if len(parts) != count: raise ValueError(f"Frame {frame_number}: {len(parts)} parts, template {template_id} expects {count}")
+        return [patch_header(header, offsets_pos, counts_pos, (p.nbytes for p in parts), count)] + parts
+
+    def export_frame(self, frame_number: int, path: str) -> int: return write_buffers(path, self.dng_buffers(frame_number))
+
+    def export(self, out_dir: str, frames: list = None, workers: int = 0, prefix: str = None) -> int:
+        # CinemaDNG-style sequence <prefix>_000000.dng ...; frames are independent, so they go out on a thread pool (writev releases the GIL)
+        from concurrent.futures import ThreadPoolExecutor
+        os.makedirs(out_dir, exist_ok=True); frames = self.frame_numbers if frames is None else [n for n in frames if n in self._frames]
+        prefix = prefix or os.path.basename(os.path.dirname(os.path.abspath(self.path))) or "frame"
+        job = lambda n: self.export_frame(n, os.path.join(out_dir, f"{prefix}_{n:06d}.dng"))
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as ex: return sum(ex.map(job, frames))
+
+    def close(self): self._mm.close()
+
+
+def repair(path: str) -> int:
+    # Finalise a take that was cut off: recover it by scanning, then write the trailing index behind the last good chunk
+    take = TakeFile(path)
+    if not take.recovered: take.close(); return len(take)
+    writer = TakeFileWriter.attach(take.path); writer._creator = True
+    writer._index = [(n, off, length) for n, (off, length) in take._frames.items()]
+    writer._templates = [(t, tpl[4], tpl[5]) for t, tpl in take._templates.items()]
+    end = max(take._chunk_ends); take.close()
+    os.pwrite(writer._fd, _ALLOC.pack(end, end), _ALLOC_POS)
+    return writer.close()
+
+
+def _frame_list(spec: str) -> list:
+    # "0-99", "5", "1,3,10-12"
+    out = []
+    for part in spec.split(","):
+        a, _, b = part.partition("-"); out.extend(range(int(a), int(b or a) + 1))
+    return out
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Faux Bolex take files (.fbt): inspect, export DNGs, repair after a crash")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("info"); p.add_argument("take")
+    p = sub.add_parser("export"); p.add_argument("take"); p.add_argument("out_dir"); p.add_argument("--frames", default=None, help="e.g. 0-99 or 1,5,10-20 (default: all)")
+    p.add_argument("--workers", type=int, default=0, help="Parallel writers (default: cores)"); p.add_argument("--prefix", default=None, help="File name prefix (default: take folder name)")
+    p = sub.add_parser("frame"); p.add_argument("take"); p.add_argument("n", type=int); p.add_argument("out")
+    p = sub.add_parser("repair"); p.add_argument("take")
+    args = ap.parse_args()
+    if args.cmd == "repair": print(f"{args.take}: {repair(args.take)} frames indexed."); exit(0)
+    take = TakeFile(args.take)
+    if args.cmd == "info":
+        nums = take.frame_numbers; missing = (nums[-1] - nums[0] + 1 - len(nums)) if nums else 0
+        print(f"{take.path}: {take.width}x{take.height} {take.bits}-bit {'LJ92' if take.codec == CODEC_LJ92 else 'raw12'}, {take.target_fps:.2f} fps, "
+              f"{len(take)} frames ({nums[0] if nums else '-'}..{nums[-1] if nums else '-'}, {missing} missing), {len(take._templates)} template(s), "
+              f"{os.path.getsize(take.path) / 1e6:.1f} MB{', RECOVERED by scan (run repair to finalise)' if take.recovered else ''}")
+    elif args.cmd == "frame": print(f"{args.out}: {take.export_frame(args.n, args.out)} bytes")
+    else:
+        t0 = time.monotonic(); frames = _frame_list(args.frames) if args.frames else None
+        nbytes = take.export(args.out_dir, frames, args.workers, args.prefix); dt = time.monotonic() - t0
+        print(f"Exported {len(frames) if frames else len(take)} frame(s), {nbytes / 1e6:.1f} MB in {dt:.2f} s ({nbytes / 1e6 / dt if dt > 0 else 0:.0f} MB/s) -> {args.out_dir}")
+    take.close()
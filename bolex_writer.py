@@ -0,0 +1,206 @@
+# bolex_writer.py (Write stage: bounded hand-off from the encoders, coalesced sequential writes, optional O_DIRECT, fsync cadence, disk telemetry)
+# Encoders hand finished frames over and go back to encoding; one writer thread owns the disk. SSD stalls (garbage collection,
+# thermal throttling) then show up as a growing hand-off and blocked submits (`stall_s`), not as slow encode times.
+import os, time, mmap, shutil, threading, collections
+import numpy as np
+from bolex_dng import write_buffers
+
+DIRECT_ALIGN = 4096 # O_DIRECT: buffer address, file offset and length multiples of the logical block size (4 KiB covers every SSD)
+_IOV_MAX = 1024
+_ZEROS = bytes(DIRECT_ALIGN)
+_FILE = 0; _CHUNK = 1
+
+def _aligned(n: int) -> int: return (n + DIRECT_ALIGN - 1) // DIRECT_ALIGN * DIRECT_ALIGN
+
+def _pwritev_all(fd: int, views: list, pos: int) -> int:
+    # pwritev per IOV_MAX buffers, resuming after short writes -> bytes written
+    total = 0
+    while views:
+        n = os.pwritev(fd, views[:_IOV_MAX], pos); pos += n; total += n
+        while views and n >= len(views[0]): n -= len(views[0]); views.pop(0)
+        if n: views[0] = views[0][n:]
+    return total
+
+
+class WriteStats:
+    """Write latency percentiles (per write call, i.e. per coalesced batch), sustained and recent MB/s, hand-off stalls
+    and free-space runway at the recent rate. Fed by a WriteStage, or by the encoder pool from its workers' reports."""
+    def __init__(self, storage_path: str = None, window_s: float = 3.0):
+        self.storage_path = storage_path; self.window_s = window_s; self._lock = threading.Lock(); self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._lat = collections.deque(maxlen=4096); self._recent = collections.deque()
+            self.writes = 0; self.frames = 0; self.bytes = 0; self.stall_s = 0.0; self.errors = 0; self._first = None; self._last = None
+            self._free = None; self._free_checked = 0.0
+
+    def record(self, frames: int, nbytes: int, seconds: float, end: float = None):
+        end = end or time.monotonic()
+        with self._lock:
+            self._lat.append(seconds); self.writes += 1; self.frames += frames; self.bytes += nbytes
+            if self._first is None: self._first = end - seconds
+            self._last = end; self._recent.append((end, nbytes))
+            while self._recent and end - self._recent[0][0] > self.window_s: self._recent.popleft()
+
+    def stall(self, seconds: float):
+        with self._lock: self.stall_s += seconds
+
+    def error(self):
+        with self._lock: self.errors += 1
+
+    def get(self) -> dict:
+        now = time.monotonic()
+        if self.storage_path and now - self._free_checked >= 2.0: # statvfs every 2 s, not per UI frame
+            try: self._free = shutil.disk_usage(self.storage_path).free
+            except OSError: self._free = None
+            self._free_checked = now
+        with self._lock:
+            lat = np.array(self._lat) * 1000.0 if self._lat else None; span = (self._last - self._first) if self._first is not None else 0.0
+            recent_span = (now - self._recent[0][0]) if len(self._recent) > 1 else 0.0
+            recent = sum(b for _, b in self._recent) / recent_span if recent_span > 0 else (self.bytes / span if span > 0 else 0.0)
+            st = {"writes": self.writes, "frames": self.frames, "bytes": self.bytes, "errors": self.errors, "stall_s": self.stall_s,
+                  "frames_per_write": self.frames / self.writes if self.writes else 0.0,
+                  "mb_per_s": self.bytes / span / 1e6 if span > 0 else 0.0, "recent_mb_per_s": recent / 1e6}
+        p50, p95, p99, worst = np.percentile(lat, (50, 95, 99, 100)) if lat is not None else (0.0,) * 4
+        st.update(p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99), max_ms=float(worst))
+        if self._free is not None: st["free_gb"] = self._free / 1e9; st["runway_min"] = self._free / recent / 60.0 if recent > 0 else None
+        return st
+
+
+class WriteStage:
+    """Owns the disk writes of a recording: `submit_file(path, buffers)` (one DNG) or `submit_chunk(take, frame, template_id, parts)`
+    (one bolex_take frame) return at once unless `max_pending_mb` of encoded data is already waiting. That bound is the
+    hand-off: time an encoder spends blocked there is `stall_s`, i.e. the disk is the bottleneck.
+
+    The writer thread drains the hand-off in batches: consecutive take-file frames become one reservation and one pwritev
+    (up to `coalesce_frames` / `coalesce_mb`), so a backlog turns into fewer, larger sequential writes by itself.
+    direct=True writes through O_DIRECT from a page-aligned staging buffer (falls back to buffered I/O where the filesystem
+    refuses it), which keeps multi-GB takes out of the page cache the frame pool needs. `fsync_frames`: fdatasync the take
+    file every N frames written, 0 = only on close (per-file DNGs are left to the page cache, as before the write stage). `done(nbytes, offset, error)` runs on the writer
+    thread once a frame's data has been written, `on_batch(frames, nbytes, seconds)` once per write call."""
+    def __init__(self, max_pending_mb: int = 256, coalesce_frames: int = 16, coalesce_mb: int = 32, direct: bool = False, fsync_frames: int = 24,
+                 storage_path: str = None, on_batch=None, name: str = "WriteStage"):
+        self.max_pending = max(1, int(max_pending_mb)) * 1024 * 1024; self.coalesce_frames = max(1, int(coalesce_frames)); self.coalesce_bytes = max(1, int(coalesce_mb)) * 1024 * 1024
+        self.direct = direct and hasattr(os, "O_DIRECT"); self.fsync_frames = fsync_frames; self.on_batch = on_batch
+        self.stats = WriteStats(storage_path)
+        self._cv = threading.Condition(); self._jobs = collections.deque(); self._pending = 0; self._busy = False; self._stop = False
+        self._since_sync = 0; self._dirty = set(); self._direct_fds = {}; self._staging = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True); self._thread.start()
+
+    def submit_file(self, path: str, buffers: list, done=None): self._submit((_FILE, path, buffers, 0, 0, done))
+    def submit_chunk(self, take, frame_number: int, template_id: int, parts: list, done=None): self._submit((_CHUNK, take, parts, frame_number, template_id, done))
+
+    def _submit(self, job: tuple):
+        nbytes = sum(memoryview(b).nbytes for b in job[2]); t0 = None
+        with self._cv:
+            # Bounded by bytes, not frames (LJ92 frame sizes vary with the scene); one oversized frame still gets through an empty hand-off
+            while self._pending and self._pending + nbytes > self.max_pending and not self._stop:
+                if t0 is None: t0 = time.monotonic()
+                self._cv.wait()
+            if self._stop: raise RuntimeError("Write stage closed")
+            self._jobs.append(job + (nbytes,)); self._pending += nbytes; self._cv.notify_all()
+        if t0 is not None: self.stats.stall(time.monotonic() - t0)
+
+    def pending_mb(self) -> float:
+        with self._cv: return self._pending / 1e6
+
+    def _next_batch(self) -> list:
+        with self._cv:
+            while not self._jobs and not self._stop: self._cv.wait()
+            if not self._jobs: return None
+            batch = [self._jobs.popleft()]; size = batch[0][-1]; self._busy = True
+            if batch[0][0] == _CHUNK: # Only frames of the same take file are contiguous on disk
+                while self._jobs and len(batch) < self.coalesce_frames and size < self.coalesce_bytes and self._jobs[0][0] == _CHUNK and self._jobs[0][1] is batch[0][1]:
+                    batch.append(self._jobs.popleft()); size += batch[-1][-1]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None: break
+            t0 = time.monotonic(); err = None
+            try: results = self._write_batch(batch)
+            except Exception as e: err = f"{e}"; results = [(0, 0)] * len(batch); self.stats.error()
+            elapsed = time.monotonic() - t0; nbytes = sum(r[1] for r in results)
+            if err is None:
+                self.stats.record(len(batch), nbytes, elapsed)
+                if self.on_batch is not None: self.on_batch(len(batch), nbytes, elapsed)
+                self._since_sync += len(batch)
+                if self.fsync_frames and self._dirty and self._since_sync >= self.fsync_frames: self._sync()
+            for job, (offset, length) in zip(batch, results):
+                if job[5] is not None:
+                    try: job[5](length, offset, err)
+                    except Exception as e: print(f"Warn: write stage callback failed for frame {job[3]}: {e}")
+            with self._cv: self._pending -= sum(job[-1] for job in batch); self._busy = False; self._cv.notify_all()
+
+    def _write_batch(self, batch: list) -> list:
+        # -> [(offset, length)] per job
+        if batch[0][0] == _FILE:
+            _, path, buffers = batch[0][:3]
+            return [(0, self._write_direct_file(path, buffers) if self.direct else write_buffers(path, buffers))]
+        take = batch[0][1]; views = []; spans = []; total = 0
+        for _, _, parts, frame_number, template_id, _, _ in batch:
+            buffers, length = take.frame_chunk(frame_number, template_id, parts); padded = _aligned(length)
+            views += [memoryview(b).cast("B") for b in buffers]
+            if padded > length: views.append(memoryview(_ZEROS)[:padded - length]) # Chunks are 4 KiB aligned anyway: pad, so the batch is one run
+            spans.append((total, length)); total += padded
+        base = take.reserve(total); self._dirty.add(take)
+        fd = self._direct_fd(take) if self.direct else None
+        if fd is not None: self._write_direct(fd, views, base, total)
+        else: _pwritev_all(take.fd, views, base)
+        return [(base + off, length) for off, length in spans]
+
+    def _direct_fd(self, take):
+        fd = self._direct_fds.get(take.path, -1)
+        if fd == -1:
+            try: fd = os.open(take.path, os.O_WRONLY | os.O_DIRECT)
+            except OSError as e: print(f"Warn: O_DIRECT not available for {take.path} ({e}), buffered writes."); fd = None
+            self._direct_fds[take.path] = fd
+        return fd
+
+    def _staged(self, views: list, total: int) -> memoryview:
+        # Copy into the page-aligned staging buffer (anonymous mmap), zero the tail up to the next block
+        padded = _aligned(total)
+        if self._staging is None or len(self._staging) < padded: self._staging = mmap.mmap(-1, max(padded, self.coalesce_bytes + DIRECT_ALIGN))
+        buf = memoryview(self._staging); pos = 0
+        for v in views: buf[pos:pos + len(v)] = v; pos += len(v)
+        buf[pos:padded] = bytes(padded - pos)
+        return buf[:padded]
+
+    def _write_direct(self, fd: int, views: list, offset: int, total: int):
+        data = self._staged(views, total); pos = 0
+        while pos < len(data): pos += os.pwrite(fd, data[pos:], offset + pos)
+
+    def _write_direct_file(self, path: str, buffers: list) -> int:
+        views = [memoryview(b).cast("B") for b in buffers]; total = sum(len(v) for v in views)
+        try: fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o644)
+        except OSError: return write_buffers(path, buffers) # tmpfs and friends
+        try: self._write_direct(fd, views, 0, total); os.ftruncate(fd, total) # Written block-padded, trimmed back to the DNG's size
+        finally: os.close(fd)
+        return total
+
+    def _sync(self):
+        for take in self._dirty:
+            try:
+                if take.fd is not None: os.fdatasync(take.fd)
+            except OSError as e: print(f"Warn: write stage sync failed: {e}")
+        self._dirty.clear(); self._since_sync = 0
+
+    def flush(self, timeout: float = 60.0) -> bool:
+        # Wait until everything submitted so far is written (the take file can then be closed)
+        with self._cv: ok = self._cv.wait_for(lambda: not self._jobs and not self._busy, timeout=timeout)
+        if not ok: print(f"Warn: write stage flush timeout, {len(self._jobs)} frames not written.")
+        return ok
+
+    def close(self, timeout: float = 60.0):
+        self.flush(timeout)
+        if self._dirty: self._sync()
+        with self._cv: self._stop = True; self._cv.notify_all()
+        self._thread.join(timeout=5.0)
+        for fd in self._direct_fds.values():
+            if fd is not None: os.close(fd)
+        self._direct_fds = {}
+        if self._staging is not None: self._staging.close(); self._staging = None
+
+    def get_stats(self) -> dict:
+        st = self.stats.get(); st["pending_mb"] = self.pending_mb(); st["max_pending_mb"] = self.max_pending / 1e6; st["direct"] = self.direct; return st